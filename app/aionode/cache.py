@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import OrderedDict, defaultdict
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlightCache:
+    """
+    Concurrent calls with the same key share one in-flight fetch ("singleflight"),
+    and its result is kept for "ttl" seconds (ttl=0: only coalescing, nothing is kept).
+    None is never cached: it means the request has failed.
+    """
+
+    def __init__(self, max_size=1000, clock=time.monotonic):
+        self.max_size = max_size
+        self.clock = clock
+        self._cache = OrderedDict()  # key => (expires_at, data)
+        self._in_flight = {}  # key => Task
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'dedupes': 0})
+
+    def _store(self, key, data, ttl):
+        self._cache[key] = (self.clock() + ttl, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def _lookup(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= self.clock():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return data
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable], ttl: float = 0.0, label=''):
+        stats = self._stats[label]
+
+        data = self._lookup(key) if ttl > 0 else None
+        if data is not None:
+            stats['hits'] += 1
+            return data
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            stats['dedupes'] += 1
+        else:
+            stats['misses'] += 1
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+
+            def on_done(t: asyncio.Task):
+                self._in_flight.pop(key, None)
+                if t.cancelled() or t.exception() is not None:
+                    return
+                if ttl > 0 and t.result() is not None:
+                    self._store(key, t.result(), ttl)
+
+            task.add_done_callback(on_done)
+
+        # shield: if one caller is cancelled, the others still get the result
+        return await asyncio.shield(task)
+
+    def clear(self):
+        self._cache.clear()
+
+    @property
+    def stats(self):
+        return {label: dict(s) for label, s in self._stats.items()}
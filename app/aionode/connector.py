@@ -1,15 +1,36 @@
 import asyncio
 import logging
-from typing import Dict
+import time
+from typing import Dict, Optional
 
 from aiohttp import ClientSession, ClientError, ServerDisconnectedError
 
+from .cache import SingleFlightCache
 from .env import ThorEnvironment
+from .health import EndpointHealth
 from .nodeclient import ThorNodeClient
 from .types import *
 
 
 class ThorConnector:
+    # sec; how long the latest state (height=0) of these endpoints is reused. Data at a height never changes,
+    # so it is kept for "cache_ttl_height"; other endpoints are only coalesced while in flight
+    DEFAULT_CACHE_TTL = {
+        'pools': 3.0,
+        'pool': 3.0,
+        'network': 3.0,
+        'mimir': 10.0,
+        'vault': 10.0,
+        'nodes': 10.0,
+        'pol': 10.0,
+        'constants': 60.0,
+        'inbound_addresses': 3.0,
+    }
+    DEFAULT_CACHE_TTL_HEIGHT = 600.0
+
+    # the node is unreachable or broken; unlike 404, these count against its health
+    NODE_ERRORS = (ConnectionError, asyncio.TimeoutError, ClientError, ServerDisconnectedError)
+
     # --- METHODS ----
 
     async def query_custom_path(self, path):
@@ -20,7 +41,8 @@ class ThorConnector:
         return await self._request(path, is_rpc=is_rpc)
 
     async def query_node_accounts(self, height=0) -> List[ThorNodeAccount]:
-        data = await self._request(self.env.path_nodes_height.format(height=int(height)))
+        path = self.env.path_nodes_height.format(height=int(height))
+        data = await self._cached_request('nodes', path, height)
         return [ThorNodeAccount.from_json(j) for j in data] if data else []
 
     async def query_queue(self) -> ThorQueue:
@@ -32,7 +54,7 @@ class ThorConnector:
             path = self.env.path_pools_height.format(height=height)
         else:
             path = self.env.path_pools
-        data = await self._request(path, treat_empty_as_ok=False)
+        data = await self._cached_request('pools', path, height, treat_empty_as_ok=False)
         return [ThorPool.from_json(j) for j in data]
 
     async def query_pool(self, pool: str, height=None) -> ThorPool:
@@ -40,7 +62,7 @@ class ThorConnector:
             path = self.env.path_pool_height.format(pool=pool, height=height)
         else:
             path = self.env.path_pool.format(pool=pool)
-        data = await self._request(path)
+        data = await self._cached_request('pool', path, height)
         return ThorPool.from_json(data)
 
     async def query_last_blocks(self) -> List[ThorLastBlock]:
@@ -48,11 +70,11 @@ class ThorConnector:
         return [ThorLastBlock.from_json(j) for j in data] if isinstance(data, list) else [ThorLastBlock.from_json(data)]
 
     async def query_constants(self) -> ThorConstants:
-        data = await self._request(self.env.path_constants)
+        data = await self._cached_request('constants', self.env.path_constants)
         return ThorConstants.from_json(data) if data else ThorConstants()
 
     async def query_mimir(self) -> ThorMimir:
-        data = await self._request(self.env.path_mimir)
+        data = await self._cached_request('mimir', self.env.path_mimir)
         return ThorMimir.from_json(data) if data else ThorMimir()
 
     async def query_mimir_votes(self) -> List[ThorMimirVote]:
@@ -65,7 +87,7 @@ class ThorConnector:
         return response or {}
 
     async def query_chain_info(self) -> Dict[str, ThorChainInfo]:
-        data = await self._request(self.env.path_inbound_addresses)
+        data = await self._cached_request('inbound_addresses', self.env.path_inbound_addresses)
         if isinstance(data, list):
             info_list = [ThorChainInfo.from_json(j) for j in data]
         else:
@@ -76,7 +98,7 @@ class ThorConnector:
 
     async def query_vault(self, vault_type=ThorVault.TYPE_ASGARD) -> List[ThorVault]:
         path = self.env.path_vault_asgard if vault_type == ThorVault.TYPE_ASGARD else self.env.path_vault_yggdrasil
-        data = await self._request(path)
+        data = await self._cached_request('vault', path)
         return [ThorVault.from_json(v) for v in data]
 
     async def query_balance(self, address: str) -> ThorBalances:
@@ -144,20 +166,22 @@ class ThorConnector:
 
     async def query_pol(self, height=0):
         url = self.env.path_pol.format(height=height)
-        data = await self._request(url)
+        data = await self._cached_request('pol', url, height)
         if data:
             return ThorPOL.from_json(data)
 
     async def query_network(self, height=0):
         url = self.env.path_network.format(height=height)
-        data = await self._request(url)
+        data = await self._cached_request('network', url, height)
         if data:
             return ThorNetwork.from_json(data)
 
     # ---- Internal ----
 
     def __init__(self, env: ThorEnvironment, session: ClientSession, logger=None, extra_headers=None,
-                 additional_envs=None, silent=True):
+                 additional_envs=None, silent=True,
+                 cache_ttl: Optional[Dict[str, float]] = None, cache_ttl_height=DEFAULT_CACHE_TTL_HEIGHT,
+                 cache_size=1000, hedging=False, health_options: Optional[dict] = None):
         self.session = session
         self.env = env
         self.silent = silent
@@ -173,6 +197,17 @@ class ThorConnector:
             for env in additional_envs:
                 self._clients.append(self._make_client(env, extra_headers))
 
+        self.cache_ttl = dict(self.DEFAULT_CACHE_TTL)
+        if cache_ttl:
+            self.cache_ttl.update(cache_ttl)
+        self.cache_ttl_height = cache_ttl_height
+        self.cache = SingleFlightCache(max_size=cache_size)
+
+        self.hedging = hedging
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self._health = {client: EndpointHealth(**(health_options or {})) for client in self._clients}
+
     def _make_client(self, env: ThorEnvironment, extra_headers):
         return ThorNodeClient(self.session, logger=self.logger, env=env,
                               extra_headers=extra_headers)
@@ -193,13 +228,92 @@ class ThorConnector:
     def first_client_rpc_url(self):
         return self.first_client.env.rpc_url
 
+    @property
+    def cache_stats(self):
+        """ endpoint => {hits, misses, dedupes} """
+        return self.cache.stats
+
+    async def _cached_request(self, endpoint, path, height=0, treat_empty_as_ok=True):
+        ttl = self.cache_ttl_height if height else self.cache_ttl.get(endpoint, 0.0)
+        return await self.cache.get_or_fetch(
+            (path, treat_empty_as_ok),
+            lambda: self._request(path, treat_empty_as_ok=treat_empty_as_ok),
+            ttl=ttl, label=endpoint,
+        )
+
+    @property
+    def health_stats(self):
+        return [
+            {'url': client.env.thornode_url, **self._health[client].stats}
+            for client in self._clients
+        ]
+
+    def _ranked_clients(self) -> List[ThorNodeClient]:
+        """
+        The healthiest first, ties keep the declared order. Open circuits are skipped unless all are open,
+        except one whose open time is over: it goes first as a probe, the others stay behind it as the failover.
+        """
+        available = [c for c in self._clients if self._health[c].available]
+        if not available:
+            return list(self._clients)
+        return sorted(available, key=lambda c: (not self._health[c].wants_probe, self._health[c].score))
+
+    async def _tracked_request(self, client: ThorNodeClient, path, is_rpc):
+        health = self._health[client]
+        health.on_start()
+        t0 = time.monotonic()
+        try:
+            data = await client.request(path, is_rpc=is_rpc)
+        except self.NODE_ERRORS:
+            health.on_failure()
+            raise
+        except BaseException:
+            health.release()
+            raise
+        health.on_success(time.monotonic() - t0)
+        return data
+
+    async def _attempt(self, client: ThorNodeClient, backup: Optional[ThorNodeClient], path, is_rpc):
+        """
+        With hedging on, if the client is slower than its usual p95, the same request is sent to the backup
+        and the first good answer wins.
+        """
+        delay = self._health[client].p95 if self.hedging and backup is not None else None
+        primary = asyncio.ensure_future(self._tracked_request(client, path, is_rpc))
+        pending = {primary}
+        try:
+            if delay is None:
+                return await primary
+
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self.hedged_requests += 1
+                self.logger.debug(f'{client} is slower than {delay:.3f} sec for "{path}"; hedging with {backup}')
+                pending.add(asyncio.ensure_future(self._tracked_request(backup, path, is_rpc)))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
     async def _request(self, path, is_rpc=False, treat_empty_as_ok=True):
-        for client in self._clients:
+        ranked = self._ranked_clients()
+        for i, client in enumerate(ranked):
+            backup = ranked[i + 1] if i + 1 < len(ranked) else None
             for attempt in range(1, client.env.retries + 1):
                 if attempt > 1:
                     self.logger.debug(f'Retry #{attempt} for path "{path}"')
                 try:
-                    data = await client.request(path, is_rpc=is_rpc)
+                    data = await self._attempt(client, backup, path, is_rpc)
 
                     if treat_empty_as_ok:
                         if data is not None:
@@ -214,14 +328,14 @@ class ThorConnector:
                 except NotImplementedError:
                     # Do no retries, no backups. Something is wrong with your code
                     raise
-                except (FileNotFoundError, AttributeError,
-                        ConnectionError, asyncio.TimeoutError,
-                        ClientError, ServerDisconnectedError) as e:
+                except (FileNotFoundError, AttributeError, *self.NODE_ERRORS) as e:
                     if not self.silent:
                         raise
                     else:
                         err_type = type(e).__name__
                         self.logger.warning(f'#{attempt}. Failed to query {client} for "{path}" (err: {err_type}).')
-                if d := client.env.retry_delay:
+                if not self._health[client].available:
+                    break  # its circuit has just opened, no use to wait for it
+                if attempt < client.env.retries and (d := client.env.retry_delay):
                     self.logger.debug(f'#{attempt}. Delay before retry: {d} sec...')
                     await asyncio.sleep(d)
@@ -0,0 +1,104 @@
+import math
+import time
+from collections import deque
+
+
+class EndpointHealth:
+    """
+    Health of one node endpoint: EWMA of latency and of error rate, recent latencies for p95
+    and a circuit breaker.
+    The circuit opens after "failure_threshold" failures in a row. After "open_time" seconds one probe request
+    is let through (half-open): its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, alpha=0.2, error_penalty=10.0, failure_threshold=3, open_time=30.0,
+                 window=100, min_samples=10, clock=time.monotonic):
+        self.alpha = alpha
+        self.error_penalty = error_penalty  # sec of latency that a 100% error rate is worth
+        self.failure_threshold = failure_threshold
+        self.open_time = open_time
+        self.min_samples = min_samples
+        self.clock = clock
+
+        self.latency = None  # EWMA, sec
+        self.error_rate = 0.0  # EWMA, 0..1
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def score(self) -> float:
+        """ The lower, the better """
+        if not self.available:
+            return math.inf
+        return (self.latency or 0.0) + self.error_rate * self.error_penalty
+
+    @property
+    def wants_probe(self):
+        return self.state == self.OPEN and self.available
+
+    @property
+    def available(self):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return self.clock() >= self.opened_at + self.open_time
+        return not self.probing  # half-open: only one probe at a time
+
+    @property
+    def p95(self):
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def on_start(self):
+        if self.state == self.OPEN and self.available:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            self.probing = True
+
+    def on_success(self, latency: float):
+        self.successes += 1
+        if self.state != self.CLOSED:
+            self.error_rate = 0.0  # the probe has passed: a fresh start
+        else:
+            self.error_rate *= 1 - self.alpha
+        self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+        self.latencies.append(latency)
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+        self.probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = self.clock()
+        self.probing = False
+
+    def release(self):
+        # cancelled (a hedged loser) or a valid error answer like 404: tells nothing about the node's health
+        self.probing = False
+
+    @property
+    def stats(self):
+        return {
+            'state': self.state,
+            'latency': round(self.latency, 4) if self.latency is not None else None,
+            'p95': self.p95,
+            'error_rate': round(self.error_rate, 4),
+            'successes': self.successes,
+            'failures': self.failures,
+        }
@@ -26,8 +26,7 @@ class ThorNodeClient:
                 raise FileNotFoundError(f'{url} not found, sorry!')
             elif resp.status == 501:
                 raise NotImplementedError(f'{url} not implemented, sorry!')
-            text = await resp.text()
-            return ujson.loads(text)
+            return ujson.loads(await resp.read())  # straight from bytes, no decoding to str
 
     def set_client_id_header(self, client_id: str):
         if not isinstance(self.extra_headers, dict):
@@ -1,4 +1,6 @@
 import asyncio
+import html
+from datetime import datetime
 
 from services.jobs.fetch.base import DataController, BaseFetcher
 from services.jobs.scanner.native_scan import NativeScannerBlock
@@ -21,6 +23,7 @@ class AdminMessages:
     BUTT_FETCHERS = 'Fetchers'
     BUTT_TASKS = 'Tasks'
     BUTT_SCANNER = 'Scanner'
+    BUTT_LOOP = 'Loop'
     BUTT_GLOBAL_PAUSE = 'Pause all'
     BUTT_GLOBAL_RESUME = 'Resume all'
     TEXT_ALL_PAUSED = 'All paused!'
@@ -83,6 +86,23 @@ class AdminMessages:
         if not data_ctrl.summary:
             message += 'No info'
 
+        if self.deps.settings_manager:
+            cache_stats = self.deps.settings_manager.cache_stats
+            message += (
+                f'\n<b>Settings cache:</b> {cache_stats["size"]} items, '
+                f'{cache_stats["hits"]} hits, {cache_stats["misses"]} misses '
+                f'({format_percent(cache_stats["hit_rate"], 100)}), '
+                f'{cache_stats["invalidations"]} invalidations'
+            )
+
+        if self.deps.outbox:
+            outbox_stats = await self.deps.outbox.stats()
+            message += (
+                f'\n<b>Outbox:</b> {outbox_stats["depth"]} queued, {outbox_stats["pending"]} in work, '
+                f'{outbox_stats["dlq"]} dead letters; '
+                f'{outbox_stats["sent"]} sent, {outbox_stats["dropped"]} dropped, {outbox_stats["retried"]} retried'
+            )
+
         message += f'\n<b>Uptime:</b> {self.uptime}'
 
         return message
@@ -147,6 +167,29 @@ class AdminMessages:
 
         return f'Check the terminal please.'
 
+    def get_message_about_loop(self, n_stalls=3, stack_lines=6):
+        monitor = self.deps.loop_monitor
+        if not monitor:
+            return 'Loop monitor is disabled.'
+
+        st = monitor.stats
+        last_lag_ms, max_lag_ms = st['last_lag'] * 1000, st['max_lag'] * 1000
+        message = (
+            f'<b>Event loop</b>\n\n'
+            f'Last lag: {bold(f"{last_lag_ms:.1f}")} ms, max lag: {bold(f"{max_lag_ms:.1f}")} ms\n'
+            f'Slow steps recorded: {bold(st["stalls"])} (threshold {monitor.slow_threshold} s)\n'
+        )
+        for stall in monitor.recent_stalls(n_stalls):
+            when = datetime.fromtimestamp(stall.started_ts).strftime('%H:%M:%S')
+            duration = f'{stall.duration:.2f} s' if stall.finished else f'≥ {stall.duration:.2f} s, still going'
+            stack = html.escape(''.join(stall.stack[-stack_lines:]), quote=False)
+            message += (
+                f'\n{bold(when)} {duration}\n'
+                f'Task {ital(html.escape(stall.task or "-"))}: {bold(html.escape(stall.coro))}\n'
+                f'<pre>{stack}</pre>\n'
+            )
+        return message
+
     async def get_message_about_scanner(self):
         scanner: NativeScannerBlock = self.deps.block_scanner
         last_thor_block = int(self.deps.last_block_store)
@@ -158,5 +201,8 @@ class AdminMessages:
             f'Time since: {bold(format_time_ago(now_ts() - scanner.last_block_ts))}\n'
             f'Node last block: {bold(last_thor_block)}\n'
             f'Difference last - processed: {bold(block_diff)} or '
-            f'{bold(format_time_ago(block_diff * THOR_BLOCK_TIME))}'
+            f'{bold(format_time_ago(block_diff * THOR_BLOCK_TIME))}\n'
+            f'Last catch-up: {bold(scanner.catch_up_blocks)} blocks at '
+            f'{bold(f"{scanner.catch_up_speed:.2f}")} blocks/sec '
+            f'(window {bold(scanner.prefetch_window)})'
         )
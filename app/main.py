@@ -30,6 +30,7 @@ from services.jobs.fetch.savers import SaversStatsFetcher
 from services.jobs.fetch.tx import TxFetcher
 from services.jobs.ilp_summer import ILPSummer
 from services.jobs.node_churn import NodeChurnDetector
+from services.jobs.scanner.block_decoder import BlockDecoderPool
 from services.jobs.scanner.native_scan import NativeScannerBlock
 from services.jobs.scanner.swap_extractor import SwapExtractorBlock
 from services.jobs.scanner.swap_routes import SwapRouteRecorder
@@ -37,13 +38,17 @@ from services.jobs.transfer_detector import RuneTransferDetectorTxLogs
 from services.jobs.user_counter import UserCounter
 from services.jobs.volume_filler import VolumeFillerUpdater
 from services.jobs.volume_recorder import VolumeRecorder
+from services.lib.aimd import AIMDLimiter
 from services.lib.config import Config, SubConfig
 from services.lib.constants import HTTP_CLIENT_ID
 from services.lib.date_utils import parse_timespan_to_seconds
 from services.lib.db import DB
+from services.lib.delegates import DispatchOptions
 from services.lib.depcont import DepContainer
 from services.lib.emergency import EmergencyReport
 from services.lib.logs import WithLogger
+from services.lib.loop_monitor import LoopMonitor
+from services.lib.metrics import MetricsServer
 from services.lib.midgard.connector import MidgardConnector
 from services.lib.midgard.name_service import NameService
 from services.lib.money import DepthCurve
@@ -58,6 +63,7 @@ from services.models.tx_type import TxType
 from services.notify.alert_presenter import AlertPresenter
 from services.notify.broadcast import Broadcaster
 from services.notify.channel import BoardMessage
+from services.notify.outbox import OutboundQueue
 from services.notify.personal.balance import PersonalBalanceNotifier
 from services.notify.personal.bond_provider import PersonalBondProviderNotifier
 from services.notify.personal.personal_main import NodeChangePersonalNotifier
@@ -167,7 +173,7 @@ class App(WithLogger):
 
         d.thor_connector = ThorConnector(d.thor_env, d.session, additional_envs=[
             thor_env_backup
-        ])
+        ], hedging=bool(d.cfg.get('thor.node.hedging', default=False)))
         d.thor_connector.set_client_id_for_all(HTTP_CLIENT_ID)
 
         cfg: SubConfig = d.cfg.get('thor.midgard')
@@ -177,6 +183,7 @@ class App(WithLogger):
             int(cfg.get_pure('tries', 3)),
             public_url=d.thor_env.midgard_url,
             network_id=d.cfg.network_id,
+            limiter=AIMDLimiter.from_config(d.cfg, 'thor.midgard.concurrency'),
         )
 
         d.name_service = NameService(d.db, d.cfg, d.midgard_connector, d.node_holder)
@@ -204,6 +211,9 @@ class App(WithLogger):
                 self.logger.info('Testing DB connection...')
                 await self.deps.db.test_db_connection()
 
+                # other processes (web API) change settings too
+                d.settings_manager.start_invalidation_listener()
+
                 await self.create_thor_node_connector()
 
                 # update pools for bootstrap (other components need them)
@@ -260,6 +270,11 @@ class App(WithLogger):
             d.emergency,
         ]
 
+        # personal messages go through the durable outbox
+        if d.cfg.get('personal.outbox.enabled', True):
+            d.outbox = OutboundQueue(d)
+            tasks.append(d.outbox)
+
         # ----- OPTIONAL TASKS -----
 
         achievements_enabled = d.cfg.get('achievements.enabled', True)
@@ -273,7 +288,15 @@ class App(WithLogger):
         if d.cfg.get('native_scanner.enabled', True):
             # The block scanner itself
             max_attempts = d.cfg.as_int('native_scanner.max_attempts_per_block', 5)
-            d.block_scanner = NativeScannerBlock(d, max_attempts=max_attempts)
+            prefetch_window = d.cfg.as_int('native_scanner.prefetch_window',
+                                           NativeScannerBlock.DEFAULT_PREFETCH_WINDOW)
+            d.block_scanner = NativeScannerBlock(d, max_attempts=max_attempts, prefetch_window=prefetch_window)
+            decode_workers = d.cfg.as_int('native_scanner.decode_workers', 0)
+            if decode_workers > 0:
+                d.block_scanner.decoder = BlockDecoderPool(
+                    max_workers=decode_workers,
+                    batch_size=d.cfg.as_int('native_scanner.decode_batch_size', BlockDecoderPool.DEFAULT_BATCH_SIZE)
+                )
             tasks.append(d.block_scanner)
             reserve_address = d.cfg.as_str('native_scanner.reserve_address')
 
@@ -436,7 +459,10 @@ class App(WithLogger):
 
             if d.cfg.get('price.divergence.personal.enabled', True):
                 personal_price_div_notifier = PersonalPriceDivergenceNotifier(d)
-                d.pool_fetcher.add_subscriber(personal_price_div_notifier)
+                # it walks through all the users' settings; only the latest prices matter for it
+                d.pool_fetcher.add_subscriber(personal_price_div_notifier, DispatchOptions(
+                    queue_size=1, timeout=d.cfg.as_interval('price.divergence.personal.timeout', '5m'),
+                ))
 
         if d.cfg.get('pool_churn.enabled', True):
             notifier_pool_churn = PoolChurnNotifier(d)
@@ -514,11 +540,16 @@ class App(WithLogger):
         scheduler_cfg = d.cfg.get('personal.scheduler')
         if scheduler_cfg.get('enabled', True):
             poll_interval = parse_timespan_to_seconds(scheduler_cfg.get_pure('poll_interval', '1m'))
-            d.scheduler = Scheduler(d.db.redis, 'PersonalLPReports', poll_interval)
+            d.scheduler = Scheduler(
+                d.db.redis, 'PersonalLPReports', poll_interval,
+                concurrency=int(scheduler_cfg.get_pure('concurrency', 4)),
+                handler_timeout=parse_timespan_to_seconds(scheduler_cfg.get_pure('handler_timeout', '5m')),
+            )
             tasks.append(d.scheduler)
 
             personal_lp_notifier = PersonalPeriodicNotificationService(d)
             d.scheduler.add_subscriber(personal_lp_notifier)
+            await personal_lp_notifier.spread_existing_subscriptions()
 
         # ------- BOTS -------
 
@@ -592,11 +623,26 @@ class App(WithLogger):
     async def on_startup(self, _):
         self.deps.make_http_session()  # it must be inside a coroutine!
 
+        if self.deps.cfg.get('loop_monitor.enabled', default=True):
+            self.deps.loop_monitor = LoopMonitor(
+                interval=self.deps.cfg.as_float('loop_monitor.interval', 0.25),
+                slow_threshold=self.deps.cfg.as_float('loop_monitor.slow_threshold', 0.25),
+            )
+            self.deps.loop_monitor.start()
+
+        if self.deps.cfg.get('metrics.enabled', default=False):
+            await MetricsServer(
+                host=self.deps.cfg.as_str('metrics.host', '127.0.0.1'),
+                port=self.deps.cfg.as_int('metrics.port', 9108),
+            ).start()
+
         self._bg_task = asyncio.create_task(self._run_background_jobs())
 
     async def on_shutdown(self, _):
         if self.deps.session:
             await self.deps.session.close()
+        if self.deps.block_scanner and self.deps.block_scanner.decoder:
+            self.deps.block_scanner.decoder.shutdown()
 
     def run_bot(self):
         self.deps.telegram_bot.run(on_startup=self.on_startup, on_shutdown=self.on_shutdown)
@@ -78,6 +78,7 @@ class AdminDialog(BaseDialog):
         await message.answer('Info menu', disable_notification=True, reply_markup=kbd([
             [self.adm_loc.BUTT_HTTP, self.adm_loc.BUTT_FETCHERS],
             [self.adm_loc.BUTT_SCANNER, self.adm_loc.BUTT_TASKS],
+            [self.adm_loc.BUTT_LOOP],
             [self.adm_loc.BUTT_BACK],
         ]))
 
@@ -93,6 +94,8 @@ class AdminDialog(BaseDialog):
             await self.show_debug_info_tasks(message)
         elif message.text == self.adm_loc.BUTT_SCANNER:
             await self.show_debug_info_scanner(message)
+        elif message.text == self.adm_loc.BUTT_LOOP:
+            await self.show_debug_info_loop(message)
 
     async def show_debug_info_about_http(self, message: Message):
         text = await self.adm_loc.get_debug_message_text_session()
@@ -113,6 +116,12 @@ class AdminDialog(BaseDialog):
                              disable_notification=True,
                              disable_web_page_preview=True)
 
+    async def show_debug_info_loop(self, message: Message):
+        text = self.adm_loc.get_message_about_loop()
+        await message.answer(text,
+                             disable_notification=True,
+                             disable_web_page_preview=True)
+
     async def show_debug_info_scanner(self, message: Message):
         text = await self.adm_loc.get_message_about_scanner()
         await message.answer(text,
@@ -82,19 +82,19 @@ def price_graph(pool_price_df, det_price_df, cex_prices_df, volumes, loc: BaseLo
     return graph.finalize()
 
 
+PRICE_GRAPH_MIN_POINTS = 150
+
+
 async def price_graph_from_db(deps: DepContainer, loc: BaseLocalization, period=DAY) -> PictureAndName:
     series = PriceTimeSeries(RUNE_SYMBOL_POOL, deps.db)
     det_series = PriceTimeSeries(RUNE_SYMBOL_DET, deps.db)
     cex_price_series = PriceTimeSeries(RUNE_SYMBOL_CEX, deps.db)
     volume_recorder = VolumeRecorder(deps)
 
-    max_points = 10_000
-    if period >= 7 * DAY:
-        max_points = 60_000
-
-    prices = await series.get_last_values(period, with_ts=True, max_points=max_points)
-    det_prices = await det_series.get_last_values(period, with_ts=True, max_points=max_points)
-    cex_prices = await cex_price_series.get_last_values(period, with_ts=True, max_points=max_points)
+    # rollups: hundreds of points per line instead of every raw one
+    prices = await series.get_values_auto(period, min_points=PRICE_GRAPH_MIN_POINTS, with_ts=True)
+    det_prices = await det_series.get_values_auto(period, min_points=PRICE_GRAPH_MIN_POINTS, with_ts=True)
+    cex_prices = await cex_price_series.get_values_auto(period, min_points=PRICE_GRAPH_MIN_POINTS, with_ts=True)
     volumes = await volume_recorder.get_data_range_ago_n(period, n=VOLUME_N_POINTS)
 
     time_scale_mode = 'time' if period <= DAY else 'date'
@@ -14,11 +14,11 @@ from services.lib.db import DB
 from services.lib.draw_utils import img_to_bio
 from services.lib.settings_manager import SettingsManager
 from services.lib.utils import WithLogger
-from services.notify.channel import Messengers, CHANNEL_INACTIVE, MessageType, BoardMessage
+from services.notify.channel import Messengers, CHANNEL_INACTIVE, MessageType, BoardMessage, RetryAfterReporter
 from services.notify.personal.helpers import NodeOpSetting
 
 
-class SlackBot(WithLogger):
+class SlackBot(WithLogger, RetryAfterReporter):
     INSTALLATION_DIR = "./data/slack_db/installations"
     STATE_DIR = "./data/slack_db/states"
     SCOPES = [
@@ -110,6 +110,8 @@ class SlackBot(WithLogger):
         except slack_sdk.errors.SlackApiError as e:
             self.logger.error(f'Slack error: {e}')
             error = e.response['error']
+            if e.response.status_code == 429:
+                self.report_retry_after(float(e.response.headers.get('Retry-After', 1)))
             if error in self.REASONS_TO_STOP_NOTIFICATIONS:
                 return CHANNEL_INACTIVE
             return error
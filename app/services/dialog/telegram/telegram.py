@@ -10,7 +10,7 @@ from services.lib.config import Config
 from services.lib.db import DB
 from services.lib.texts import shorten_text
 from services.lib.utils import WithLogger
-from services.notify.channel import MessageType, CHANNEL_INACTIVE, BoardMessage
+from services.notify.channel import MessageType, CHANNEL_INACTIVE, BoardMessage, RetryAfterReporter
 
 TG_TEST_USER = 192398802
 
@@ -18,7 +18,7 @@ TELEGRAM_MAX_MESSAGE_LENGTH = 4096
 TELEGRAM_MAX_CAPTION_LENGTH = 1024
 
 
-class TelegramBot(WithLogger):
+class TelegramBot(WithLogger, RetryAfterReporter):
     EXTRA_RETRY_DELAY = 0.1
 
     def __init__(self, cfg: Config, db: DB, loop):
@@ -64,6 +64,7 @@ class TelegramBot(WithLogger):
             self.logger.error(f"Target [ID:{chat_id}]: invalid user ID")
         except exceptions.RetryAfter as e:
             self.logger.error(f"Target [ID:{chat_id}]: Flood limit is exceeded. Sleep {e.timeout} seconds.")
+            self.report_retry_after(e.timeout + self.EXTRA_RETRY_DELAY)
             await asyncio.sleep(e.timeout + self.EXTRA_RETRY_DELAY)
             # Recursive call
             return await self.send_message(chat_id, msg, **kwargs)
@@ -8,14 +8,14 @@ from ratelimit import limits
 
 from services.dialog.twitter.text_length import twitter_text_length, twitter_cut_text, TWITTER_LIMIT_CHARACTERS
 from services.lib.config import Config
-from services.lib.date_utils import DAY
+from services.lib.date_utils import DAY, now_ts
 from services.lib.draw_utils import img_to_bio
 from services.lib.emergency import EmergencyReport
 from services.lib.utils import random_hex, WithLogger
-from services.notify.channel import MessageType, BoardMessage, MESSAGE_SEPARATOR
+from services.notify.channel import MessageType, BoardMessage, MESSAGE_SEPARATOR, RetryAfterReporter
 
 
-class TwitterBot(WithLogger):
+class TwitterBot(WithLogger, RetryAfterReporter):
     MAX_TWEETS_PER_DAY = 300
 
     def __init__(self, cfg: Config):
@@ -99,6 +99,13 @@ class TwitterBot(WithLogger):
             await self.post(part, image, executor, loop)
             image = None  # attach image solely to the first post, then just nullify it
 
+    @staticmethod
+    def _retry_after_from_error(e, default=60.0):
+        with suppress(Exception):
+            reset_ts = float(e.response.headers['x-rate-limit-reset'])
+            return max(1.0, reset_ts - now_ts())
+        return default
+
     def _report_error(self, e):
         with suppress(Exception):
             logging.exception(f'Twitter exception!', stack_info=True)
@@ -123,6 +130,7 @@ class TwitterBot(WithLogger):
             return True
         except tweepy.errors.TooManyRequests as e:
             self._report_error(e)
+            self.report_retry_after(self._retry_after_from_error(e))
             return False
         except tweepy.errors.Forbidden as e:
             self._report_error(e)
@@ -13,8 +13,12 @@ from redis import BusyLoadingError as BusyLoadingErrorNormal
 from services.lib.date_utils import now_ts
 from services.lib.delegates import WithDelegates
 from services.lib.depcont import DepContainer
+from services.lib.metrics import REGISTRY
 from services.lib.utils import WithLogger
 
+FETCHER_TICK_SECONDS = REGISTRY.histogram('fetcher_tick_seconds', 'Duration of one fetcher tick', ['fetcher'])
+FETCHER_ERRORS = REGISTRY.counter('fetcher_errors', 'Fetcher ticks that ended with an exception', ['fetcher'])
+
 
 class WatchedEntity:
     def __init__(self):
@@ -180,6 +184,7 @@ class BaseFetcher(WithDelegates, WatchedEntity, ABC, WithLogger):
 
             self.logger.exception(f"task error: {e}")
             self.error_counter += 1
+            FETCHER_ERRORS.inc(self.name)
             try:
                 await self.handle_error(e)
             except Exception as e:
@@ -189,6 +194,7 @@ class BaseFetcher(WithDelegates, WatchedEntity, ABC, WithLogger):
             self.last_timestamp = datetime.datetime.now().timestamp()
             delta = time.monotonic() - t0
             self.run_times.append(delta)
+            FETCHER_TICK_SECONDS.observe(self.name, value=delta)
 
     async def _run(self):
         if self.sleep_period < 0:
@@ -56,6 +56,10 @@ async def fill_cacao_price_from_gecko(db, include_fake_det=False, fake_value=0.2
         except aioredis.ResponseError:
             pass
 
+    # the points came in the past, so the rollups are recalculated at once
+    for ts_series in (series, cex_series, det_series):
+        await ts_series.rebuild_rollups()
+
 
 async def get_cacao_coin_gecko_info(session):
     async with session.get(COIN_RANK_GECKO, timeout=GECKO_TIMEOUT) as resp:
@@ -0,0 +1,258 @@
+import dataclasses
+import zlib
+from typing import Optional, Dict, List, Tuple, Iterable
+
+import ujson
+from aioredis import Redis
+
+from services.lib.db import DB
+from services.lib.utils import WithLogger
+from services.models.pool_info import PoolInfo, PoolInfoMap
+
+
+class PoolSnapshotStore(WithLogger):
+    """
+    Pool maps by block height. Consecutive snapshots are almost identical, so they are not stored in full:
+    a keyframe holds the whole map, and every other height holds only the pool fields that differ
+    from the nearest keyframe below it (no more than "keyframe_every" heights away).
+    Thus, any height is rebuilt from at most two records. Records are zlib-compressed JSON rows
+    in field order, so the field names are stored once per keyframe.
+
+    Redis layout (prefix = "PoolSnap"):
+        {prefix}:Data       hash   height -> blob
+        {prefix}:Heights    zset   all stored heights
+        {prefix}:Keyframes  zset   keyframe heights
+    """
+
+    DEFAULT_KEYFRAME_EVERY = 600  # heights, about 1 hour
+    SWEEP_BATCH = 1000
+    KEYFRAME_CACHE_SIZE = 8
+
+    def __init__(self, db: DB, keyframe_every=DEFAULT_KEYFRAME_EVERY, prefix='PoolSnap', compress_level=6):
+        super().__init__()
+        self.db = db
+        self.keyframe_every = max(1, int(keyframe_every))
+        self.compress_level = compress_level
+        self.key_data = f'{prefix}:Data'
+        self.key_heights = f'{prefix}:Heights'
+        self.key_keyframes = f'{prefix}:Keyframes'
+        self._keyframe_cache: Dict[int, dict] = {}
+
+    FIELDS = [f.name for f in dataclasses.fields(PoolInfo)]
+
+    # ---- encoding ----
+
+    def _encode(self, payload: dict) -> bytes:
+        return zlib.compress(ujson.dumps(payload).encode(), self.compress_level)
+
+    @staticmethod
+    def _decode(blob: bytes) -> dict:
+        return ujson.loads(zlib.decompress(blob))
+
+    @classmethod
+    def _rows(cls, pool_map: PoolInfoMap) -> Dict[str, list]:
+        return {name: [getattr(p, f) for f in cls.FIELDS] for name, p in pool_map.items()}
+
+    @classmethod
+    def make_keyframe(cls, pool_map: PoolInfoMap) -> dict:
+        return {'f': cls.FIELDS, 'p': cls._rows(pool_map)}
+
+    @classmethod
+    def make_delta(cls, base_height: int, keyframe: dict, pool_map: PoolInfoMap) -> dict:
+        base_rows = keyframe['p']
+        new, changed = {}, {}
+        for name, row in cls._rows(pool_map).items():
+            base_row = base_rows.get(name)
+            if base_row is None or keyframe['f'] != cls.FIELDS:
+                new[name] = row
+            else:
+                diff = {str(i): v for i, (v, old) in enumerate(zip(row, base_row)) if v != old}
+                if diff:
+                    changed[name] = diff
+        removed = [name for name in base_rows if name not in pool_map]
+        return {'k': base_height, 'p': new, 'c': changed, 'd': removed}
+
+    @staticmethod
+    def apply_delta(keyframe: dict, delta: dict) -> Tuple[List[str], Dict[str, list]]:
+        rows = {name: list(row) for name, row in keyframe['p'].items() if name not in delta['d']}
+        for name, diff in delta['c'].items():
+            row = rows[name]
+            for i, v in diff.items():
+                row[int(i)] = v
+        rows.update(delta['p'])
+        return keyframe['f'], rows
+
+    @staticmethod
+    def _to_pool_map(fields: List[str], rows: Dict[str, list]) -> Optional[PoolInfoMap]:
+        pool_map = {name: PoolInfo.from_dict_brief(dict(zip(fields, row))) for name, row in rows.items()}
+        if all(p is not None for p in pool_map.values()):
+            return pool_map
+
+    # ---- read ----
+
+    async def _redis(self) -> Redis:
+        return await self.db.get_redis_binary()
+
+    async def _get_keyframe(self, r: Redis, height: int) -> Optional[dict]:
+        keyframe = self._keyframe_cache.get(height)
+        if keyframe is None:
+            blob = await r.hget(self.key_data, str(height))
+            if not blob:
+                return None
+            keyframe = self._decode(blob)
+            if 'k' in keyframe:
+                return None  # not a keyframe
+            if len(self._keyframe_cache) >= self.KEYFRAME_CACHE_SIZE:
+                self._keyframe_cache.pop(next(iter(self._keyframe_cache)))
+            self._keyframe_cache[height] = keyframe
+        return keyframe
+
+    async def get_pools_at(self, height: int) -> Optional[PoolInfoMap]:
+        r = await self._redis()
+        blob = await r.hget(self.key_data, str(height))
+        if not blob:
+            return None
+
+        try:
+            payload = self._decode(blob)
+            if 'k' not in payload:
+                return self._to_pool_map(payload['f'], payload['p'])
+
+            keyframe = await self._get_keyframe(r, payload['k'])
+            if keyframe is None:
+                self.logger.warning(f'Keyframe #{payload["k"]} of height #{height} is missing.')
+                return None
+            return self._to_pool_map(*self.apply_delta(keyframe, payload))
+        except (TypeError, ValueError, KeyError, IndexError, zlib.error):
+            self.logger.warning(f'Failed to decode the pool snapshot at #{height}.')
+            return None
+
+    # ---- write ----
+
+    async def _find_base(self, r: Redis, height: int) -> Optional[int]:
+        results = await r.zrevrangebyscore(self.key_keyframes, height - 1, height - self.keyframe_every + 1,
+                                           start=0, num=1)
+        return int(results[0]) if results else None
+
+    async def put(self, height: int, pool_map: PoolInfoMap):
+        await self.put_many([(height, pool_map)])
+
+    async def put_many(self, items: Iterable[Tuple[int, PoolInfoMap]]) -> int:
+        """
+        Writes many heights in 3 round trips: stored heights are skipped, the deltas of the batch refer to
+        the keyframe below it or to the keyframes written in the same batch. Returns the number of written heights.
+        """
+        items = sorted(((int(h), pool_map) for h, pool_map in items if h and pool_map), key=lambda it: it[0])
+        if not items:
+            return 0
+        r = await self._redis()
+
+        pipe = r.pipeline(transaction=False)
+        for height, _ in items:
+            pipe.zscore(self.key_heights, height)
+        stored = await pipe.execute()
+
+        base_height = await self._find_base(r, items[0][0])
+        keyframe = await self._get_keyframe(r, base_height) if base_height is not None else None
+
+        pipe = r.pipeline(transaction=True)
+        written = set()
+        for (height, pool_map), score in zip(items, stored):
+            if score is not None or height in written:
+                continue  # a height never changes; besides, deltas may refer to it
+
+            payload = None
+            if keyframe is not None and height - base_height < self.keyframe_every:
+                payload = self.make_delta(base_height, keyframe, pool_map)
+                if len(payload['p']) > len(pool_map) // 2:
+                    payload = None  # too different; a new keyframe is cheaper
+
+            if payload is None:
+                payload = self.make_keyframe(pool_map)
+                base_height, keyframe = height, payload
+                pipe.zadd(self.key_keyframes, {height: height})
+            pipe.hset(self.key_data, str(height), self._encode(payload))
+            pipe.zadd(self.key_heights, {height: height})
+            written.add(height)
+
+        if written:
+            await pipe.execute()
+        return len(written)
+
+    # ---- retention ----
+
+    async def _delete(self, r: Redis, heights: list):
+        pipe = r.pipeline(transaction=True)
+        pipe.hdel(self.key_data, *heights)
+        pipe.zrem(self.key_heights, *heights)
+        pipe.zrem(self.key_keyframes, *heights)
+        await pipe.execute()
+        for h in heights:
+            self._keyframe_cache.pop(int(h), None)
+
+    async def _sweep_range(self, r: Redis, min_score, max_score, keep=(), batch=SWEEP_BATCH) -> int:
+        deleted = 0
+        while True:
+            heights = await r.zrangebyscore(self.key_heights, min_score, max_score, start=0, num=batch)
+            if not heights:
+                return deleted
+            to_delete = [h for h in heights if int(h) not in keep]
+            if to_delete:
+                await self._delete(r, to_delete)
+                deleted += len(to_delete)
+            if len(heights) < batch:
+                return deleted
+            min_score = f'({int(heights[-1])}'
+
+    async def sweep(self, min_height: int, max_height: int = None, batch=SWEEP_BATCH) -> int:
+        """
+        Removes heights below "min_height" (and above "max_height", if given) in batches.
+        Keyframes just below "min_height" stay while some kept heights still refer to them.
+        """
+        r = await self._redis()
+        min_height = int(min_height)
+
+        keep = {int(h) for h in await r.zrangebyscore(self.key_keyframes,
+                                                      min_height - self.keyframe_every + 1, f'({min_height}')}
+        deleted = await self._sweep_range(r, '-inf', f'({min_height}', keep, batch)
+        if max_height is not None:
+            deleted += await self._sweep_range(r, f'({int(max_height)}', '+inf', batch=batch)
+        return deleted
+
+    async def clear(self):
+        r = await self._redis()
+        await r.delete(self.key_data, self.key_heights, self.key_keyframes)
+        self._keyframe_cache.clear()
+
+    async def import_legacy_hash(self, legacy_key: str, min_height=0, batch=SWEEP_BATCH, delete=True) -> int:
+        """ Moves the old "height -> full JSON" hash into the store in height order, skipping heights below min """
+        r = await self._redis()
+        heights = sorted(h for h in map(int, await r.hkeys(legacy_key)) if h >= min_height)
+        imported = 0
+        for i in range(0, len(heights), batch):
+            chunk = heights[i:i + batch]
+            items = []
+            for height, raw in zip(chunk, await r.hmget(legacy_key, [str(h) for h in chunk])):
+                try:
+                    pool_map = {k: PoolInfo.from_dict_brief(it) for k, it in ujson.loads(raw).items()}
+                except (TypeError, ValueError):
+                    continue
+                if pool_map and all(p is not None for p in pool_map.values()):
+                    items.append((height, pool_map))
+            imported += await self.put_many(items)
+        if delete:
+            await r.unlink(legacy_key)
+        return imported
+
+    # ---- stats ----
+
+    async def count(self) -> Tuple[int, int]:
+        r = await self._redis()
+        return await r.zcard(self.key_heights), await r.zcard(self.key_keyframes)
+
+    async def memory_usage(self) -> int:
+        r = await self._redis()
+        total = 0
+        for key in (self.key_data, self.key_heights, self.key_keyframes):
+            total += await r.memory_usage(key, samples=0) or 0
+        return total
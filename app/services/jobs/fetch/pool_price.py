@@ -1,11 +1,10 @@
-import json
-from contextlib import suppress
 from random import random
 from typing import Optional, List, Dict
 
 from aioredis import Redis
 
 from services.jobs.fetch.base import BaseFetcher
+from services.jobs.fetch.pool_cache import PoolSnapshotStore
 from services.lib.config import Config
 from services.lib.constants import RUNE_SYMBOL_DET, RUNE_SYMBOL_POOL, RUNE_SYMBOL_CEX, THOR_BLOCK_TIME, CACAO_DENOM
 from services.lib.date_utils import parse_timespan_to_seconds, DAY
@@ -33,9 +32,10 @@ class PoolFetcher(BaseFetcher):
         self.deps = deps
         self.use_thor_consensus = False
         self.parser = get_parser_by_network_id(self.deps.cfg.network_id)
-        self.history_max_points = 200000
+        self._rollups_checked = set()
         self._pool_cache_saves = 0
         self._pool_cache_clear_every = 1000
+        self._snapshots: Optional[PoolSnapshotStore] = None
 
     async def fetch(self) -> RuneMarketInfo:
         current_pools = await self.reload_global_pools()
@@ -63,6 +63,16 @@ class PoolFetcher(BaseFetcher):
 
         return price_holder.pool_info_map
 
+    async def _add_price_point(self, coin: str, price: float):
+        # the series is capped by MAXLEN on every write, and its rollups are updated in the same call
+        series = PriceTimeSeries(coin, self.deps.db)
+        if coin not in self._rollups_checked:
+            self._rollups_checked.add(coin)
+            if not await series.has_rollups():
+                self.logger.info(f'Building rollups of {series.stream_name} from the raw points...')
+                await series.rebuild_rollups()
+        await series.add(price=price)
+
     async def _write_price_time_series(self, rune_market_info: RuneMarketInfo):
         if not rune_market_info:
             self.logger.error('No rune_market_info!')
@@ -71,29 +81,21 @@ class PoolFetcher(BaseFetcher):
         if self.deps.price_holder:
             rune_market_info.pool_rune_price = self.deps.price_holder.usd_per_rune
 
-        db = self.deps.db
-
         # Pool price fill
         if rune_market_info.pool_rune_price and rune_market_info.pool_rune_price > 0:
-            pool_price_series = PriceTimeSeries(RUNE_SYMBOL_POOL, db)
-            await pool_price_series.add(price=rune_market_info.pool_rune_price)
-            await pool_price_series.trim_oldest(self.history_max_points)
+            await self._add_price_point(RUNE_SYMBOL_POOL, rune_market_info.pool_rune_price)
         else:
             self.logger.error(f'Odd {rune_market_info.pool_rune_price = }')
 
         # CEX price fill
         if rune_market_info.cex_price and rune_market_info.cex_price > 0:
-            cex_price_series = PriceTimeSeries(RUNE_SYMBOL_CEX, db)
-            await cex_price_series.add(price=rune_market_info.cex_price)
-            await cex_price_series.trim_oldest(self.history_max_points)
+            await self._add_price_point(RUNE_SYMBOL_CEX, rune_market_info.cex_price)
         # else:
         #     self.logger.warning(f'Odd {rune_market_info.cex_price = }')
 
         # Deterministic price fill
         if rune_market_info.fair_price and rune_market_info.fair_price > 0:
-            deterministic_price_series = PriceTimeSeries(RUNE_SYMBOL_DET, db)
-            await deterministic_price_series.add(price=rune_market_info.fair_price)
-            await deterministic_price_series.trim_oldest(self.history_max_points)
+            await self._add_price_point(RUNE_SYMBOL_DET, rune_market_info.fair_price)
         else:
             self.logger.warning(f'Odd {rune_market_info.fair_price = }')
 
@@ -106,63 +108,64 @@ class PoolFetcher(BaseFetcher):
 
         return {}
 
-    DB_KEY_POOL_INFO_HASH = 'PoolInfo:hashtable_v2'
+    @property
+    def snapshots(self) -> PoolSnapshotStore:
+        # created lazily: deps.db is not ready yet when the fetcher is constructed
+        if self._snapshots is None:
+            self._snapshots = PoolSnapshotStore(
+                self.deps.db,
+                keyframe_every=self.deps.cfg.as_int('price.pool_cache.keyframe_every',
+                                                    PoolSnapshotStore.DEFAULT_KEYFRAME_EVERY),
+            )
+        return self._snapshots
 
-    async def clear_cache(self, max_age=1000 * DAY):
-        r: Redis = await self.deps.db.get_redis()
+    DB_KEY_POOL_INFO_HASH = 'PoolInfo:hashtable_v2'  # legacy, imported by tools/migrate_pool_cache.py
+    POOL_CACHE_MAX_AGE = 1000 * DAY
 
+    @staticmethod
+    def min_cached_block(top_block: int, max_age=POOL_CACHE_MAX_AGE):
+        return int(max(1, top_block - max_age / THOR_BLOCK_TIME))
+
+    async def clear_cache(self, max_age=POOL_CACHE_MAX_AGE):
         top_block = self.deps.last_block_store.maya
         if top_block is None or top_block < 1:
             self.logger.warning(f'Failed to get top block from the store ({top_block = })')
             return
 
-        min_block = int(max(1, top_block - max_age / THOR_BLOCK_TIME))
-        block_numbers = await r.hkeys(self.DB_KEY_POOL_INFO_HASH)
-
-        cache_size = len(block_numbers)
-        blocks_to_delete = [b for b in block_numbers if int(b) < min_block or int(b) > top_block]
-        self.logger.info(f'Cache size: {cache_size}, entries to delete: {len(blocks_to_delete)}')
-
-        for block_number in blocks_to_delete:
-            await r.hdel(self.DB_KEY_POOL_INFO_HASH, block_number)
+        r: Redis = await self.deps.db.get_redis()
+        if await r.exists(self.DB_KEY_POOL_INFO_HASH):
+            self.logger.warning(f'The legacy pool cache is still there. Run tools/migrate_pool_cache.py.')
 
-        self.logger.info('Cache cleared successfully!')
+        deleted = await self.snapshots.sweep(self.min_cached_block(top_block, max_age), top_block)
+        heights, keyframes = await self.snapshots.count()
+        self.logger.info(f'Pool cache: {heights} heights ({keyframes} keyframes), {deleted} deleted.')
 
-    async def _save_to_cache(self, r: Redis, subkey, pool_map: PoolInfoMap):
-        j_pools = json.dumps({key: p.as_dict_brief() for key, p in pool_map.items()})
-        await r.hset(self.DB_KEY_POOL_INFO_HASH, str(subkey), j_pools)
+    async def _save_to_cache(self, subkey, pool_map: PoolInfoMap):
+        await self.snapshots.put(subkey, pool_map)
 
-        with suppress(Exception):
-            if self._pool_cache_saves % self._pool_cache_clear_every == 0:
+        saves = self._pool_cache_saves
+        self._pool_cache_saves += 1
+        if saves % self._pool_cache_clear_every == 0:
+            try:
                 await self.clear_cache()
-            self._pool_cache_saves += 1
+            except Exception as e:
+                self.logger.error(f'Failed to clear the pool cache: {e!r}')
 
-    async def _load_from_cache(self, r: Redis, subkey) -> Optional[PoolInfoMap]:
-        try:
-            cached_item = await r.hget(self.DB_KEY_POOL_INFO_HASH, str(subkey))
-            if cached_item:
-                raw_dict = json.loads(cached_item)
-                pool_map = {k: PoolInfo.from_dict_brief(it) for k, it in raw_dict.items()}
-                if all(p is not None for p in pool_map.values()):
-                    return pool_map
-        except (TypeError, ValueError):
-            self.logger.warning(f'Failed to load PoolInfoMap from the cache ({subkey = })')
-            return
+    async def _load_from_cache(self, subkey) -> Optional[PoolInfoMap]:
+        return await self.snapshots.get_pools_at(subkey)
 
     async def load_pools(self, height=None, caching=True, usd_per_rune=None) -> PoolInfoMap:
         if caching:
-            r: Redis = await self.deps.db.get_redis()
-
             if height is None:
                 # latest
                 pool_map = await self._fetch_current_pool_data_from_thornode()
                 cache_key = self.deps.last_block_store.maya
-                await self._save_to_cache(r, cache_key, pool_map)
+                await self._save_to_cache(cache_key, pool_map)
             else:
-                pool_map = await self._load_from_cache(r, height)
+                pool_map = await self._load_from_cache(height)
                 if not pool_map:
                     pool_map = await self._fetch_current_pool_data_from_thornode(height)
-                    await self._save_to_cache(r, height, pool_map)
+                    await self._save_to_cache(height, pool_map)
         else:
             pool_map = await self._fetch_current_pool_data_from_thornode(height)
 
@@ -179,6 +182,7 @@ class PoolFetcher(BaseFetcher):
     async def purge_pool_height_cache(self):
         r: Redis = await self.deps.db.get_redis()
         await r.delete(self.DB_KEY_POOL_INFO_HASH)
+        await self.snapshots.clear()
 
     _dbg_flag = 1
 
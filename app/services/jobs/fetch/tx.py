@@ -1,3 +1,4 @@
+import asyncio
 from typing import List, Optional
 
 from aiohttp import ContentTypeError
@@ -10,6 +11,7 @@ from services.lib.date_utils import parse_timespan_to_seconds, now_ts
 from services.lib.depcont import DepContainer
 from services.lib.midgard.parser import get_parser_by_network_id, TxParseResult
 from services.lib.midgard.urlgen import free_url_gen
+from services.lib.seen_set import TimeBucketedSeenSet
 from services.models.tx import ThorTx
 
 
@@ -36,6 +38,16 @@ class TxFetcher(BaseFetcher):
 
         self.pending_hash_to_height = {}
 
+        bucket_sec = deps.cfg.as_interval('tx.seen_filter.bucket', '1d')
+        min_buckets = int(self.max_age_sec // bucket_sec) + 2  # must cover "max_age" from any moment of a bucket
+        self.seen_set = TimeBucketedSeenSet(
+            deps.db, self.KEY_SEEN_TX_PREFIX,
+            bucket_sec=bucket_sec,
+            keep_buckets=max(min_buckets, deps.cfg.as_int('tx.seen_filter.keep_buckets', 0)),
+            bloom_capacity=deps.cfg.as_int('tx.seen_filter.bloom_capacity', 0),
+        )
+        self._legacy_seen_migrated = False
+
         self.logger.info(f'New TX fetcher is created for {self.tx_types}')
 
     async def fetch(self):
@@ -117,7 +129,8 @@ class TxFetcher(BaseFetcher):
             q_path = free_url_gen.url_for_tx(page * self.tx_per_batch, self.tx_per_batch, txid=txid, tx_type=tx_types)
 
         try:
-            j = await self.deps.midgard_connector.request(q_path)
+            # _fetch_one_batch_tries has its own retries; each of them still waits for the limiter
+            j = await self.deps.midgard_connector.request(q_path, retries=1)
             return self.tx_parser.parse_tx_response(j)
         except (ContentTypeError, AttributeError):
             return None
@@ -179,17 +192,16 @@ class TxFetcher(BaseFetcher):
         deepest_block_height = 1_000_000_000_000_000
         top_block_height = 0
 
-        futures = [
-            self._fetch_one_batch_tries(page, tries=self.RETRY_COUNT) for page in range(self.max_page_deep)
+        # All pages are requested at once, but MidgardConnector's AIMD limiter decides how many are in flight:
+        # it grows while Midgard answers well and backs off on 503/429. The results are handled in page order.
+        future_tasks = [
+            asyncio.ensure_future(self._fetch_one_batch_tries(page, tries=self.RETRY_COUNT))
+            for page in range(self.max_page_deep)
         ]
 
         number_of_pending_txs_this_tick = 0
         cleared_pending_hashes = set()
 
-        # future_tasks = asyncio.as_completed(futures)  # parallel
-        # fixme: as we use 9R servers, we have to run sequential fetching in order to avoid 503 errors
-        future_tasks = futures  # sequential
-
         for future in future_tasks:
             # get a batch of TXs
             results = await future
@@ -219,10 +231,10 @@ class TxFetcher(BaseFetcher):
                 # second, we select additionally OLD enough pending TXs
                 selected_txs += pending_old_txs
 
-            # filter out TXs from "selected_txs" that have been seen already
+            # filter out TXs from "selected_txs" that have been seen already (one round trip per page)
             unseen_new_txs = []
-            for tx in selected_txs:
-                is_seen = await self.is_seen(self.get_seen_hash(tx))
+            seen_flags = await self.are_seen([self.get_seen_hash(tx) for tx in selected_txs])
+            for tx, is_seen in zip(selected_txs, seen_flags):
                 if not is_seen:
                     unseen_new_txs.append(tx)
 
@@ -264,19 +276,35 @@ class TxFetcher(BaseFetcher):
             if tx.date_timestamp > now - self.max_age_sec:
                 yield tx
 
-    KEY_LAST_SEEN_TX_HASH = 'tx:scanner:last_seen:hash'
+    KEY_LAST_SEEN_TX_HASH = 'tx:scanner:last_seen:hash'  # legacy unbounded set, migrated once
+    KEY_SEEN_TX_PREFIX = 'tx:scanner:seen'
+
+    async def _migrate_legacy_seen_set(self):
+        if self._legacy_seen_migrated:
+            return
+        self._legacy_seen_migrated = True
+        r: Redis = await self.deps.db.get_redis()
+        if await r.exists(self.KEY_LAST_SEEN_TX_HASH):
+            moved = await self.seen_set.migrate_from_set(self.KEY_LAST_SEEN_TX_HASH)
+            self.logger.info(f'Moved {moved} seen tx hashes from the legacy set.')
+
+    async def are_seen(self, tx_hashes: List[str]) -> List[bool]:
+        await self._migrate_legacy_seen_set()
+        results = [True] * len(tx_hashes)  # empty hash is considered seen
+        indices = [i for i, h in enumerate(tx_hashes) if h]
+        flags = await self.seen_set.seen_many([tx_hashes[i] for i in indices])
+        for i, flag in zip(indices, flags):
+            results[i] = flag
+        return results
 
     async def is_seen(self, tx_hash):
-        if not tx_hash:
-            return True
-        r: Redis = self.deps.db.redis
-        return await r.sismember(self.KEY_LAST_SEEN_TX_HASH, tx_hash)
+        return (await self.are_seen([tx_hash]))[0]
 
     async def mark_tx_hashes_as_seen(self, hashes):
         if hashes:
-            r: Redis = await self.deps.db.get_redis()
-            await r.sadd(self.KEY_LAST_SEEN_TX_HASH, *hashes)
+            await self.seen_set.add_many(hashes)
 
     async def clear_all_seen_tx(self):
         r: Redis = await self.deps.db.get_redis()
         await r.delete(self.KEY_LAST_SEEN_TX_HASH)
+        await self.seen_set.clear()
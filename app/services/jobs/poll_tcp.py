@@ -1,66 +1,87 @@
 import asyncio
-import socket
+import random
+import time
 from collections import defaultdict
-from typing import Dict
-
-from services.lib.utils import grouper
+from typing import Dict, Tuple
 
 TCPPollResults = Dict[str, Dict[int, bool]]
 
 
 class TCPPollster:
-    def __init__(self, loop=None, test_timeout=0.5):
+    """
+    Checks if TCP ports accept connections. Probes are plain asyncio connections, so a whole sweep overlaps
+    and takes about as long as the slowest single probe (test_timeout at most);
+    "max_concurrency" is the global limit of the sockets open at once.
+    With cache_ttl > 0 a result is reused for cache_ttl seconds plus a stable per-host offset up to "jitter",
+    so the hosts come up for a real probe at different sweeps rather than all together.
+    """
+
+    def __init__(self, loop=None, test_timeout=0.5, max_concurrency=200, cache_ttl=0.0, jitter=0.0,
+                 clock=time.monotonic):
         self.test_timeout = test_timeout
         self.loop = loop or asyncio.get_event_loop()
+        self.cache_ttl = cache_ttl
+        self.jitter = jitter
+        self.clock = clock
+        self._semaphore = asyncio.Semaphore(max(1, int(max_concurrency)))
+        self._cache: Dict[Tuple[str, int], Tuple[float, bool]] = {}
         self._active_testers = 0
+        self.cache_hits = 0
+        self.probes = 0
 
-    def test_connectivity_sync(self, host, port, timeout):
-        s = socket.socket()
-        self._active_testers += 1
-        s.settimeout(timeout)
-        try:
-            s.connect((host, int(port)))
+    def _host_jitter(self, host):
+        return random.Random(host).uniform(0, self.jitter) if self.jitter > 0 else 0.0
 
-            # # fixme: debug!
-            # if host == '157.90.34.75':
-            #     return False
+    def _cached(self, host, port):
+        entry = self._cache.get((host, port))
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > self.clock():
+                return result
+            del self._cache[(host, port)]
+        return None
 
-            return True
-        except Exception as e:
-            return False
-        finally:
-            s.close()
-            self._active_testers -= 1
+    async def _probe(self, host, port, timeout):
+        async with self._semaphore:
+            self._active_testers += 1
+            self.probes += 1
+            writer = None
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+                return True
+            except (OSError, asyncio.TimeoutError, ValueError):
+                return False
+            finally:
+                self._active_testers -= 1
+                if writer is not None:
+                    writer.close()
 
     async def test_connectivity(self, host, port):
-        return await self.loop.run_in_executor(None, self.test_connectivity_sync, host, port, self.test_timeout)
+        port = int(port)
+        if self.cache_ttl > 0:
+            result = self._cached(host, port)
+            if result is not None:
+                self.cache_hits += 1
+                return result
 
-    async def _test_connectivity_multiple(self, ip_address_list: list, port_list: list) -> TCPPollResults:
-        results = await asyncio.gather(
-            *(self.test_connectivity(host, port) for host in ip_address_list for port in port_list)
-        )
-        keys = [(host, port) for host in ip_address_list for port in port_list]
+        result = await self._probe(host, port, self.test_timeout)
 
-        result_dict = defaultdict(dict)
-        for (host, port), result in zip(keys, results):
-            result_dict[host][port] = result
-        return result_dict
+        if self.cache_ttl > 0:
+            self._cache[(host, port)] = (self.clock() + self.cache_ttl + self._host_jitter(host), result)
+        return result
 
-    async def test_connectivity_multiple(self, ip_address_list, port_list, group_size=10) -> TCPPollResults:
+    async def test_connectivity_multiple(self, ip_address_list, port_list, group_size=None) -> TCPPollResults:
+        # group_size is no longer used: the semaphore limits the concurrency for the whole sweep
         ip_address_list = list(set(ip_address_list))
         port_list = list(set(port_list))
 
-        if group_size is None:
-            return await self._test_connectivity_multiple(ip_address_list, port_list)
-
-        result_groups = []
-        for group in grouper(group_size, ip_address_list):
-            result_groups.append(await self._test_connectivity_multiple(group, port_list))
+        keys = [(host, port) for host in ip_address_list for port in port_list]
+        results = await asyncio.gather(*(self.test_connectivity(host, port) for host, port in keys))
 
-        overall = {}
-        for group in result_groups:
-            overall.update(group)
-        return overall
+        result_dict = defaultdict(dict)
+        for (host, port), result in zip(keys, results):
+            result_dict[host][port] = result
+        return result_dict
 
     @staticmethod
     def count_stats(results: TCPPollResults):
@@ -0,0 +1,113 @@
+import asyncio
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import betterproto
+
+from proto.access import NativeThorTx, DecodedEvent, thor_decode_event
+from services.jobs.scanner.block_loader import BlockResult, LogItem
+from services.lib.utils import WithLogger, safe_get
+
+
+def _materialize(obj):
+    """
+    betterproto fills the unset fields with a sentinel object that is replaced with a default value on access.
+    Those sentinels do not survive pickling, so we touch every field before sending a message to the parent process.
+    """
+    if isinstance(obj, betterproto.Message):
+        for field in dataclasses.fields(obj):
+            _materialize(getattr(obj, field.name))
+    elif isinstance(obj, list):
+        for item in obj:
+            _materialize(item)
+
+
+def decode_txs_batch(raw_txs: List[str]) -> List[Optional[NativeThorTx]]:
+    # runs inside a worker process
+    results = []
+    for raw in raw_txs:
+        tx = BlockResult.decode_one_tx(raw)
+        if tx is not None:
+            _materialize(tx.tx)
+        results.append(tx)
+    return results
+
+
+def decode_events_batch(events: list, height: int) -> List[DecodedEvent]:
+    # runs inside a worker process
+    return [thor_decode_event(ev, height) for ev in events]
+
+
+def _chunks(items: list, size: int):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class BlockDecoderPool(WithLogger):
+    """
+    Decodes protobuf transactions and end-block events of the block in a pool of worker processes,
+    so that the event loop is not blocked by heavy blocks.
+    Tiny blocks are still decoded inline, because the inter-process overhead is bigger than the work itself.
+    """
+
+    DEFAULT_BATCH_SIZE = 50
+    DEFAULT_INLINE_THRESHOLD = 4
+
+    def __init__(self, max_workers: int = 2,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 inline_threshold=DEFAULT_INLINE_THRESHOLD):
+        super().__init__()
+        self.max_workers = max(1, int(max_workers))
+        self.batch_size = max(1, int(batch_size))
+        self.inline_threshold = inline_threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self.logger.info(f'Starting block decoder pool with {self.max_workers} workers.')
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run_batched(self, func, items: list, *args):
+        if len(items) < self.inline_threshold:
+            return func(items, *args)
+
+        loop = asyncio.get_running_loop()
+        batches = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, func, batch, *args)
+            for batch in _chunks(items, self.batch_size)
+        ))
+        return [item for batch in batches for item in batch]
+
+    async def decode_txs(self, raw_txs: List[str]) -> List[Optional[NativeThorTx]]:
+        return await self._run_batched(decode_txs_batch, list(raw_txs))
+
+    async def decode_events(self, events: list, height: int) -> List[DecodedEvent]:
+        return await self._run_batched(decode_events_batch, list(events), height)
+
+    async def load_txs(self, result, block_no) -> Optional[List[NativeThorTx]]:
+        """ The same as BlockResult.load_txs, but the decoding is done by the workers """
+        if BlockResult.get_is_error(result, block_no):
+            return
+
+        raw_txs = safe_get(result, 'result', 'block', 'data', 'txs') or []
+        return await self.decode_txs(raw_txs)
+
+    async def load_block(self, block_results_raw, block_no) -> BlockResult:
+        """ The same as BlockResult.load_block, but the end-block events are decoded by the workers """
+        if err := BlockResult.get_is_error(block_results_raw, block_no):
+            return err
+
+        tx_result_arr = safe_get(block_results_raw, 'result', 'txs_results') or []
+        decoded_tx_logs = [LogItem.load(tx_result) for tx_result in tx_result_arr]
+
+        end_block_events = safe_get(block_results_raw, 'result', 'end_block_events') or []
+        decoded_end_block_events = await self.decode_events(end_block_events, block_no)
+
+        return BlockResult(block_no, [], decoded_tx_logs, decoded_end_block_events)
@@ -82,7 +82,7 @@ class BlockResult:
         return replace(self, txs=new_txs, tx_logs=new_logs)
 
     @staticmethod
-    def _get_is_error(result, requested_block_height):
+    def get_is_error(result, requested_block_height):
         error = result.get('error')
         if error:
             code = error.get('code')
@@ -102,7 +102,7 @@ class BlockResult:
                                is_error=True, error_code=code, error_message=error_message)
 
     @staticmethod
-    def _decode_one_tx(raw):
+    def decode_one_tx(raw):
         try:
             return NativeThorTx.from_base64(raw)
         except Exception as e:
@@ -110,16 +110,16 @@ class BlockResult:
 
     @classmethod
     def load_txs(cls, result, block_no):
-        if cls._get_is_error(result, block_no):
+        if cls.get_is_error(result, block_no):
             return
 
         raw_txs = safe_get(result, 'result', 'block', 'data', 'txs') or []
         # some of them can be None!
-        return [cls._decode_one_tx(raw) for raw in raw_txs]
+        return [cls.decode_one_tx(raw) for raw in raw_txs]
 
     @classmethod
     def load_block(cls, block_results_raw, block_no):
-        if err := cls._get_is_error(block_results_raw, block_no):
+        if err := cls.get_is_error(block_results_raw, block_no):
             return err
 
         tx_result_arr = safe_get(block_results_raw, 'result', 'txs_results') or []
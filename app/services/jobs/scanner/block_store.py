@@ -0,0 +1,218 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import Optional, AsyncIterator, Tuple
+
+import ujson
+
+from services.lib.db import DB
+from services.lib.utils import WithLogger
+
+
+class BlockStore(ABC):
+    """
+    Archive of the raw THORNode responses for the block scanner: "block_results" and "block" by height.
+    """
+
+    KIND_RESULTS = 'results'
+    KIND_TXS = 'txs'
+    KINDS = (KIND_RESULTS, KIND_TXS)
+
+    @abstractmethod
+    async def get(self, kind: str, height: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def put(self, kind: str, height: int, data: dict):
+        ...
+
+    @abstractmethod
+    async def iterate(self, kind: str) -> AsyncIterator[Tuple[int, dict]]:
+        ...
+
+    async def close(self):
+        ...
+
+
+class RedisBlockStore(BlockStore):
+    """ Legacy storage: two unbounded Redis hashes """
+
+    DB_KEY_BLOCK = 'tx:scanner:cache:block'
+    DB_KEY_TXS = 'tx:scanner:cache:transactions'
+
+    def __init__(self, db: DB):
+        self.db = db
+
+    def _key(self, kind):
+        return self.DB_KEY_BLOCK if kind == self.KIND_RESULTS else self.DB_KEY_TXS
+
+    async def get(self, kind: str, height: int) -> Optional[dict]:
+        data = await self.db.redis.hget(self._key(kind), str(height))
+        return ujson.loads(data) if data else None
+
+    async def put(self, kind: str, height: int, data: dict):
+        await self.db.redis.hset(self._key(kind), str(height), ujson.dumps(data))
+
+    async def iterate(self, kind: str):
+        async for height, data in self.db.redis.hscan_iter(self._key(kind)):
+            yield int(height), ujson.loads(data)
+
+    async def count(self, kind: str):
+        return await self.db.redis.hlen(self._key(kind))
+
+    async def drop(self, kind: str):
+        await self.db.redis.delete(self._key(kind))
+
+
+class SqliteBlockStore(BlockStore, WithLogger):
+    """
+    Local on-disk archive. Every block is stored as zlib-compressed JSON in a table keyed by (kind, height).
+    When the file grows over "max_size_mb", the oldest heights are removed in batches;
+    SQLite reuses the freed pages, so the file does not grow further.
+    """
+
+    DEFAULT_PATH = './data/block_store/blocks.sqlite3'
+    DEFAULT_MAX_SIZE_MB = 2048
+    RETENTION_CHECK_EVERY = 100  # puts
+    RETENTION_BATCH = 1000  # heights
+
+    def __init__(self, path: str, max_size_mb=DEFAULT_MAX_SIZE_MB, compress_level=6):
+        super().__init__()
+        self.path = path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._puts_since_check = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            dir_name = os.path.dirname(self.path)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA mmap_size=268435456')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS blocks ('
+                'kind TEXT NOT NULL, height INTEGER NOT NULL, data BLOB NOT NULL, '
+                'PRIMARY KEY (kind, height)) WITHOUT ROWID'
+            )
+            self._conn = conn
+        return self._conn
+
+    def _encode(self, data: dict) -> bytes:
+        return zlib.compress(ujson.dumps(data).encode(), self.compress_level)
+
+    @staticmethod
+    def _decode(blob: bytes) -> dict:
+        return ujson.loads(zlib.decompress(blob))
+
+    async def _run(self, func, *args):
+        def locked():
+            with self._lock:
+                return func(self._connect(), *args)
+
+        return await asyncio.get_running_loop().run_in_executor(None, locked)
+
+    @staticmethod
+    def _get_sync(conn: sqlite3.Connection, kind, height):
+        row = conn.execute('SELECT data FROM blocks WHERE kind = ? AND height = ?', (kind, int(height))).fetchone()
+        return row[0] if row else None
+
+    async def get(self, kind: str, height: int) -> Optional[dict]:
+        blob = await self._run(self._get_sync, kind, height)
+        return self._decode(blob) if blob else None
+
+    @staticmethod
+    def _put_many_sync(conn: sqlite3.Connection, rows):
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO blocks (kind, height, data) VALUES (?, ?, ?)', rows)
+
+    async def put(self, kind: str, height: int, data: dict):
+        await self.put_many(kind, [(height, data)])
+
+    async def put_many(self, kind: str, items):
+        rows = [(kind, int(height), self._encode(data)) for height, data in items]
+        await self._run(self._put_many_sync, rows)
+
+        self._puts_since_check += len(rows)
+        if self._puts_since_check >= self.RETENTION_CHECK_EVERY:
+            self._puts_since_check = 0
+            await self.apply_retention()
+
+    @staticmethod
+    def _size_sync(conn: sqlite3.Connection):
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    async def used_size(self):
+        return await self._run(self._size_sync)
+
+    def _retention_sync(self, conn: sqlite3.Connection):
+        deleted = 0
+        while self._size_sync(conn) > self.max_size_bytes:
+            min_height = conn.execute('SELECT MIN(height) FROM blocks').fetchone()[0]
+            if min_height is None:
+                break
+            with conn:
+                cursor = conn.execute('DELETE FROM blocks WHERE height < ?', (min_height + self.RETENTION_BATCH,))
+            deleted += cursor.rowcount
+        return deleted
+
+    async def apply_retention(self):
+        deleted = await self._run(self._retention_sync)
+        if deleted:
+            self.logger.info(f'Retention: removed {deleted} old records from the block store.')
+        return deleted
+
+    @staticmethod
+    def _range_sync(conn: sqlite3.Connection, kind):
+        return conn.execute('SELECT MIN(height), MAX(height), COUNT(*) FROM blocks WHERE kind = ?', (kind,)).fetchone()
+
+    async def height_range(self, kind: str):
+        """ Returns (min_height, max_height, count) """
+        return await self._run(self._range_sync, kind)
+
+    @staticmethod
+    def _page_sync(conn: sqlite3.Connection, kind, after_height, limit):
+        return conn.execute(
+            'SELECT height, data FROM blocks WHERE kind = ? AND height > ? ORDER BY height LIMIT ?',
+            (kind, after_height, limit)
+        ).fetchall()
+
+    async def iterate(self, kind: str, page_size=100):
+        after_height = -1
+        while True:
+            rows = await self._run(self._page_sync, kind, after_height, page_size)
+            if not rows:
+                break
+            for height, blob in rows:
+                yield height, self._decode(blob)
+            after_height = rows[-1][0]
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def make_block_store(deps) -> BlockStore:
+    cfg = deps.cfg
+    backend = cfg.as_str('native_scanner.block_store.backend', 'sqlite')
+    if backend == 'redis':
+        return RedisBlockStore(deps.db)
+    elif backend == 'sqlite':
+        return SqliteBlockStore(
+            path=cfg.as_str('native_scanner.block_store.path', SqliteBlockStore.DEFAULT_PATH),
+            max_size_mb=cfg.as_float('native_scanner.block_store.max_size_mb', SqliteBlockStore.DEFAULT_MAX_SIZE_MB),
+        )
+    else:
+        raise ValueError(f'Unknown block store backend: {backend!r}')
@@ -1,12 +1,13 @@
 import json
 from contextlib import suppress
-from typing import Optional
+from typing import Optional, Dict, Iterable
 
 from aioredis import Redis
 
 from services.jobs.scanner.swap_props import SwapProps
 from services.lib.date_utils import DAY
 from services.lib.db import DB
+from services.lib.db_key_index import scan_keys
 from services.lib.utils import WithLogger
 
 
@@ -25,6 +26,23 @@ class EventDatabase(WithLogger):
         props = await r.hgetall(self.key_to_tx(tx_id))
         return SwapProps.restore_events_from_tx_status(props)
 
+    async def read_many_tx_raw(self, tx_ids: Iterable[str]) -> Dict[str, dict]:
+        """ Reads raw hashes of many txs in one round trip """
+        tx_ids = list(tx_ids)
+        if not tx_ids:
+            return {}
+
+        r: Redis = await self.db.get_redis()
+        pipe = r.pipeline(transaction=False)
+        for tx_id in tx_ids:
+            pipe.hgetall(self.key_to_tx(tx_id))
+        results = await pipe.execute()
+        return dict(zip(tx_ids, results))
+
+    async def read_many_tx_status(self, tx_ids: Iterable[str]) -> Dict[str, Optional[SwapProps]]:
+        raw = await self.read_many_tx_raw(tx_ids)
+        return {tx_id: SwapProps.restore_events_from_tx_status(props) for tx_id, props in raw.items()}
+
     @staticmethod
     def _convert_type(v):
         if isinstance(v, bool):
@@ -50,15 +68,37 @@ class EventDatabase(WithLogger):
     async def write_tx_status_kw(self, tx_id, **kwargs):
         await self.write_tx_status(tx_id, kwargs)
 
+    async def write_many(self, mutations: Dict[str, dict]):
+        """ Writes the mappings of many txs in a single MULTI/EXEC transaction """
+        mutations = {tx_id: mapping for tx_id, mapping in mutations.items() if mapping}
+        if not mutations:
+            return
+
+        r: Redis = await self.db.get_redis()
+        expiration_sec = int(self._expiration_sec)
+        pipe = r.pipeline(transaction=True)
+        for tx_id, mapping in mutations.items():
+            key = self.key_to_tx(tx_id)
+            pipe.hset(key, mapping={k: self._convert_type(v) for k, v in mapping.items()})
+            pipe.expire(key, expiration_sec)
+        await pipe.execute()
+
+    async def begin_batch(self, tx_ids: Iterable[str]) -> 'TxStatusBatch':
+        """ Reads the current state of all given txs at once; use it to collect the mutations of one block """
+        return TxStatusBatch(self, await self.read_many_tx_raw(set(tx_ids)))
+
     @property
     def all_keys_pattern(self):
         return self.key_to_tx('*')
 
-    async def load_all_keys(self):
-        pattern = self.all_keys_pattern
+    async def iter_all_keys(self):
+        # tx records expire by themselves, so a full walk is unavoidable; SCAN does not block Redis
         r: Redis = await self.db.get_redis()
-        keys = await r.keys(pattern)
-        return keys
+        async for key in scan_keys(r, self.all_keys_pattern):
+            yield key
+
+    async def load_all_keys(self):
+        return list({key async for key in self.iter_all_keys()})
 
     async def backup(self, filename):
         self.logger.info('Saving a backup')
@@ -91,3 +131,44 @@ class EventDatabase(WithLogger):
         with suppress(Exception):
             r: Redis = await self.db.get_redis()
             await r.delete(self.DB_KEY_SS_STARTED_SET)
+
+
+class TxStatusBatch:
+    """
+    Collects tx status mutations in memory and writes them with one call to EventDatabase.write_many.
+    Reads see the state loaded by EventDatabase.begin_batch plus all mutations made so far.
+    """
+
+    def __init__(self, event_db: EventDatabase, raw_state: Dict[str, dict]):
+        self._event_db = event_db
+        self._state = {tx_id: dict(attrs or {}) for tx_id, attrs in raw_state.items()}
+        self._mutations: Dict[str, dict] = {}
+
+    @staticmethod
+    def _as_stored(v):
+        # the way the value will come back from Redis
+        v = EventDatabase._convert_type(v)
+        if isinstance(v, bytes):
+            return v.decode()
+        elif isinstance(v, float):
+            return repr(v)
+        return str(v)
+
+    def read_tx_status(self, tx_id) -> Optional[SwapProps]:
+        return SwapProps.restore_events_from_tx_status(self._state.get(tx_id))
+
+    def write_tx_status(self, tx_id, mapping):
+        if mapping:
+            self._mutations.setdefault(tx_id, {}).update(mapping)
+            self._state.setdefault(tx_id, {}).update({k: self._as_stored(v) for k, v in mapping.items()})
+
+    def write_tx_status_kw(self, tx_id, **kwargs):
+        self.write_tx_status(tx_id, kwargs)
+
+    @property
+    def pending_count(self):
+        return len(self._mutations)
+
+    async def flush(self):
+        mutations, self._mutations = self._mutations, {}
+        await self._event_db.write_many(mutations)
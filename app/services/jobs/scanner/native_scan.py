@@ -1,8 +1,10 @@
 import asyncio
-from typing import List, Optional
+import time
+from typing import List, Optional, Dict
 
 from proto.access import NativeThorTx
 from services.jobs.fetch.base import BaseFetcher
+from services.jobs.scanner.block_decoder import BlockDecoderPool
 from services.jobs.scanner.block_loader import BlockResult
 from services.lib.constants import THOR_BLOCK_TIME
 from services.lib.date_utils import now_ts
@@ -10,12 +12,51 @@ from services.lib.depcont import DepContainer
 from services.lib.utils import safe_get
 
 
+class BlockPrefetcher:
+    """
+    Keeps up to "window" block heights in flight at once, so the catch-up scan does not wait for every block
+    one by one. Results are still handed out strictly by height.
+    """
+
+    def __init__(self, loader, window: int):
+        self._loader = loader
+        self.window = max(1, int(window))
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def _schedule(self, start_height, top_height):
+        end_height = min(start_height + self.window, top_height + 1)
+        for height in range(start_height, end_height):
+            if height not in self._tasks:
+                self._tasks[height] = asyncio.create_task(self._loader(height))
+
+    def _drop_before(self, height):
+        for stale_height in [h for h in self._tasks if h < height]:
+            self._tasks.pop(stale_height).cancel()
+
+    async def get(self, height, top_height):
+        # after a jump the heights before the new one are of no use
+        self._drop_before(height)
+        self._schedule(height, max(height, top_height))
+        return await self._tasks.pop(height)
+
+    @property
+    def in_flight(self):
+        return len(self._tasks)
+
+    def cancel_all(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
 class NativeScannerBlock(BaseFetcher):
     MAX_ATTEMPTS_TO_SKIP_BLOCK = 5
+    DEFAULT_PREFETCH_WINDOW = 10
 
     NAME = 'block_scanner'
 
-    def __init__(self, deps: DepContainer, sleep_period=None, last_block=0, max_attempts=MAX_ATTEMPTS_TO_SKIP_BLOCK):
+    def __init__(self, deps: DepContainer, sleep_period=None, last_block=0, max_attempts=MAX_ATTEMPTS_TO_SKIP_BLOCK,
+                 prefetch_window=DEFAULT_PREFETCH_WINDOW):
         sleep_period = sleep_period or THOR_BLOCK_TIME * 0.99
         super().__init__(deps, sleep_period)
         self._last_block = last_block
@@ -26,6 +67,14 @@ class NativeScannerBlock(BaseFetcher):
         self._block_cycle = 0
         self._last_block_ts = 0
 
+        # how many block heights are requested concurrently during the aggressive scan (1 = no prefetch)
+        self.prefetch_window = max(1, int(prefetch_window))
+        self._catch_up_speed = 0.0  # blocks per second of the last aggressive scan
+        self._catch_up_blocks = 0
+
+        # if set, the protobuf decoding is done in the worker processes instead of the event loop
+        self.decoder: Optional[BlockDecoderPool] = None
+
         # if more time has passed since the last block, we should run aggressive scan
         self._time_tolerance_for_aggressive_scan = THOR_BLOCK_TIME * 1.1  # 6 sec + 10%
 
@@ -37,6 +86,15 @@ class NativeScannerBlock(BaseFetcher):
     def block_cycle(self):
         return self._block_cycle
 
+    @property
+    def catch_up_speed(self):
+        """Blocks per second processed during the last aggressive (catch-up) scan"""
+        return self._catch_up_speed
+
+    @property
+    def catch_up_blocks(self):
+        return self._catch_up_blocks
+
     @property
     def last_block(self):
         return self._last_block
@@ -113,13 +171,35 @@ class NativeScannerBlock(BaseFetcher):
         self._block_cycle = 0
 
         aggressive = self.should_run_aggressive_scan()
+        prefetcher = None
         if aggressive:
             self.logger.info('Aggressive scan will be run at this tick.')
-
+            if self.prefetch_window > 1 and not self.one_block_per_run:
+                prefetcher = BlockPrefetcher(self.fetch_one_block_concurrently, self.prefetch_window)
+
+        t0 = time.monotonic()
+        try:
+            await self._scan_loop(aggressive, prefetcher)
+        finally:
+            if prefetcher:
+                prefetcher.cancel_all()
+
+        if aggressive and self._block_cycle > 1:
+            elapsed = time.monotonic() - t0
+            self._catch_up_blocks = self._block_cycle
+            self._catch_up_speed = self._block_cycle / elapsed if elapsed > 0 else 0.0
+            self.logger.info(f'Catch-up: {self._block_cycle} blocks in {elapsed:.2f} sec '
+                             f'({self._catch_up_speed:.2f} blocks/sec, window = {self.prefetch_window}).')
+
+    async def _scan_loop(self, aggressive, prefetcher: Optional[BlockPrefetcher]):
         while True:
             try:
                 self.logger.info(f'Fetching block #{self._last_block}. Cycle: {self._block_cycle}.')
-                block_result = await self.fetch_one_block(self._last_block)
+                if prefetcher:
+                    top_block = int(self.deps.last_block_store or 0)
+                    block_result = await prefetcher.get(self._last_block, top_block)
+                else:
+                    block_result = await self.fetch_one_block(self._last_block)
 
                 if block_result is None:
                     self._on_error('None returned')
@@ -179,6 +259,8 @@ class NativeScannerBlock(BaseFetcher):
     async def fetch_block_results(self, block_no) -> Optional[BlockResult]:
         block_results_raw = await self._fetch_block_results_raw(block_no)
         if block_results_raw is not None:
+            if self.decoder:
+                return await self.decoder.load_block(block_results_raw, block_no)
             block_result = BlockResult.load_block(block_results_raw, block_no)
             return block_result
         else:
@@ -190,6 +272,8 @@ class NativeScannerBlock(BaseFetcher):
     async def fetch_block_txs(self, block_no) -> Optional[List[NativeThorTx]]:
         result = await self._fetch_block_txs_raw(block_no)
         if result is not None:
+            if self.decoder:
+                return await self.decoder.load_txs(result, block_no)
             return BlockResult.load_txs(result, block_no)
         else:
             self.logger.warning(f'Error fetching block #{block_no}.')
@@ -206,6 +290,23 @@ class NativeScannerBlock(BaseFetcher):
 
         # This is needed to get user intents from the block (Deposits and Sends).
         txs = await self.fetch_block_txs(block_index)
+        return self._combine_block(block_index, block_result, txs)
+
+    async def fetch_one_block_concurrently(self, block_index) -> Optional[BlockResult]:
+        # Same as fetch_one_block, but "block_results" and "block" are requested at the same time
+        block_result, txs = await asyncio.gather(
+            self.fetch_block_results(block_index),
+            self.fetch_block_txs(block_index),
+        )
+        if block_result is None:
+            return
+
+        if block_result.is_error:
+            return block_result
+
+        return self._combine_block(block_index, block_result, txs)
+
+    def _combine_block(self, block_index, block_result: BlockResult, txs) -> Optional[BlockResult]:
         block_result.fill_transactions(txs)
         if block_result.txs is None:
             self.logger.error(f'Failed to get transactions of the block #{block_index}.')
@@ -1,34 +1,30 @@
-import ujson
+from typing import Optional
 
+from services.jobs.scanner.block_store import BlockStore, make_block_store
 from services.jobs.scanner.native_scan import NativeScannerBlock
 from services.lib.depcont import DepContainer
 
 
 class NativeScannerBlockCached(NativeScannerBlock):
-    DB_KEY_BLOCK = 'tx:scanner:cache:block'
-    DB_KEY_TXS = 'tx:scanner:cache:transactions'
-
     def __init__(self, deps: DepContainer,
                  sleep_period=None, last_block=0,
-                 max_attempts=NativeScannerBlock.MAX_ATTEMPTS_TO_SKIP_BLOCK):
+                 max_attempts=NativeScannerBlock.MAX_ATTEMPTS_TO_SKIP_BLOCK,
+                 store: Optional[BlockStore] = None):
         super().__init__(deps, sleep_period, last_block, max_attempts)
+        self.store = store or make_block_store(deps)
 
-    async def _fetch_block_results_raw(self, block_no):
-        cached_data = await self.deps.db.redis.hget(self.DB_KEY_BLOCK, str(block_no))
+    async def _fetch_cached(self, kind, block_no, real_fetcher):
+        cached_data = await self.store.get(kind, block_no)
         if cached_data:
-            return ujson.loads(cached_data)
+            return cached_data
         else:
-            real_block = await super()._fetch_block_results_raw(block_no)
-            if real_block:
-                await self.deps.db.redis.hset(self.DB_KEY_BLOCK, str(block_no), ujson.dumps(real_block))
-            return real_block
+            real_data = await real_fetcher(block_no)
+            if real_data:
+                await self.store.put(kind, block_no, real_data)
+            return real_data
+
+    async def _fetch_block_results_raw(self, block_no):
+        return await self._fetch_cached(BlockStore.KIND_RESULTS, block_no, super()._fetch_block_results_raw)
 
     async def _fetch_block_txs_raw(self, block_no):
-        cached_data = await self.deps.db.redis.hget(self.DB_KEY_TXS, str(block_no))
-        if cached_data:
-            return ujson.loads(cached_data)
-        else:
-            real_block_txs = await super()._fetch_block_txs_raw(block_no)
-            if real_block_txs:
-                await self.deps.db.redis.hset(self.DB_KEY_TXS, str(block_no), ujson.dumps(real_block_txs))
-            return real_block_txs
+        return await self._fetch_cached(BlockStore.KIND_TXS, block_no, super()._fetch_block_txs_raw)
@@ -4,7 +4,7 @@ from collections import defaultdict
 from typing import List, Optional
 
 from services.jobs.affiliate_merge import ZERO_HASH
-from services.jobs.scanner.event_db import EventDatabase
+from services.jobs.scanner.event_db import EventDatabase, TxStatusBatch
 from services.jobs.scanner.native_scan import BlockResult
 from services.jobs.scanner.swap_props import SwapProps
 from services.jobs.scanner.swap_start_detector import SwapStartDetector
@@ -38,17 +38,26 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
     async def on_data(self, sender, block: BlockResult) -> List[ThorTx]:
         new_swaps = self._swap_detector.detect_swaps(block)
 
-        # Incoming swap intentions will be recorded in the DB
-        await self.register_new_swaps(new_swaps, block.block_no)
-
         # Swaps and Outs
         interesting_events = list(self.get_events_of_interest(block))
 
+        # Read phase: the state of all involved txs in one round trip
+        batch = await self._db.begin_batch(
+            [swap.tx_id for swap in new_swaps] +
+            [ev.tx_id for ev in interesting_events if ev.tx_id]
+        )
+
+        # Incoming swap intentions will be recorded in the DB
+        await self.register_new_swaps(batch, new_swaps, block.block_no)
+
         # To calculate progress and final slip/fees
-        await self.register_swap_events(block, interesting_events)
+        self.register_swap_events(batch, block, interesting_events)
 
         # Extract finished TX
-        txs = await self.detect_swap_finished(block, interesting_events)
+        txs = self.detect_swap_finished(batch, interesting_events)
+
+        # Write phase: all mutations of this block at once
+        await batch.flush()
 
         # --8<-- debugging stuff --8<--
         if self.dbg_watch_swap_id:
@@ -60,14 +69,14 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
 
         return txs
 
-    async def register_new_swaps(self, swaps: List[AlertSwapStart], height):
+    async def register_new_swaps(self, batch: TxStatusBatch, swaps: List[AlertSwapStart], height):
         self.logger.info(f"New swaps {len(swaps)} in block #{height}")
 
         for swap in swaps:
-            props = await self._db.read_tx_status(swap.tx_id)
+            props = batch.read_tx_status(swap.tx_id)
             if not props or not props.attrs.get('status'):
                 # self.logger.debug(f'Detect new swap: {swap.tx_id} from {swap.from_address} ({swap.memo})')
-                await self._db.write_tx_status_kw(
+                batch.write_tx_status_kw(
                     swap.tx_id,
                     id=swap.tx_id,
                     status=SwapProps.STATUS_OBSERVED_IN,
@@ -97,7 +106,9 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
     def do_write_event(self, tx_id):
         return not self.dbg_watch_swap_id or self.dbg_watch_swap_id == tx_id
 
-    async def register_swap_events(self, block: BlockResult, interesting_events: List[TypeEventSwapAndOut]):
+    @staticmethod
+    def register_swap_events(batch: TxStatusBatch, block: BlockResult,
+                             interesting_events: List[TypeEventSwapAndOut]):
         # boom = False
 
         for swap_ev in interesting_events:
@@ -106,7 +117,7 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
 
             hash_key = hash_of_string_repr(swap_ev, block.block_no)
 
-            await self._db.write_tx_status(swap_ev.tx_id, {
+            batch.write_tx_status(swap_ev.tx_id, {
                 f"ev_{hash_key}": swap_ev.original.to_dict
             })
 
@@ -141,9 +152,9 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
             tx = swap_info.build_tx()
             return tx
 
-    async def detect_swap_finished(self,
-                                   block: BlockResult,
-                                   interesting_events: List[TypeEventSwapAndOut]) -> List[ThorTx]:
+    def detect_swap_finished(self,
+                             batch: TxStatusBatch,
+                             interesting_events: List[TypeEventSwapAndOut]) -> List[ThorTx]:
         """
             We do not wait until scheduled outbound will be sent out.
             Swap end is detected by
@@ -159,7 +170,7 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
 
         results = []
         for tx_id, group in group_by_in.items():
-            swap_props = await self._db.read_tx_status(tx_id)
+            swap_props = batch.read_tx_status(tx_id)
             if not swap_props:
                 self.logger.warning(f'There are outbounds for tx {tx_id}, but there is no info about its initiation.')
                 continue
@@ -171,7 +182,7 @@ class SwapExtractorBlock(WithDelegates, INotified, WithLogger):
             # if no swaps, it is full refund
             if swap_props.has_started and swap_props.has_swaps and swap_props.is_finished and not given_away:
                 # to ignore it in the future
-                await self._db.write_tx_status_kw(tx_id, status=SwapProps.STATUS_GIVEN_AWAY)
+                batch.write_tx_status_kw(tx_id, status=SwapProps.STATUS_GIVEN_AWAY)
 
                 results.append(swap_props.build_tx())
 
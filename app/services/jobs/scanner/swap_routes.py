@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from typing import List
 
 from services.lib.db import DB
+from services.lib.db_key_index import scan_keys, KEY_BATCH
 from services.lib.delegates import INotified
 from services.lib.logs import WithLogger
 from services.lib.money import pretty_dollar
@@ -20,6 +21,7 @@ class SwapRouteRecorder(WithLogger, INotified):
         self.keep_days = 60
         self.clear_every_ticks = 10
         self._clear_counter = 0
+        self._migrated = False
 
     @staticmethod
     def _date_format(date):
@@ -28,13 +30,28 @@ class SwapRouteRecorder(WithLogger, INotified):
     def _prefixed_key(self, route, date):
         return f"{self.key_prefix}:route:{route}:{self._date_format(date)}"
 
+    def _key_day_index(self, date):
+        # set of the routes of the day; it does not match the "prefix:route:*" pattern on purpose
+        return f"{self.key_prefix}:route-index:{self._date_format(date)}"
+
+    @property
+    def key_migrated(self):
+        # set once the day indexes are backfilled for the days recorded before they existed
+        return f"{self.key_prefix}:route-index:migrated"
+
+    async def _routes_of_day(self, date):
+        return await self.redis.smembers(self._key_day_index(date))
+
     async def store_swap_event(self, from_asset, to_asset, volume, dt: datetime):
         if volume <= 0:
             return
 
         route = f"{from_asset}{ROUTE_SEP}{to_asset}"
         key = self._prefixed_key(route, dt)
-        await self.redis.hincrbyfloat(key, "volume", volume)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrbyfloat(key, "volume", volume)
+        pipe.sadd(self._key_day_index(dt), route)
+        await pipe.execute()
         self.logger.debug(f"Stored swap event: {route} {pretty_dollar(volume)} at {dt}")
 
     async def get_top_swap_routes_by_volume(self, days=7, top_n=3) -> List[SwapRouteEntry]:
@@ -44,17 +61,19 @@ class SwapRouteRecorder(WithLogger, INotified):
 
         route_volume = defaultdict(float)
 
-        key_start_pos = len(self.key_prefix) + 1
-
         for date in date_range:
-            keys = await self.redis.keys(self._prefixed_key('*', date))
+            routes = list(await self._routes_of_day(date))
+            if not routes:
+                continue
 
-            for key in keys:
-                route = key[key_start_pos:].split(':')[1]
-                volume = float(await self.redis.hget(key, "volume") or 0)
+            pipe = self.redis.pipeline(transaction=False)
+            for route in routes:
+                pipe.hget(self._prefixed_key(route, date), "volume")
+            volumes = await pipe.execute()
 
+            for route, volume in zip(routes, volumes):
                 from_asset, to_asset = route.split(ROUTE_SEP)
-                route_volume[(from_asset, to_asset)] += volume
+                route_volume[(from_asset, to_asset)] += float(volume or 0)
 
         # Get the top N routes by volume
         top_routes = sorted(route_volume.items(), key=lambda item: item[1], reverse=True)[:top_n]
@@ -72,9 +91,11 @@ class SwapRouteRecorder(WithLogger, INotified):
         fail_count = 0
         total_deleted = 0
         while True:
-            keys = await self.redis.keys(self._prefixed_key('*', cutoff_time))
-            if keys:
-                await self.redis.delete(*keys)
+            index_key = self._key_day_index(cutoff_time)
+            routes = await self.redis.smembers(index_key)
+            if routes:
+                keys = [self._prefixed_key(route, cutoff_time) for route in routes]
+                await self.redis.delete(*keys, index_key)
                 total_deleted += len(keys)
             else:
                 fail_count += 1
@@ -85,6 +106,44 @@ class SwapRouteRecorder(WithLogger, INotified):
 
         self.logger.info(f"Deleted {total_deleted} old swap events older than {days} days")
 
+    async def migrate_legacy_days(self):
+        """
+        The only SCAN walk, once per database: the routes of the days recorded before the day index existed
+        are added to their day indexes (or deleted if they are already older than keep_days), then the marker is set.
+        The readers only use the indexes.
+        """
+        if self._migrated:
+            return 0
+        if await self.redis.get(self.key_migrated):
+            self._migrated = True
+            return 0
+
+        cutoff_date = (datetime.now() - timedelta(days=self.keep_days)).date() if self.keep_days > 0 else None
+        key_start_pos = len(self.key_prefix) + 1
+        indexed, obsolete = defaultdict(set), []
+        async for key in scan_keys(self.redis, f"{self.key_prefix}:route:*"):
+            try:
+                _, route, date_str = key[key_start_pos:].split(':')
+                date = datetime.strptime(date_str, '%d.%m.%Y')
+            except ValueError:
+                continue
+            if cutoff_date and date.date() <= cutoff_date:
+                obsolete.append(key)
+            else:
+                indexed[self._key_day_index(date)].add(route)
+
+        pipe = self.redis.pipeline(transaction=False)
+        for index_key, routes in indexed.items():
+            pipe.sadd(index_key, *routes)
+        for i in range(0, len(obsolete), KEY_BATCH):
+            pipe.delete(*obsolete[i:i + KEY_BATCH])
+        pipe.set(self.key_migrated, 1)
+        await pipe.execute()
+
+        self._migrated = True
+        self.logger.info(f"Day indexes backfilled for {len(indexed)} days; {len(obsolete)} obsolete keys deleted")
+        return len(indexed)
+
     async def _clear_routes_if_needed(self):
         if self.keep_days > 0:
             self._clear_counter += 1
@@ -106,6 +165,8 @@ class SwapRouteRecorder(WithLogger, INotified):
         await self.redis.delete(self.key_counted_routes)
 
     async def on_data(self, sender, data: List[ThorTx]):
+        await self.migrate_legacy_days()
+
         for tx in data:
             if not tx.meta_swap:
                 continue  # skip non-swap tx
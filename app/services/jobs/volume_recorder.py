@@ -60,19 +60,18 @@ class VolumeRecorder(WithDelegates, INotified, WithLogger):
         self.logger.info(f'Update {date_timestamp}: '
                          f'{add = :.0f}, {swap = :.0f}, {synth = :.0f}, '
                          f'{withdraw = :.0f}')
-        await self._accumulator.add(
+        await self._accumulator.add_many(
             date_timestamp,
-            **{
+            {
                 self.KEY_SWAP: swap,
                 self.KEY_SWAP_SYNTH: synth,
                 self.KEY_ADD_LIQUIDITY: add,
                 self.KEY_WITHDRAW_LIQUIDITY: withdraw,
+            },
+            {
+                'price': current_price,  # it is better to get price at the tx's block!
             }
         )
-        await self._accumulator.set(
-            date_timestamp,
-            price=current_price,  # it is better to get price at the tx's block!
-        )
 
     async def get_data_instant(self, ts=None):
         return await self._accumulator.get(ts)
@@ -96,9 +95,15 @@ class VolumeRecorderSwapEvent(VolumeRecorder):
     async def handle_txs_unsafe(self, events: List[EventSwap], ts=None):
         ph = self.deps.price_holder
         ts = datetime.datetime.now().timestamp()
+        swap, synth = 0.0, 0.0
         for event in events:
             usd_value = ph.convert_to_usd(event.amount, event.asset)
             is_synth = '/' in event.asset
 
             synth_volume = usd_value if is_synth else usd_value
-            await self._add_point(ts, 0.0, usd_value, synth_volume, 0.0, ph.usd_per_rune)
+            swap += usd_value
+            synth += synth_volume
+
+        # all events share the timestamp, hence one bucket update for the whole batch
+        if events:
+            await self._add_point(ts, 0.0, swap, synth, 0.0, ph.usd_per_rune)
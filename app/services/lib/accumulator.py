@@ -1,35 +1,123 @@
-import asyncio
+from typing import Dict, Optional, Iterable
+
+from aioredis.client import Script
 
 from services.lib.date_utils import now_ts
 from services.lib.db import DB
+from services.lib.db_key_index import scan_keys, KEY_BATCH
 from services.lib.utils import take_closest
 
+# Reduces many bucket hashes on the Redis side: only per-field sum/min/max/count go back.
+# KEYS = bucket keys; ARGV = fields to reduce (none = all fields)
+# Returns a flat list: field, sum, min, max, count, field, ...
+LUA_REDUCE_BUCKETS = """
+local only = {}
+local has_filter = #ARGV > 0
+for _, f in ipairs(ARGV) do
+    only[f] = true
+end
+
+local stats, order = {}, {}
+for _, key in ipairs(KEYS) do
+    local flat = redis.call('HGETALL', key)
+    for i = 1, #flat, 2 do
+        local f, v = flat[i], tonumber(flat[i + 1])
+        if v and (not has_filter or only[f]) then
+            local s = stats[f]
+            if not s then
+                stats[f] = {v, v, v, 1}
+                order[#order + 1] = f
+            else
+                s[1] = s[1] + v
+                if v < s[2] then s[2] = v end
+                if v > s[3] then s[3] = v end
+                s[4] = s[4] + 1
+            end
+        end
+    end
+end
+
+local result = {}
+for _, f in ipairs(order) do
+    local s = stats[f]
+    for _, x in ipairs({f, string.format('%.17g', s[1]), string.format('%.17g', s[2]),
+                        string.format('%.17g', s[3]), tostring(s[4])}) do
+        result[#result + 1] = x
+    end
+end
+return result
+"""
+
 
 class Accumulator:
+    GET_CHUNK = 1000  # buckets per pipeline / script call
+
+    _reduce_script: Optional[Script] = None
+
     def __init__(self, name, db: DB, tolerance: float):
         self.name = name
         self.db = db
         self.tolerance = tolerance
+        self._index_ready = False
 
     def key(self, k):
         return f'Accum:{self.name}:{k}'
 
+    def bucket(self, ts):
+        return int(ts // self.tolerance * self.tolerance)
+
     def key_from_ts(self, ts):
-        k = int(ts // self.tolerance * self.tolerance)
-        return self.key(k)
+        return self.key(self.bucket(ts))
+
+    @property
+    def key_index(self):
+        # sorted set: bucket key -> bucket timestamp; it does not match the "Accum:name:*" pattern on purpose
+        return f'AccumIndex:{self.name}'
+
+    @property
+    def key_index_built(self):
+        # set once the buckets written before the index existed are in it; the writers ZADD to the index anyway
+        return f'{self.key_index}:Built'
+
+    def _index_bucket(self, pipe, ts):
+        pipe.zadd(self.key_index, {self.key_from_ts(ts): self.bucket(ts)})
+
+    async def _ensure_index(self):
+        if self._index_ready:
+            return
+        r = self.db.redis
+        if not await r.exists(self.key_index_built):
+            # buckets written before the index existed; SCAN once instead of KEYS
+            batch = {}
+            async for key in scan_keys(r, self.key('*')):
+                batch[key] = int(key.split(':')[-1])
+                if len(batch) >= KEY_BATCH:
+                    await r.zadd(self.key_index, batch)
+                    batch = {}
+            if batch:
+                await r.zadd(self.key_index, batch)
+            await r.set(self.key_index_built, 1)
+        self._index_ready = True
+
+    async def add_many(self, ts, increments: Dict[str, float], values: Dict[str, float] = None):
+        """ Increments some fields and overwrites others in the bucket of "ts", in one round trip """
+        accum_key = self.key_from_ts(ts)
+        pipe = self.db.redis.pipeline(transaction=False)
+        for k, v in increments.items():
+            pipe.hincrbyfloat(accum_key, k, v)
+        if values:
+            pipe.hset(accum_key, mapping=values)
+        self._index_bucket(pipe, ts)
+        await pipe.execute()
 
     async def add(self, ts, **kwargs):
-        accum_key = self.key_from_ts(ts)
-        for k, v in kwargs.items():
-            await self.db.redis.hincrbyfloat(accum_key, k, v)
+        await self.add_many(ts, kwargs)
 
     async def add_now(self, **kwargs):
         await self.add(now_ts(), **kwargs)
 
     async def set(self, ts, **kwargs):
-        accum_key = self.key_from_ts(ts)
-        for k, v in kwargs.items():
-            await self.db.redis.hset(accum_key, k, v)
+        await self.add_many(ts, {}, kwargs)
 
     async def get(self, timestamp=None, conv_to_float=True):
         timestamp = timestamp or now_ts()
@@ -48,21 +136,56 @@ class Accumulator:
 
         return start_ts, end_ts
 
-    async def get_range(self, start_ts: float, end_ts: float = None, conv_to_float=True):
+    def _range_timestamps(self, start_ts: float, end_ts: float = None):
         start_ts, end_ts = self._prepare_ts(start_ts, end_ts)
-
         timestamps = []
         ts = end_ts
         while ts > start_ts:
             timestamps.append(ts)
             ts -= self.tolerance
+        return timestamps
 
+    async def get_range(self, start_ts: float, end_ts: float = None, conv_to_float=True, chunk=GET_CHUNK):
+        timestamps = self._range_timestamps(start_ts, end_ts)
         if not timestamps:
             return {}
 
-        results = await asyncio.gather(*(self.get(ts, conv_to_float) for ts in timestamps))
+        results = []
+        r = self.db.redis
+        for i in range(0, len(timestamps), chunk):
+            pipe = r.pipeline(transaction=False)
+            for ts in timestamps[i:i + chunk]:
+                pipe.hgetall(self.key_from_ts(ts))
+            results += await pipe.execute()
+
+        if conv_to_float:
+            results = [self._convert_values_to_float(item) for item in results]
         return dict(zip(timestamps, results))
 
+    async def reduce_range(self, start_ts: float, end_ts: float = None, fields: Iterable[str] = (),
+                           chunk=GET_CHUNK) -> Dict[str, dict]:
+        """
+        Sum, min, max and count of every field over the range, calculated by Redis. Empty buckets are not counted.
+        :return: {field: {"sum": ..., "min": ..., "max": ..., "n": ...}}
+        """
+        keys = [self.key_from_ts(ts) for ts in self._range_timestamps(start_ts, end_ts)]
+        r = self.db.redis
+        if Accumulator._reduce_script is None:
+            Accumulator._reduce_script = r.register_script(LUA_REDUCE_BUCKETS)
+
+        fields = list(fields)
+        totals = {}
+        for i in range(0, len(keys), chunk):
+            flat = await Accumulator._reduce_script(keys[i:i + chunk], fields, r)
+            for j in range(0, len(flat), 5):
+                field, f_sum, f_min, f_max, n = flat[j], float(flat[j + 1]), float(flat[j + 2]), \
+                    float(flat[j + 3]), int(flat[j + 4])
+                if (t := totals.get(field)) is None:
+                    totals[field] = {'sum': f_sum, 'min': f_min, 'max': f_max, 'n': n}
+                else:
+                    t.update(sum=t['sum'] + f_sum, min=min(t['min'], f_min), max=max(t['max'], f_max), n=t['n'] + n)
+        return totals
+
     async def get_range_n(self, start_ts: float, end_ts: float = None, conv_to_float=True, n=10):
         assert n >= 2
 
@@ -87,13 +210,18 @@ class Accumulator:
     def _convert_values_to_float(r: dict):
         return {k: float(v) for k, v in r.items()}
 
-    async def all_my_keys(self):
-        return await self.db.redis.keys(self.key('*'))
+    async def all_my_keys(self, before=None):
+        await self._ensure_index()
+        max_score = f'({before}' if before else '+inf'
+        return await self.db.redis.zrangebyscore(self.key_index, '-inf', max_score)
 
     async def clear(self, before=None):
-        keys = await self.all_my_keys()
-        if before:
-            keys = [k for k in keys if int(k.split(':')[-1]) < before]
-        if keys:
-            await self.db.redis.delete(*keys)
+        keys = await self.all_my_keys(before)
+        r = self.db.redis
+        for i in range(0, len(keys), KEY_BATCH):
+            batch = keys[i:i + KEY_BATCH]
+            pipe = r.pipeline(transaction=False)
+            pipe.delete(*batch)
+            pipe.zrem(self.key_index, *batch)
+            await pipe.execute()
         return len(keys)
@@ -5,6 +5,7 @@ from datetime import datetime
 from aioredis import Redis
 
 from services.lib.date_utils import now_ts, DAY
+from services.lib.db_key_index import delete_by_pattern
 
 
 class ActiveUserCounter:
@@ -34,9 +35,8 @@ class ActiveUserCounter:
         await self.r.expire(self._key(postfix), time)
 
     async def clear(self):
-        keys = await self.r.keys(self._key('*'))
-        if keys:
-            await self.r.delete(*keys)
+        # the keys expire by themselves, so there is no index to keep; walk them with SCAN
+        await delete_by_pattern(self.r, self._key('*'))
 
 
 class UserStats(typing.NamedTuple):
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from services.lib.config import Config
+
+
+class AIMDLimiter:
+    """
+    Adaptive limit of concurrent requests to one server, the TCP way: additive increase, multiplicative decrease.
+    Every healthy response (fast enough, no error) adds 1/limit, so the limit grows by about 1 per "round"
+    of requests; a sign of pressure (503/429, timeout) multiplies it by "decrease_factor" and pauses new
+    requests for Retry-After, if the server has sent one; at most for "max_pause", as the limiter is shared
+    by the whole process.
+    Report the outcome (on_success / on_pressure) inside "slot", so the waiters see the new limit on release.
+    """
+
+    def __init__(self, initial=1.0, min_limit=1.0, max_limit=8.0, latency_target=2.0, decrease_factor=0.5,
+                 pressure_cooldown=1.0, backoff=0.5, max_pause=30.0):
+        self.min_limit = max(1.0, float(min_limit))
+        self.max_limit = max(self.min_limit, float(max_limit))
+        self.limit = min(self.max_limit, max(self.min_limit, float(initial)))
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.pressure_cooldown = pressure_cooldown  # sec; one burst of 503s counts as one decrease
+        self.backoff = backoff  # sec; the pause after pressure when there is no Retry-After
+        self.max_pause = max_pause  # sec; the cap of Retry-After
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._cond: Optional[asyncio.Condition] = None
+
+        self.successes = 0
+        self.pressure_events = 0
+        self.peak_limit = self.limit
+
+    @classmethod
+    def from_config(cls, cfg: Config, path: str, **defaults):
+        def get(name, default):
+            return cfg.as_float(f'{path}.{name}', defaults.get(name, default))
+
+        return cls(
+            initial=get('initial', 1.0),
+            min_limit=get('min', 1.0),
+            max_limit=get('max', 8.0),
+            latency_target=get('latency_target', 2.0),
+            backoff=get('backoff', 0.5),
+            max_pause=get('max_pause', 30.0),
+        )
+
+    @property
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _can_start(self):
+        return self.in_flight < int(self.limit) and time.monotonic() >= self.paused_until
+
+    @asynccontextmanager
+    async def slot(self):
+        cond = self._condition
+        async with cond:
+            while not self._can_start():
+                pause = self.paused_until - time.monotonic()
+                try:
+                    # wake up either on release or when the pause is over
+                    await asyncio.wait_for(cond.wait(), timeout=pause if pause > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with cond:
+                self.in_flight -= 1
+                cond.notify_all()
+
+    def on_success(self, latency: float):
+        self.successes += 1
+        if self.latency_target and latency > self.latency_target:
+            return  # slow but fine: hold the limit
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    def on_pressure(self, retry_after: Optional[float] = None):
+        self.pressure_events += 1
+        now = time.monotonic()
+        if now - self._last_decrease >= self.pressure_cooldown:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self._last_decrease = now
+        pause = self.backoff if retry_after is None else min(retry_after, self.max_pause)
+        self.paused_until = max(self.paused_until, now + pause)
+
+    @property
+    def stats(self):
+        return {
+            'limit': round(self.limit, 2),
+            'peak_limit': round(self.peak_limit, 2),
+            'in_flight': self.in_flight,
+            'successes': self.successes,
+            'pressure_events': self.pressure_events,
+        }
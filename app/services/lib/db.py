@@ -1,4 +1,5 @@
 import os
+import time
 import typing
 from contextlib import asynccontextmanager
 
@@ -6,11 +7,40 @@ import aioredis
 from aiogram.contrib.fsm_storage.redis import RedisStorage2
 from aiogram.dispatcher import FSMContext
 
+from services.lib.metrics import REGISTRY
+
+REDIS_COMMAND_SECONDS = REGISTRY.histogram('redis_command_seconds', 'Redis round trips; a pipeline is one',
+                                           ['command'])
+
+
+class InstrumentedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        t0 = time.monotonic()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_SECONDS.observe(str(args[0]).upper(), value=time.monotonic() - t0)
+
+    def pipeline(self, transaction: bool = True, shard_hint: typing.Optional[str] = None):
+        pipe = super().pipeline(transaction, shard_hint)
+        execute = pipe.execute
+
+        async def timed_execute(raise_on_error: bool = True):
+            t0 = time.monotonic()
+            try:
+                return await execute(raise_on_error)
+            finally:
+                REDIS_COMMAND_SECONDS.observe('MULTI' if transaction else 'PIPELINE', value=time.monotonic() - t0)
+
+        pipe.execute = timed_execute
+        return pipe
+
 
 class DB:
     def __init__(self, loop):
         self.loop = loop
         self.redis: typing.Optional[aioredis.Redis] = None
+        self.redis_binary: typing.Optional[aioredis.Redis] = None
         self.storage: typing.Optional[RedisStorage2] = None
         self.host = os.environ.get('REDIS_HOST', 'localhost')
         self.port = os.environ.get('REDIS_PORT', 6379)
@@ -21,7 +51,7 @@ class DB:
         if self.redis is not None:
             return self.redis
 
-        self.redis = await aioredis.from_url(
+        self.redis = await InstrumentedRedis.from_url(
             f'redis://{self.host}:{self.port}/{self.db_index}',
             password=self.password,
             encoding="utf-8",
@@ -33,12 +63,24 @@ class DB:
 
         return self.redis
 
+    async def get_redis_binary(self) -> aioredis.Redis:
+        """ The same database, but values are returned as raw bytes (for compressed blobs) """
+        if self.redis_binary is None:
+            self.redis_binary = await InstrumentedRedis.from_url(
+                f'redis://{self.host}:{self.port}/{self.db_index}',
+                password=self.password,
+                decode_responses=False
+            )
+        return self.redis_binary
+
     async def get_storage(self):
         await self.get_redis()
         return self.storage
 
     async def close_redis(self):
         await self.redis.close()
+        if self.redis_binary is not None:
+            await self.redis_binary.close()
 
     @asynccontextmanager
     async def tg_context(self, user=None, chat=None):
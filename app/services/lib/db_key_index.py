@@ -0,0 +1,140 @@
+from typing import Callable, AsyncIterator, Iterable, Union
+
+from aioredis import Redis
+from aioredis.client import Pipeline
+
+from services.lib.db import DB
+
+SCAN_COUNT = 1000
+KEY_BATCH = 500
+
+
+async def scan_keys(r: Redis, pattern: str, count=SCAN_COUNT) -> AsyncIterator[str]:
+    """
+    Incremental replacement for KEYS: Redis answers every SCAN step quickly, so other clients are not blocked.
+    A key may be yielded more than once if the keyspace is rehashed during the walk.
+    """
+    async for key in r.scan_iter(match=pattern, count=count):
+        yield key
+
+
+async def delete_by_pattern(r: Redis, pattern: str, count=SCAN_COUNT, batch=KEY_BATCH) -> int:
+    deleted = 0
+    keys = []
+    async for key in scan_keys(r, pattern, count):
+        keys.append(key)
+        if len(keys) >= batch:
+            deleted += await r.delete(*keys)
+            keys = []
+    if keys:
+        deleted += await r.delete(*keys)
+    return deleted
+
+
+class KeyIndex:
+    """
+    A Redis set listing the names of a family of keys "key_gen(name)", so that we never run KEYS to enumerate them.
+    The owner adds/removes names in the same pipeline where it writes/deletes the keys.
+    Data written before the index existed is picked up once by a SCAN walk (see "ensure").
+    """
+
+    # Removes the values from the set and then the name from the index if the set became empty; all atomically
+    LUA_SREM_AND_UNINDEX = """
+    redis.call('SREM', KEYS[1], unpack(ARGV, 2))
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        redis.call('SREM', KEYS[2], ARGV[1])
+    end
+    return 1
+    """
+
+    def __init__(self, db: Union[DB, Redis], index_key: str, key_gen: Callable[[str], str]):
+        self.db = db
+        self.index_key = index_key
+        self.key_gen = key_gen
+        self._ready = False
+        self._srem_script = None
+
+    async def _redis(self) -> Redis:
+        return await self.db.get_redis() if isinstance(self.db, DB) else self.db
+
+    @property
+    def key_ready(self):
+        return f'{self.index_key}:Built'
+
+    @property
+    def key_pattern(self):
+        return self.key_gen('*')
+
+    def name_from_key(self, key: str):
+        return key[len(self.key_pattern) - 1:]
+
+    async def ensure(self):
+        if self._ready:
+            return
+        r = await self._redis()
+        if not await r.exists(self.key_ready):
+            await self.rebuild()
+        self._ready = True
+
+    async def rebuild(self) -> int:
+        r = await self._redis()
+        names = []
+        total = 0
+        async for key in scan_keys(r, self.key_pattern):
+            names.append(self.name_from_key(key))
+            if len(names) >= KEY_BATCH:
+                total += await r.sadd(self.index_key, *names)
+                names = []
+        if names:
+            total += await r.sadd(self.index_key, *names)
+        await r.set(self.key_ready, 1)
+        self._ready = True
+        return total
+
+    def add(self, pipe: Pipeline, names: Iterable[str]):
+        names = list(names)
+        if names:
+            pipe.sadd(self.index_key, *names)
+        return pipe
+
+    def remove(self, pipe: Pipeline, names: Iterable[str]):
+        names = list(names)
+        if names:
+            pipe.srem(self.index_key, *names)
+        return pipe
+
+    async def srem_and_unindex(self, name: str, values: Iterable[str], pipe: Pipeline = None):
+        """
+        For indexes of sets: SREM values from the set "key_gen(name)"; forgets the name if the set got empty.
+        If a pipeline is given, the call is only queued there.
+        """
+        values = list(values)
+        if not values:
+            return
+        if self._srem_script is None:
+            r = await self._redis()
+            self._srem_script = r.register_script(self.LUA_SREM_AND_UNINDEX)
+        await self._srem_script(keys=[self.key_gen(name), self.index_key], args=[name, *values], client=pipe)
+
+    async def members(self) -> set:
+        await self.ensure()
+        r = await self._redis()
+        return set(await r.smembers(self.index_key))
+
+    async def iter_members(self, match: str = None, count=SCAN_COUNT) -> AsyncIterator[str]:
+        await self.ensure()
+        r = await self._redis()
+        async for name in r.sscan_iter(self.index_key, match=match, count=count):
+            yield name
+
+    async def size(self) -> int:
+        await self.ensure()
+        r = await self._redis()
+        return await r.scard(self.index_key)
+
+    async def reset(self):
+        """ Forgets all names; call it after the keys of the family are deleted """
+        r = await self._redis()
+        await r.delete(self.index_key)
+        await r.set(self.key_ready, 1)
+        self._ready = True
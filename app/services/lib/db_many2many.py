@@ -1,9 +1,9 @@
-import asyncio
 from typing import List
 
 from aioredis import Redis
 
 from services.lib.db import DB
+from services.lib.db_key_index import KeyIndex, delete_by_pattern
 
 
 class ManyToManySet:
@@ -11,6 +11,9 @@ class ManyToManySet:
         self.db = db
         self.left_prefix = left_prefix
         self.right_prefix = right_prefix
+        # names of the non-empty sets of each side, so listing a side is an SMEMBERS instead of KEYS
+        self.left_index = KeyIndex(db, f'idx:{left_prefix}-2-{right_prefix}:{left_prefix}', self.left_key)
+        self.right_index = KeyIndex(db, f'idx:{left_prefix}-2-{right_prefix}:{right_prefix}', self.right_key)
 
     async def _redis(self) -> Redis:
         return await self.db.get_redis()
@@ -23,20 +26,23 @@ class ManyToManySet:
 
     async def clear(self):
         r = await self._redis()
-        lefts = await r.keys(self.left_key('*'))
-        rights = await r.keys(self.right_key('*'))
-        keys = lefts + rights
-        if keys:
-            await r.delete(*keys)
+        await delete_by_pattern(r, self.left_key('*'))
+        await delete_by_pattern(r, self.right_key('*'))
+        await self.left_index.reset()
+        await self.right_index.reset()
 
     async def associate_many(self, lefts: List[str], rights: List[str]):
+        if not lefts or not rights:
+            return
         r = await self._redis()
-        if rights:
-            for left_one in lefts:
-                await r.sadd(self.left_key(left_one), *rights)
-        if lefts:
-            for right_one in rights:
-                await r.sadd(self.right_key(right_one), *lefts)
+        pipe = r.pipeline(transaction=False)
+        for left_one in lefts:
+            pipe.sadd(self.left_key(left_one), *rights)
+        for right_one in rights:
+            pipe.sadd(self.right_key(right_one), *lefts)
+        self.left_index.add(pipe, lefts)
+        self.right_index.add(pipe, rights)
+        await pipe.execute()
 
     async def associate(self, left_one: str, right_one: str):
         await self.associate_many([left_one], [right_one])
@@ -53,66 +59,69 @@ class ManyToManySet:
         r = await self._redis()
         return await r.sismember(self.right_key(right_one), left_one)
 
-    @staticmethod
-    async def all_items_for_many_other_side(inputs, getter: callable, flatten=True):
-        inputs = set(inputs)
-        # fixme: use MGET?
-        groups = await asyncio.gather(
-            *(getter(item) for item in inputs)
-        )
+    async def all_items_for_many_other_side(self, inputs, key_gen: callable, flatten=True):
+        inputs = list(set(inputs))
+        if inputs:
+            r = await self._redis()
+            pipe = r.pipeline(transaction=False)
+            for item in inputs:
+                pipe.smembers(key_gen(item))
+            groups = await pipe.execute()
+        else:
+            groups = []
         if flatten:
             return set(item for group in groups for item in group)
         else:
-            return {name: group for name, group in zip(inputs, groups)}
+            return {name: set(group) for name, group in zip(inputs, groups)}
 
     async def all_lefts_for_many_rights(self, rights: iter, flatten=True):
-        return await self.all_items_for_many_other_side(rights, self.all_lefts_for_right_one, flatten)
+        return await self.all_items_for_many_other_side(rights, self.right_key, flatten)
 
     async def all_rights_for_many_lefts(self, lefts: iter, flatten=True):
-        return await self.all_items_for_many_other_side(lefts, self.all_rights_for_left_one, flatten)
+        return await self.all_items_for_many_other_side(lefts, self.left_key, flatten)
 
     async def all_rights_for_left_one(self, left_one: str):
         r = await self._redis()
         return set(await r.smembers(self.left_key(left_one)))
 
-    async def all_from_side(self, key_gen):
-        r = await self._redis()
-        key_pattern = key_gen('*')
-        start_pos = len(key_pattern) - 1
-        names = await r.keys(key_pattern)
-        return set(n[start_pos:] for n in names)
+    async def all_from_side(self, index: KeyIndex):
+        return await index.members()
 
     async def all_lefts(self):
-        return await self.all_from_side(key_gen=self.left_key)
+        return await self.all_from_side(self.left_index)
 
     async def all_rights(self):
-        return await self.all_from_side(key_gen=self.right_key)
+        return await self.all_from_side(self.right_index)
 
     async def all_right(self):
         r = await self._redis()
-        lefts = await r.keys(self.left_key('*'))
         results = []
-        for left_one in lefts:
-            results += await r.smembers(left_one)
+        async for left_one in self.left_index.iter_members():
+            results += await r.smembers(self.left_key(left_one))
         return results
 
-    # noinspection PyArgumentList
-    async def remove_association(self, item: str, is_item_left: bool):
+    async def _remove_many(self, item: str, others: iter, is_item_left: bool):
+        others = list(others)
+        if not others:
+            return
+        this_index, other_index = (self.left_index, self.right_index) if is_item_left else \
+            (self.right_index, self.left_index)
         r = await self._redis()
+        pipe = r.pipeline(transaction=False)
+        await this_index.srem_and_unindex(item, others, pipe)
+        for other_item in others:
+            await other_index.srem_and_unindex(other_item, [item], pipe)
+        await pipe.execute()
 
+    async def remove_association(self, item: str, is_item_left: bool):
         getter = self.all_rights_for_left_one if is_item_left else self.all_lefts_for_right_one
-        all_items = await getter(item)
-        other_side_key = self.left_key(item) if is_item_left else self.right_key(item)
-        if all_items:
-            await r.srem(other_side_key, *all_items)
-        for other_item in all_items:
-            this_side_key = self.right_key(other_item) if is_item_left else self.left_key(other_item)
-            await r.srem(this_side_key, item)
+        await self._remove_many(item, await getter(item), is_item_left)
 
     async def remove_one_item(self, left_item, right_item):
-        r = await self._redis()
-        await r.srem(self.left_key(left_item), right_item)
-        await r.srem(self.right_key(right_item), left_item)
+        await self._remove_many(left_item, [right_item], is_item_left=True)
+
+    async def remove_many_rights(self, left_one: str, rights: List[str]):
+        await self._remove_many(left_one, rights, is_item_left=True)
 
     async def remove_all_rights(self, left_one: str):
         await self.remove_association(left_one, is_item_left=True)
@@ -1,6 +1,15 @@
+import asyncio
 import logging
 import time
 from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from services.lib.metrics import REGISTRY
+
+DELEGATE_SECONDS = REGISTRY.histogram('delegate_handle_seconds', 'Time of one "on_data" call of a delegate',
+                                      ['sender', 'delegate'])
 
 
 class INotified(ABC):
@@ -11,14 +20,126 @@ class INotified(ABC):
         ...
 
 
+@dataclass
+class DispatchOptions:
+    """
+    How a delegate gets the data when it has its own queue: the sender only enqueues and goes on,
+    a worker calls "on_data". Delegates of the same "group" share one queue and worker,
+    so they get every piece of data in the order of subscribing.
+    """
+    DROP_OLDEST = 'drop_oldest'
+    BLOCK = 'block'
+
+    queue_size: int = 100
+    timeout: float = 0.0  # sec for one "on_data" call, 0 = no limit
+    overflow: str = DROP_OLDEST  # if the queue is full: drop the oldest item or make the sender wait
+    group: str = ''
+
+
+class DelegateLane:
+    """ A bounded queue and a worker for one delegate or a sequential group of them """
+
+    LATENCY_WINDOW = 500
+
+    def __init__(self, name: str, options: DispatchOptions):
+        self.name = name
+        self.options = options
+        self.queue = asyncio.Queue(maxsize=max(1, options.queue_size))
+        self.delegates: List[INotified] = []
+        self.timeouts: Dict[INotified, float] = {}
+        self.latencies: Dict[INotified, deque] = {}
+        self.counters: Dict[INotified, Dict[str, int]] = {}
+        self.dropped = 0
+        self._worker: Optional[asyncio.Task] = None
+
+    def add(self, delegate: INotified, timeout: float):
+        self.delegates.append(delegate)
+        self.timeouts[delegate] = timeout
+        self.latencies[delegate] = deque(maxlen=self.LATENCY_WINDOW)
+        self.counters[delegate] = {'delivered': 0, 'failed': 0, 'timeouts': 0}
+
+    async def put(self, sender, data):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+
+        item = (sender, data, time.monotonic())
+        if self.options.overflow == DispatchOptions.BLOCK:
+            await self.queue.put(item)
+            return
+        while self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.dropped += 1
+            logging.warning(f'Delegate queue "{self.name}" is full; the oldest item is dropped.')
+        self.queue.put_nowait(item)
+
+    async def _work(self):
+        while True:
+            sender, data, enqueued_at = await self.queue.get()
+            try:
+                for delegate in self.delegates:
+                    await self._deliver(delegate, sender, data, enqueued_at)
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, delegate: INotified, sender, data, enqueued_at):
+        counters = self.counters[delegate]
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(delegate.on_data(sender, data), timeout=self.timeouts[delegate] or None)
+            counters['delivered'] += 1
+        except asyncio.TimeoutError:
+            counters['timeouts'] += 1
+            logging.error(f'{delegate} has not handled data from {sender} '
+                          f'in {self.timeouts[delegate]} sec; cancelled.')
+        except Exception as e:
+            counters['failed'] += 1
+            logging.exception(f"{e!r}")
+        self.latencies[delegate].append(time.monotonic() - enqueued_at)
+        DELEGATE_SECONDS.observe(type(sender).__qualname__, type(delegate).__qualname__, value=time.monotonic() - t0)
+
+    async def join(self):
+        await self.queue.join()
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def stats_of(self, delegate: INotified):
+        values = sorted(self.latencies[delegate])
+        n = len(values)
+        return {
+            **self.counters[delegate],
+            'dropped': self.dropped,
+            'queue': self.queue.qsize(),
+            'latency': {p: values[min(n - 1, int(n * p / 100))] for p in (50, 90, 99)} if n else {},
+        }
+
+
 class WithDelegates:
     def __init__(self):
         super().__init__()
         self.delegates = []  # list for fixed order
+        self._lanes: Dict[str, DelegateLane] = {}
+        self._lane_of: Dict[INotified, DelegateLane] = {}
 
-    def add_subscriber(self, delegate: INotified):
+    def add_subscriber(self, delegate: INotified, dispatch: Optional[DispatchOptions] = None):
+        """
+        Without "dispatch" the delegate is awaited in turn, the sender waits for it.
+        With "dispatch" it gets its own queue and worker (see DispatchOptions), so a slow delegate
+        does not hold up the others and the sender's next tick.
+        """
         if delegate not in self.delegates:
             self.delegates.append(delegate)
+            if dispatch is not None:
+                name = dispatch.group or str(delegate)
+                lane = self._lanes.get(name)
+                if lane is None:
+                    lane = self._lanes[name] = DelegateLane(name, dispatch)
+                lane.add(delegate, dispatch.timeout)
+                self._lane_of[delegate] = lane
         return self
 
     async def handle_error(self, e, sender=None):
@@ -32,15 +153,37 @@ class WithDelegates:
         sender = sender or self
 
         summary = {}
+        enqueued = set()
 
         for delegate in self.delegates:
             delegate: INotified
             t0 = time.monotonic()
-            try:
-                await delegate.on_data(sender, data)
-            except Exception as e:
-                logging.exception(f"{e!r}")
+            if (lane := self._lane_of.get(delegate)) is not None:
+                if lane.name not in enqueued:  # a group gets the data once
+                    enqueued.add(lane.name)
+                    await lane.put(sender, data)
+            else:
+                try:
+                    await delegate.on_data(sender, data)
+                except Exception as e:
+                    logging.exception(f"{e!r}")
+                DELEGATE_SECONDS.observe(type(sender).__qualname__, type(delegate).__qualname__,
+                                         value=time.monotonic() - t0)
             t1 = time.monotonic()
             summary[str(delegate)] = t1 - t0
 
         return summary
+
+    async def join_listeners(self):
+        """ Waits until the queued delegates have handled everything passed so far """
+        for lane in self._lanes.values():
+            await lane.join()
+
+    async def stop_listeners(self):
+        for lane in self._lanes.values():
+            await lane.stop()
+
+    @property
+    def dispatch_stats(self):
+        """ Queued delegates: counters, dropped items, queue depth and latency (enqueue to done) percentiles """
+        return {str(d): lane.stats_of(d) for d, lane in self._lane_of.items()}
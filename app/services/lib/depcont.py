@@ -15,6 +15,7 @@ from services.lib.config import Config
 from services.lib.db import DB
 from services.lib.emergency import EmergencyReport
 from services.lib.http_ses import ObservableSession
+from services.lib.loop_monitor import LoopMonitor
 from services.lib.midgard.connector import MidgardConnector
 from services.lib.midgard.name_service import NameService
 from services.lib.new_feature import NewFeatureManager, Features
@@ -36,6 +37,7 @@ class DepContainer:
     loop: Optional[asyncio.BaseEventLoop] = None
     loc_man = None  # type: 'LocalizationManager'
     broadcaster = None  # type: 'Broadcaster'
+    outbox = None  # type: 'OutboundQueue'
     alert_presenter = None
     thor_env: ThorEnvironment = ThorEnvironment()
 
@@ -91,6 +93,7 @@ class DepContainer:
     last_block_store = None
 
     emergency: Optional[EmergencyReport] = None
+    loop_monitor: Optional[LoopMonitor] = None
 
     settings_manager: Optional[SettingsManager] = None
 
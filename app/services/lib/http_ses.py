@@ -1,26 +1,41 @@
 import asyncio
 import json
+import time
 from collections import defaultdict
 from dataclasses import dataclass, field
 from ssl import SSLContext
 from types import SimpleNamespace
-from typing import Any, Optional, Iterable, Type, Union, List, Dict, Mapping
+from typing import Any, Optional, Iterable, Type, Union, List, Dict, Mapping, Callable
 from urllib.parse import urlparse, urlunparse
 
 import aiohttp
+import ujson
 from aiohttp import BaseConnector as BaseConnector, BasicAuth, ClientRequest as ClientRequest, \
     ClientResponse as ClientResponse, ClientWebSocketResponse as ClientWebSocketResponse, HttpVersion, ClientTimeout, \
     TraceConfig, http, Fingerprint as Fingerprint
 from aiohttp.abc import AbstractCookieJar
 from aiohttp.helpers import sentinel
-from aiohttp.typedefs import StrOrURL, LooseCookies, LooseHeaders, JSONEncoder
+from aiohttp.typedefs import StrOrURL, LooseCookies, LooseHeaders, JSONEncoder, DEFAULT_JSON_DECODER
 
 from services.lib.date_utils import now_ts
 from services.lib.lru import LRUCache, WindowAverage, RPSCounter
+from services.lib.metrics import REGISTRY, path_template
 from services.lib.utils import WithLogger
 
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:  # optional; ujson is always there
+    orjson = None
+    json_loads = ujson.loads
+
 WINDOW_SIZE_TO_AVERAGE = 100
 MAX_CACHE_SIZE = 1000
+TEXT_SAMPLE_LEN = 100
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram('http_request_seconds', 'Outgoing HTTP requests until the headers',
+                                          ['method', 'host', 'path', 'status'])
 
 
 @dataclass
@@ -36,6 +51,7 @@ class RequestEntry:
     none_count: int = 0
     text_answer_count: int = 0
     last_text_answer: str = ''
+    total_bytes: int = 0
 
     avg_time: WindowAverage = field(default_factory=lambda: WindowAverage(WINDOW_SIZE_TO_AVERAGE))
     last_error: Optional[Exception] = None
@@ -56,24 +72,63 @@ class RequestEntry:
         self.total_time += time_elapsed
         self.avg_time.append(time_elapsed)
 
+    def add_bytes(self, n: int):
+        self.total_bytes += n
+
     async def update_on_response(self, response: ClientResponse, ts_start):
+        """
+        Does not decode the body. A JSON answer is not even read here: its size comes from Content-Length
+        or is counted when the caller reads it (see ObservableResponse).
+        Other answers (HTML error pages and such) are read, and a short sample is kept.
+        """
         if not self.response_codes:
             self.response_codes = defaultdict(int)
         self.response_codes[response.status] += 1
         self.last_timestamp_response = now_ts()
 
-        text = await response.text()
-        if text is None:
-            self.none_count += 1
-        elif not (text.startswith('{') or text.startswith('[')):
-            self.text_answer_count += 1
-            self.last_text_answer = (text[:100]
-                                     .replace('<', ' ')
-                                     .replace('>', ' ')
-                                     .replace('\n', ''))
+        if response.content_type != 'application/json':
+            body = await response.read()
+            head = body[:TEXT_SAMPLE_LEN].lstrip()
+            if not (head.startswith(b'{') or head.startswith(b'[')):
+                self.text_answer_count += 1
+                self.last_text_answer = (head.decode('utf-8', errors='replace')
+                                         .replace('<', ' ')
+                                         .replace('>', ' ')
+                                         .replace('\n', ''))
 
         self.update_time(ts_start)
 
+
+class ObservableResponse(ClientResponse):
+    """
+    Counts the body size once it is read, and parses JSON straight from the bytes read,
+    with orjson if it is installed (no decoding to str first, as ClientResponse.json does).
+    """
+
+    on_body_read: Optional[Callable[[int], None]] = None
+
+    async def read(self) -> bytes:
+        first_time = self._body is None
+        body = await super().read()
+        if first_time and self.on_body_read is not None:
+            self.on_body_read(len(body))
+        return body
+
+    async def json(self, *, encoding: Optional[str] = None, loads=DEFAULT_JSON_DECODER,
+                   content_type: Optional[str] = 'application/json') -> Any:
+        if loads is not DEFAULT_JSON_DECODER or (encoding and encoding.lower().replace('-', '') != 'utf8'):
+            return await super().json(encoding=encoding, loads=loads, content_type=content_type)
+
+        if content_type and self.content_type != content_type:
+            # an unusual content type: let the parent decide (it accepts "+json" types or raises ContentTypeError)
+            return await super().json(encoding=encoding, loads=loads, content_type=content_type)
+
+        body = await self.read()
+
+        if not body or body.isspace():
+            return None
+        return json_loads(body)
+
     def update_on_error(self, e, ts_start):
         self.last_error = e
         self.total_errors += 1
@@ -117,6 +172,10 @@ class ObservableSession(aiohttp.ClientSession, WithLogger):
     def success_rate_vs_code(self):
         return 1.0 - self.count_non_ok_codes / self.total_calls if self.total_calls else 0.0
 
+    @property
+    def total_bytes(self):
+        return sum(r.total_bytes for r in self._debug_cache.values())
+
     @property
     def count_non_ok_codes(self):
         return sum(r.non_ok_code_count for r in self._debug_cache.values())
@@ -153,6 +212,10 @@ class ObservableSession(aiohttp.ClientSession, WithLogger):
                 return
 
             record: RequestEntry
+            if response.content_length is not None:
+                record.add_bytes(response.content_length)
+            elif isinstance(response, ObservableResponse):
+                response.on_body_read = record.add_bytes
             await record.update_on_response(response, ts_start)
 
         except Exception as e:
@@ -186,6 +249,7 @@ class ObservableSession(aiohttp.ClientSession, WithLogger):
                        trace_request_ctx: Optional[SimpleNamespace] = None,
                        read_bufsize: Optional[int] = None) -> ClientResponse:
         ts_start = now_ts()
+        t0 = time.monotonic()
         self._register_start(str_or_url, method, ts_start)
 
         try:
@@ -198,17 +262,25 @@ class ObservableSession(aiohttp.ClientSession, WithLogger):
                                             timeout=timeout, verify_ssl=verify_ssl, fingerprint=fingerprint,
                                             ssl_context=ssl_context, ssl=ssl, proxy_headers=proxy_headers,
                                             trace_request_ctx=trace_request_ctx, read_bufsize=read_bufsize)
+            self._observe(str_or_url, method, result.status, t0)
             await self._register_end(str_or_url, method, ts_start, result)
         except Exception as e:
+            self._observe(str_or_url, method, 'error', t0)
             self._register_error(str_or_url, method, ts_start, e)
             raise e
         return result
 
+    @staticmethod
+    def _observe(url, method, status, t0):
+        parsed = urlparse(str(url))
+        HTTP_REQUEST_SECONDS.observe(method, parsed.netloc, path_template(parsed.path), status,
+                                     value=time.monotonic() - t0)
+
     def __init__(self, *, connector: Optional[BaseConnector] = None, loop: Optional[asyncio.AbstractEventLoop] = None,
                  cookies: Optional[LooseCookies] = None, headers: Optional[LooseHeaders] = None,
                  skip_auto_headers: Optional[Iterable[str]] = None, auth: Optional[BasicAuth] = None,
                  json_serialize: JSONEncoder = json.dumps, request_class: Type[ClientRequest] = ClientRequest,
-                 response_class: Type[ClientResponse] = ClientResponse,
+                 response_class: Type[ClientResponse] = ObservableResponse,
                  ws_response_class: Type[ClientWebSocketResponse] = ClientWebSocketResponse,
                  version: HttpVersion = http.HttpVersion11, cookie_jar: Optional[AbstractCookieJar] = None,
                  connector_owner: bool = True, raise_for_status: bool = False,
@@ -0,0 +1,132 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, List
+
+from services.lib.metrics import REGISTRY
+from services.lib.utils import WithLogger
+
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'event_loop_lag_seconds', 'How late the event loop runs a callback scheduled with call_later',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+LOOP_STALLS = REGISTRY.counter('event_loop_stalls', 'Loop steps longer than the slow threshold')
+
+
+@dataclass
+class LoopStall:
+    started_ts: float  # wall clock
+    duration: float  # sec; grows while the stall goes on
+    task: str
+    coro: str
+    stack: List[str]
+    finished: bool = False
+
+
+class LoopMonitor(WithLogger):
+    """
+    Two cheap probes for a single-loop app:
+    1) a heartbeat scheduled with call_later every "interval" measures how late it actually runs (the loop lag);
+    2) a watchdog thread notices when the heartbeat is overdue by more than "slow_threshold", which means
+       some step blocks the loop right now, and takes the loop thread's stack and the current task at that moment.
+    The stalls are kept in a ring buffer.
+    """
+
+    def __init__(self, interval=0.25, slow_threshold=0.25, ring_size=50, stack_depth=25):
+        super().__init__()
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.stack_depth = stack_depth
+        self.stalls = deque(maxlen=ring_size)
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+        self._last_beat = 0.0
+        self._current: Optional[LoopStall] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+        self.beats = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        if self._thread:
+            return
+        self.loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._handle = self.loop.call_later(self.interval, self._beat, self._last_beat + self.interval)
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        self.logger.info(f'Loop monitor started: interval {self.interval} sec, threshold {self.slow_threshold} sec.')
+
+    def stop(self):
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _beat(self, expected: float):
+        now = time.monotonic()
+        lag = max(0.0, now - expected)
+        self.beats += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        LOOP_LAG_SECONDS.observe(value=lag)
+
+        self._last_beat = now
+        stall, self._current = self._current, None
+        if stall is not None:
+            stall.duration = max(stall.duration, lag)
+            stall.finished = True
+
+        self._handle = self.loop.call_later(self.interval, self._beat, now + self.interval)
+
+    def _watch(self):
+        # runs in its own thread: only reads the loop thread's state
+        while not self._stopped.wait(self.slow_threshold / 2):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue <= self.slow_threshold:
+                continue
+            if self._current is not None:
+                self._current.duration = overdue
+                continue
+            self._current = stall = self._capture(overdue)
+            self.stalls.append(stall)
+            LOOP_STALLS.inc()
+
+    def _capture(self, overdue: float) -> LoopStall:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame, limit=self.stack_depth) if frame else []
+
+        task = asyncio.current_task(self.loop)
+        if task is not None:
+            task_name = task.get_name()
+            coro = task.get_coro()
+            coro_name = getattr(coro, '__qualname__', repr(coro))
+        else:
+            task_name, coro_name = '', '(callback)'
+
+        return LoopStall(time.time() - overdue, overdue, task_name, coro_name, stack)
+
+    def recent_stalls(self, n=5) -> List[LoopStall]:
+        return list(self.stalls)[-n:][::-1]
+
+    @property
+    def stats(self):
+        return {
+            'beats': self.beats,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+            'stalls': len(self.stalls),
+        }
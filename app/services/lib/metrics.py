@@ -0,0 +1,241 @@
+import math
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from services.lib.utils import WithLogger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(x: float) -> str:
+    if math.isinf(x):
+        return '+Inf' if x > 0 else '-Inf'
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+
+class _Metric:
+    TYPE = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children: Dict[Tuple, object] = {}
+
+    def labels(self, *values):
+        assert len(values) == len(self.label_names), f'{self.name}: expected labels {self.label_names}'
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        """ Yields (suffix, label values, extra label, value) """
+        raise NotImplementedError
+
+    @property
+    def family_name(self):
+        """ The name in HELP/TYPE; the samples are this name plus a suffix """
+        return self.name
+
+    def render(self) -> str:
+        family = self.family_name
+        lines = [
+            f'# HELP {family} {self.documentation}',
+            f'# TYPE {family} {self.TYPE}',
+        ]
+        for suffix, values, extra, value in self._samples():
+            lines.append(f'{family}{suffix}{_format_labels(self.label_names, values, extra)} '
+                         f'{_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+
+
+class Counter(_Metric):
+    TYPE = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, *labels, amount=1.0):
+        self.labels(*labels).value += amount
+
+    @property
+    def family_name(self):
+        # text format 0.0.4: the counter family is named like its sample, otherwise it is read as untyped
+        return self.name if self.name.endswith('_total') else f'{self.name}_total'
+
+    def _samples(self):
+        for key, child in self._children.items():
+            yield '', key, '', child.value
+
+
+class Gauge(_Metric):
+    """ Either set by hand or read from a function at the scrape time """
+    TYPE = 'gauge'
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, *labels, value: float):
+        self.labels(*labels).value = value
+
+    def set_function(self, fn: Callable[[], float], *labels):
+        self._functions[tuple(str(v) for v in labels)] = fn
+
+    def _samples(self):
+        for key, child in self._children.items():
+            yield '', key, '', child.value
+        for key, fn in self._functions.items():
+            try:
+                yield '', key, '', float(fn())
+            except Exception:
+                continue  # a broken callback must not break the whole page
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    @contextmanager
+    def time(self):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - t0)
+
+
+class Histogram(_Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, *labels, value: float):
+        self.labels(*labels).observe(value)
+
+    def _samples(self):
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, child.counts):
+                cumulative += n
+                yield '_bucket', key, f'le="{_format_value(bound)}"', cumulative
+            yield '_sum', key, '', child.sum
+            yield '_count', key, '', child.count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name, documentation, label_names, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, label_names, **kwargs)
+        assert isinstance(metric, cls), f'Metric {name} is already registered as {metric.TYPE}'
+        return metric
+
+    def counter(self, name, documentation, label_names=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def render(self) -> str:
+        """ Prometheus text exposition format 0.0.4 """
+        return '\n'.join(m.render() for m in self._metrics.values()) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+_NUMBER = re.compile(r'^\d+$')
+_ID_LIKE = re.compile(r'^(?=.*\d)[\w.:~/-]{20,}$')
+
+
+def path_template(path: str) -> str:
+    """ /mayachain/pool/ETH.USDT-0XDAC17F958D2EE523A2206206994597C13D831EC7 => /mayachain/pool/{id} """
+    path = path.split('?', 1)[0]
+    segments = []
+    for segment in path.split('/'):
+        if _NUMBER.match(segment):
+            segment = '{n}'
+        elif _ID_LIKE.match(segment):
+            segment = '{id}'
+        segments.append(segment)
+    return '/'.join(segments)
+
+
+class MetricsServer(WithLogger):
+    """ Serves GET /metrics on a side port """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host='127.0.0.1', port=9108):
+        super().__init__()
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle(self, _request):
+        return web.Response(body=self.registry.render().encode(), headers={'Content-Type': self.CONTENT_TYPE})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.logger.info(f'Metrics are served at http://{self.host}:{self.port}/metrics')
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
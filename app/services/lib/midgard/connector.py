@@ -1,9 +1,12 @@
+import asyncio
+import time
 from typing import Optional
 
 import aiohttp
 from aionode.connector import ThorConnector
 from aionode.nodeclient import ThorNodeClient
 
+from services.lib.aimd import AIMDLimiter
 from services.lib.constants import HTTP_CLIENT_ID
 from services.lib.midgard.parser import MidgardParserV2, TxParseResult
 from services.lib.midgard.urlgen import free_url_gen
@@ -19,9 +22,12 @@ class MidgardConnector(WithLogger):
     ERROR_RESPONSE = 'ERROR_Midgard'
     ERROR_NOT_FOUND = 'NotFound_Midgard'
     ERROR_NO_CLIENT = 'ERROR_NoClient'
+    ERROR_OVERLOADED = 'Overloaded_Midgard'  # 503/429/timeout: worth retrying a bit later
+
+    PRESSURE_STATUSES = (429, 503)
 
     def __init__(self, session: aiohttp.ClientSession, thor: ThorConnector, retry_number=3, public_url='',
-                 network_id=None):
+                 network_id=None, limiter: Optional[AIMDLimiter] = None):
         super().__init__()
 
         self.thor = thor
@@ -31,6 +37,14 @@ class MidgardConnector(WithLogger):
         self.session = session or aiohttp.ClientSession()
         self.urlgen = free_url_gen
         self.parser = MidgardParserV2(network_id)
+        self.limiter = limiter or AIMDLimiter()
+
+    @staticmethod
+    def _parse_retry_after(resp) -> Optional[float]:
+        try:
+            return max(0.0, float(resp.headers.get('Retry-After')))
+        except (TypeError, ValueError):
+            return None  # absent or an HTTP date; then the limiter's own backoff is enough
 
     async def _request_json_from_midgard_by_ip(self, ip_address: str, path: str):
         path = path.lstrip('/')
@@ -49,6 +63,11 @@ class MidgardConnector(WithLogger):
 
                 if resp.status == 404:
                     return self.ERROR_NOT_FOUND
+                elif resp.status in self.PRESSURE_STATUSES:
+                    retry_after = self._parse_retry_after(resp)
+                    self.logger.warning(f'Midgard ({full_url}) is overloaded: {resp.status = }, {retry_after = }.')
+                    self.limiter.on_pressure(retry_after)
+                    return self.ERROR_OVERLOADED
                 elif resp.status != 200:
                     try:
                         answer = resp.content[:200]
@@ -58,12 +77,32 @@ class MidgardConnector(WithLogger):
                     return self.ERROR_RESPONSE
                 j = await resp.json()
                 return j
+        except asyncio.TimeoutError:
+            self.logger.error(f'Midgard ({ip_address}/{path}) timeout.')
+            self.limiter.on_pressure()
+            return self.ERROR_OVERLOADED
         except Exception as e:
             self.logger.error(f'Midgard ({ip_address}/{path}) exception: {e!r}.')
             return self.ERROR_RESPONSE
 
-    async def request(self, path: str):
-        result = await self._request_json_from_midgard_by_ip(self.public_url, path)
+    async def _request_adaptive(self, path: str, retries: Optional[int] = None):
+        """
+        Goes through the AIMD limiter; retries the overload responses as the limiter allows.
+        Pass retries=1 if the caller has its own retry loop, so the attempts do not multiply.
+        """
+        result = self.ERROR_RESPONSE
+        for _ in range(max(1, self.retries if retries is None else retries)):
+            async with self.limiter.slot():
+                t0 = time.monotonic()
+                result = await self._request_json_from_midgard_by_ip(self.public_url, path)
+                if result not in (self.ERROR_OVERLOADED, self.ERROR_RESPONSE):
+                    self.limiter.on_success(time.monotonic() - t0)
+            if result != self.ERROR_OVERLOADED:
+                break
+        return result
+
+    async def request(self, path: str, retries: Optional[int] = None):
+        result = await self._request_adaptive(path, retries)
         if isinstance(result, str) and result != self.ERROR_NOT_FOUND:
             self.logger.error(f'Probably there is an issue. Midgard has returned a plain string: {result!r} '
                               f'for the path {path!r}')
@@ -1,8 +1,50 @@
+from aioredis import Redis
+from aioredis.client import Script
+
 from services.lib.cooldown import Cooldown
 from services.lib.db import DB
 
+# GCRA and the cooldown that follows hitting the limit, in one atomic step on the Redis side.
+# KEYS[1] = TAT key of the limiter, KEYS[2] = cooldown key (same JSON record as Cooldown uses)
+# ARGV[1] = limit, ARGV[2] = period (sec), ARGV[3] = cooldown (sec, 0 = no cooldown)
+LUA_GCRA_COOLDOWN = """
+redis.replicate_commands()
+local now = redis.call('TIME')
+local t = tonumber(now[1]) + tonumber(now[2]) * 1e-6
+local limit, period, cd = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+
+if cd > 0 then
+    local raw = redis.call('GET', KEYS[2])
+    if raw then
+        local ok, rec = pcall(cjson.decode, raw)
+        if ok and type(rec) == 'table' and type(rec['time']) == 'number' and t - cd <= rec['time'] then
+            return 'on_cd'
+        end
+    end
+end
+
+local separation = period / limit
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or 0) or 0, t)
+if tat - t <= period - separation then
+    local new_tat = tat + separation
+    redis.call('SET', KEYS[1], string.format('%.6f', new_tat), 'PX', math.ceil((new_tat - t) * 1000) + 1000)
+    return 'good'
+end
+
+if cd > 0 then
+    redis.call('SET', KEYS[2], cjson.encode({time = t, count = 0}), 'PX', math.ceil(cd * 1000) + 1000)
+end
+return 'hit_limit'
+"""
+
 
 class RateLimiter:
+    ON_COOLDOWN = 'on_cd'
+    HIT_LIMIT = 'hit_limit'
+    GOOD = 'good'
+
+    _script: Script = None
+
     def __init__(self, db: DB, key, limit: int, period: float):
         self.db = db
         self.key = key
@@ -19,6 +61,12 @@ class RateLimiter:
     def _full_key(k):
         return f'RateLimit:{k}'
 
+    @classmethod
+    async def _run_script(cls, r: Redis, key: str, cd_key: str, limit: int, period: float, cd_sec: float) -> str:
+        if RateLimiter._script is None:
+            RateLimiter._script = r.register_script(LUA_GCRA_COOLDOWN)
+        return await RateLimiter._script(keys=[cls._full_key(key), cd_key], args=[limit, period, cd_sec], client=r)
+
     @classmethod
     async def is_limited_s(cls, db: DB, key: str, limit: int, period: float):
         if not key:
@@ -27,19 +75,10 @@ class RateLimiter:
         if limit <= 0 or period <= 0:
             return False
 
-        key = cls._full_key(key)
-
-        r = db.redis
-        sec, micro_sec = (await r.time())
-        t = sec + micro_sec * 1e-6
-        separation = period / limit
-        await r.setnx(key, 0.0)
-        tat = max(float(await r.get(key)), t)
-        if tat - t <= period - separation:
-            new_tat = max(tat, t) + separation
-            await r.set(key, new_tat)
-            return False
-        return True
+        r = await db.get_redis()
+        # no cooldown here, so the script never touches the second key
+        outcome = await cls._run_script(r, key, Cooldown.get_key(key), limit, period, 0.0)
+        return outcome != cls.GOOD
 
     @classmethod
     async def clear_s(cls, db: DB, key: str):
@@ -47,21 +86,21 @@ class RateLimiter:
 
 
 class RateLimitCooldown(RateLimiter):
-    ON_COOLDOWN = 'on_cd'
-    HIT_LIMIT = 'hit_limit'
-    GOOD = 'good'
-
     def __init__(self, db: DB, key, limit: int, period: float, cd_sec: float):
         super().__init__(db, key, limit, period)
         self.cd = Cooldown(db, f'RateLimitCooldown:{key}', cd_sec)
 
     async def hit(self):
-        if not await self.cd.can_do():
+        if not self.key:
             return self.ON_COOLDOWN
-        else:
-            good = not await self.is_limited()
-            if good:
-                return self.GOOD
-            else:
-                await self.cd.do()
-                return self.HIT_LIMIT
+
+        if self.limit <= 0 or self.period <= 0:
+            return self.GOOD
+
+        r = await self.db.get_redis()
+        return await self._run_script(r, self.key, self.cd.get_key(self.cd.event_name),
+                                      self.limit, self.period, self.cd.cooldown)
+
+    async def clear(self):
+        await super().clear()
+        await self.db.redis.delete(self.cd.get_key(self.cd.event_name))
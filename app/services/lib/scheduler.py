@@ -1,14 +1,77 @@
 import asyncio
+import random
+from typing import List, Set, Tuple
 
 from aioredis import Redis
 
-from services.lib.date_utils import now_ts, DAY
+from services.lib.date_utils import now_ts, DAY, MINUTE
+from services.lib.db_key_index import KeyIndex, KEY_BATCH
 from services.lib.delegates import WithDelegates
+from services.lib.metrics import REGISTRY
 from services.lib.utils import WithLogger
 
+SCHEDULER_LAG_SECONDS = REGISTRY.histogram(
+    'scheduler_lag_seconds', 'Actual start of an event handler minus its due time', ['scheduler'],
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+)
+SCHEDULER_EVENTS = REGISTRY.counter('scheduler_events', 'Handled scheduler events by result', ['scheduler', 'result'])
+SCHEDULER_RUNNING = REGISTRY.gauge('scheduler_running_handlers', 'Scheduler handlers running right now', ['scheduler'])
+
+# Takes up to N due events off the timeline and leases them to the caller, all at once.
+# KEYS[1] = timeline (zset: ident => due ts), KEYS[2] = leases (zset: ident => lease deadline),
+# KEYS[3] = due times of the leased events (hash: ident => due ts)
+# ARGV[1] = now, ARGV[2] = max count, ARGV[3] = lease deadline
+# Returns a flat list: ident, due ts, ident, due ts...
+LUA_POP_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2]))
+for i = 1, #due, 2 do
+    redis.call('ZREM', KEYS[1], due[i])
+    redis.call('ZADD', KEYS[2], ARGV[3], due[i])
+    redis.call('HSET', KEYS[3], due[i], due[i + 1])
+end
+return due
+"""
+
+# Puts the events whose lease has expired (the instance died while handling them) back on the timeline
+# at their due time, unless the timeline already has them earlier.
+# KEYS are the same as above; ARGV[1] = now. Returns the number of re-queued events.
+LUA_REQUEUE_EXPIRED = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, ident in ipairs(expired) do
+    local due = redis.call('HGET', KEYS[3], ident) or ARGV[1]
+    local current = redis.call('ZSCORE', KEYS[1], ident)
+    if not current or tonumber(current) > tonumber(due) then
+        redis.call('ZADD', KEYS[1], due, ident)
+    end
+    redis.call('ZREM', KEYS[2], ident)
+    redis.call('HDEL', KEYS[3], ident)
+end
+return #expired
+"""
+
+# Drops the lease of a finished handler, but only if it is still the same lease: a periodic event may have been
+# popped again (with a later due time) while this handler was running, and that lease must stay.
+# KEYS are the same as above; ARGV[1] = ident, ARGV[2] = due ts of the finished run
+LUA_RELEASE = """
+local due = redis.call('HGET', KEYS[3], ARGV[1])
+if due and tonumber(due) == tonumber(ARGV[2]) then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[3], ARGV[1])
+    return 1
+end
+return 0
+"""
+
 
 class Scheduler(WithLogger, WithDelegates):
-    def __init__(self, r: Redis, name, poll_interval: float = 10, forget_after=DAY):
+    """
+    Due events are popped atomically, so several instances never get the same one, and leased:
+    if the instance dies before the handler is over, the lease expires and the event goes back to the timeline.
+    Up to "concurrency" handlers run at once, each one is limited by "handler_timeout" seconds.
+    """
+
+    def __init__(self, r: Redis, name, poll_interval: float = 10, forget_after=DAY,
+                 concurrency: int = 4, handler_timeout: float = 5 * MINUTE):
         assert name
         super().__init__()
         self.name = name
@@ -16,6 +79,17 @@ class Scheduler(WithLogger, WithDelegates):
         self._r = r
         self._running = False
         self.forget_after = forget_after
+        self._period_index = KeyIndex(r, self.key_period_index(), self.key_period)
+
+        self.concurrency = max(1, int(concurrency))
+        self.handler_timeout = handler_timeout
+        # the lease outlives the handler's timeout, so it only expires if the instance is gone
+        self.lease_time = (2 * handler_timeout if handler_timeout else 30 * MINUTE) + poll_interval
+        self._pop_script = r.register_script(LUA_POP_DUE)
+        self._requeue_script = r.register_script(LUA_REQUEUE_EXPIRED)
+        self._release_script = r.register_script(LUA_RELEASE)
+        self._handlers: Set[asyncio.Task] = set()
+        SCHEDULER_RUNNING.set_function(lambda: len(self._handlers), name)
 
     async def schedule(self, ident, timestamp=0.0, period=0.0):
         assert isinstance(ident, (str, int, float)) and ident, 'ident must be a string or number'
@@ -33,10 +107,14 @@ class Scheduler(WithLogger, WithDelegates):
         await self._r.zadd(self.key_timeline(), {ident: timestamp})
 
         key_period = self.key_period(ident)
+        pipe = self._r.pipeline()
         if period > 0:
-            await self._r.set(key_period, period)
+            pipe.set(key_period, period)
+            self._period_index.add(pipe, [ident])
         else:
-            await self._r.delete(key_period)
+            pipe.delete(key_period)
+            self._period_index.remove(pipe, [ident])
+        await pipe.execute()
 
     def ev_desc(self, ident):
         return f'"{self.name}:{ident}"'
@@ -82,27 +160,108 @@ class Scheduler(WithLogger, WithDelegates):
     async def awaiting_events(self):
         return await self._r.zrange(self.key_timeline(), 0, -1, withscores=True)
 
+    async def all_periodic_idents(self, ident=None):
+        # "ident" may be a glob pattern, as it used to be for KEYS; SSCAN matches it against the index only
+        return {name async for name in self._period_index.iter_members(match=ident or '*')}
+
     async def all_periodic_events(self, ident=None):
-        return await self._r.keys(self.key_period(ident or '*'))
+        return [self.key_period(name) for name in await self.all_periodic_idents(ident)]
 
     async def cancel(self, ident):
-        await self._r.zrem(self.key_timeline(), ident)
-        await self._r.delete(self.key_period(ident))
+        pipe = self._r.pipeline()
+        pipe.zrem(self.key_timeline(), ident)
+        pipe.delete(self.key_period(ident))
+        self._period_index.remove(pipe, [ident])
+        await pipe.execute()
         self.logger.debug(f'Cancelled: {self.ev_desc(ident)}')
 
     async def cancel_all_periodic(self, ident=None):
-        keys = await self.all_periodic_events(ident)
-        if keys:
-            await self._r.delete(*keys)
-            await self._r.zrem(self.key_timeline(), *keys)
+        idents = list(await self.all_periodic_idents(ident))
+        if idents:
+            pipe = self._r.pipeline()
+            pipe.delete(*map(self.key_period, idents))
+            pipe.zrem(self.key_timeline(), *idents)
+            self._period_index.remove(pipe, idents)
+            await pipe.execute()
 
-    async def _process(self):
+    async def spread_periodic(self, window: float, ident=None) -> int:
+        """
+        Moves every periodic event (matching "ident") that waits on the timeline by a random offset within "window".
+        The events keep their period, so a burst of events that were scheduled at the same moment is spread for good.
+        """
+        if window <= 0:
+            return 0
+        idents = list(await self.all_periodic_idents(ident))
+        moved = 0
+        for i in range(0, len(idents), KEY_BATCH):
+            batch = idents[i:i + KEY_BATCH]
+            pipe = self._r.pipeline(transaction=False)
+            for name in batch:
+                pipe.zscore(self.key_timeline(), name)
+            scores = await pipe.execute()
+
+            shifted = {name: float(score) + random.uniform(0, window)
+                       for name, score in zip(batch, scores) if score is not None}
+            if shifted:
+                # XX: an event that has just been popped or cancelled is not put back
+                moved += len(shifted)
+                await self._r.zadd(self.key_timeline(), shifted, xx=True)
+        return moved
+
+    @property
+    def _lease_keys(self):
+        return [self.key_timeline(), self.key_leases(), self.key_lease_due()]
+
+    async def _pop_due(self, limit: int) -> List[Tuple[str, float]]:
         now = now_ts()
-        key_timeline = self.key_timeline()
-        evs = await self._r.zrangebyscore(key_timeline, 0, now, withscores=True)
-        await self._r.zremrangebyscore(key_timeline, 0, now)
-        for ev in evs:
-            await self._run_handler(ev)
+        flat = await self._pop_script(self._lease_keys, [now, limit, now + self.lease_time], self._r)
+        return [(flat[i], float(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+    async def _requeue_expired(self):
+        n = await self._requeue_script(self._lease_keys, [now_ts()], self._r)
+        if n:
+            self.logger.warning(f'{n} events of "{self.name}" had their leases expired. Re-queued.')
+        return n
+
+    async def _release(self, ident, due):
+        return await self._release_script(self._lease_keys, [ident, repr(due)], self._r)
+
+    async def _run_leased(self, ev):
+        ident, due = ev
+        SCHEDULER_LAG_SECONDS.observe(self.name, value=max(0.0, now_ts() - due))
+        try:
+            await asyncio.wait_for(self._run_handler(ev), timeout=self.handler_timeout or None)
+            SCHEDULER_EVENTS.inc(self.name, 'done')
+        except asyncio.TimeoutError:
+            # not retried: a handler that has hung once will likely hang again
+            SCHEDULER_EVENTS.inc(self.name, 'timeout')
+            self.logger.error(f'Handler of {self.ev_desc(ident)} timed out after {self.handler_timeout} sec.')
+        finally:
+            try:
+                await self._release(ident, due)
+            except Exception as e:
+                self.logger.error(f'Failed to release the lease of {self.ev_desc(ident)}: {e!r}')
+
+    async def _process(self):
+        await self._requeue_expired()
+        while True:
+            free = self.concurrency - len(self._handlers)
+            if free <= 0:
+                await asyncio.wait(self._handlers, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            evs = await self._pop_due(free)
+            for ev in evs:
+                task = asyncio.create_task(self._run_leased(ev))
+                self._handlers.add(task)
+                task.add_done_callback(self._handlers.discard)
+
+            if len(evs) < free:
+                return  # nothing else is due yet
+
+    async def wait_handlers(self):
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
 
     def key_timeline(self):
         return f'Scheduler:{self.name}:TimeLine'
@@ -110,8 +269,17 @@ class Scheduler(WithLogger, WithDelegates):
     def key_period(self, ident):
         return f'Scheduler:{self.name}:Period:{ident}'
 
+    def key_period_index(self):
+        return f'Scheduler:{self.name}:PeriodIndex'
+
+    def key_leases(self):
+        return f'Scheduler:{self.name}:Leases'
+
+    def key_lease_due(self):
+        return f'Scheduler:{self.name}:LeaseDue'
+
     async def clear(self):
-        await self._r.delete(self.key_timeline())
+        await self._r.delete(self.key_timeline(), self.key_leases(), self.key_lease_due())
 
     async def run(self):
         if self._running:
@@ -0,0 +1,173 @@
+import hashlib
+import math
+from typing import List, Optional, Iterable
+
+from aioredis import Redis
+
+from services.lib.date_utils import now_ts, DAY
+from services.lib.db import DB
+from services.lib.db_key_index import SCAN_COUNT, KEY_BATCH
+from services.lib.utils import WithLogger
+
+
+class BloomFilter:
+    """
+    In-process Bloom filter. "False" from "__contains__" means definitely not added;
+    "True" means probably added (false positive rate is about "error_rate" while under "capacity").
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.n_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.n_hashes = max(1, round(self.n_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    def add(self, item: str) -> bool:
+        """ Returns True if the item is new to the filter (some bit was not set yet); only those count """
+        is_new = False
+        for pos in self._positions(item):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                is_new = True
+        if is_new:
+            self.count += 1
+        return is_new
+
+    def __contains__(self, item: str):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+
+class TimeBucketedSeenSet(WithLogger):
+    """
+    "Have we seen this id?" for a sliding window of time. Ids are added to the set of the current bucket
+    (e.g. a day), which expires on its own after "keep_buckets" buckets, so nothing grows without a limit.
+    A lookup probes all live buckets with SMISMEMBER in one pipeline for a whole batch of ids.
+    The optional Bloom filter answers "definitely new" without Redis; it is loaded from Redis on the first use.
+    Enable it only if this process is the only writer of the set, otherwise it misses the others' ids.
+    """
+
+    def __init__(self, db: DB, prefix: str, bucket_sec: float = DAY, keep_buckets: int = 3,
+                 bloom_capacity: int = 0, bloom_error_rate: float = 0.001):
+        super().__init__()
+        self.db = db
+        self.prefix = prefix
+        self.bucket_sec = bucket_sec
+        self.keep_buckets = max(1, int(keep_buckets))
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.bloom: Optional[BloomFilter] = None
+        self.bloom_skips = 0
+
+    def bucket_of(self, ts: float) -> int:
+        return int(ts // self.bucket_sec)
+
+    def bucket_key(self, bucket: int):
+        return f'{self.prefix}:{bucket}'
+
+    def live_keys(self, ts=None) -> List[str]:
+        current = self.bucket_of(ts or now_ts())
+        return [self.bucket_key(b) for b in range(current, current - self.keep_buckets, -1)]
+
+    @property
+    def ttl_sec(self):
+        return int(self.bucket_sec * (self.keep_buckets + 1))
+
+    async def _redis(self) -> Redis:
+        return await self.db.get_redis()
+
+    async def _load_bloom(self, ts=None):
+        r = await self._redis()
+        keys = self.live_keys(ts)
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            pipe.scard(key)
+        loaded = sum(await pipe.execute())
+
+        # at least twice the live items: otherwise the filter is full right after loading and reloads on every call
+        capacity = max(self.bloom_capacity, 2 * loaded)
+        if capacity > self.bloom_capacity:
+            self.logger.warning(f'Bloom filter of "{self.prefix}": {loaded} live items do not fit '
+                                f'the capacity of {self.bloom_capacity}; sized for {capacity} instead.')
+
+        bloom = BloomFilter(capacity, self.bloom_error_rate)
+        for key in keys:
+            async for item in r.sscan_iter(key, count=SCAN_COUNT):
+                bloom.add(item)
+        self.bloom = bloom
+        self.logger.info(f'Bloom filter of "{self.prefix}" is loaded: {bloom.count} items, capacity {capacity}.')
+
+    async def seen_many(self, ids: List[str], ts=None) -> List[bool]:
+        """ For every id tells whether it was added within the window """
+        if not ids:
+            return []
+
+        if self.bloom_capacity and (self.bloom is None or self.bloom.is_full):
+            await self._load_bloom(ts)
+
+        results = [False] * len(ids)
+        to_check = list(range(len(ids)))
+        if self.bloom is not None:
+            to_check = [i for i in to_check if ids[i] in self.bloom]
+            self.bloom_skips += len(ids) - len(to_check)
+        if not to_check:
+            return results
+
+        probe = [ids[i] for i in to_check]
+        r = await self._redis()
+        pipe = r.pipeline(transaction=False)
+        for key in self.live_keys(ts):
+            pipe.execute_command('SMISMEMBER', key, *probe)
+        for flags in await pipe.execute():
+            for j, flag in enumerate(flags):
+                if int(flag):
+                    results[to_check[j]] = True
+        return results
+
+    async def add_many(self, ids: Iterable[str], ts=None):
+        ids = [i for i in ids if i]
+        if not ids:
+            return
+        key = self.bucket_key(self.bucket_of(ts or now_ts()))
+        r = await self._redis()
+        pipe = r.pipeline(transaction=False)
+        pipe.sadd(key, *ids)
+        pipe.expire(key, self.ttl_sec)
+        await pipe.execute()
+        if self.bloom is not None:
+            for item in ids:
+                self.bloom.add(item)
+
+    async def migrate_from_set(self, legacy_key: str, ts=None) -> int:
+        """ Moves the members of an old unbounded set into the current bucket and deletes it """
+        r = await self._redis()
+        moved = 0
+        batch = []
+        async for item in r.sscan_iter(legacy_key, count=SCAN_COUNT):
+            batch.append(item)
+            if len(batch) >= KEY_BATCH:
+                await self.add_many(batch, ts)
+                moved += len(batch)
+                batch = []
+        if batch:
+            await self.add_many(batch, ts)
+            moved += len(batch)
+        await r.unlink(legacy_key)
+        return moved
+
+    async def clear(self):
+        r = await self._redis()
+        current = self.bucket_of(now_ts())
+        await r.delete(*(self.bucket_key(b) for b in range(current + 1, current - self.keep_buckets - 1, -1)))
+        self.bloom = None
@@ -1,7 +1,12 @@
+import asyncio
+import time
+
 import ujson
 
+from services.lib.async_cache import LRU
 from services.lib.config import Config
 from services.lib.db import DB
+from services.lib.db_key_index import KeyIndex
 from services.lib.db_one2one import OneToOne
 from services.lib.delegates import INotified, WithDelegates
 from services.lib.utils import random_hex, WithLogger
@@ -15,12 +20,25 @@ class SettingsManager(WithDelegates, WithLogger):
 
     KEY_MESSENGER = '_messenger'
 
+    DB_CHANNEL_INVALIDATE = 'Settings:Invalidate'
+    DB_KEY_INDEX = 'Settings:Index'
+
     def __init__(self, db: DB, cfg: Config):
         super().__init__()
         self.db = db
         self.cfg = cfg
         self.public_url = cfg.as_str('web.public_url').rstrip('/')
         self.token_channel_db = OneToOne(db, 'Token-Channel')
+        self.index = KeyIndex(db, self.DB_KEY_INDEX, self.db_key_settings)
+
+        # process-local cache: channel_id -> (expire_at, raw_json, parsed_settings)
+        self.cache_ttl = cfg.as_interval('personal.settings_cache.ttl', '5m')
+        self._cache = LRU(maxsize=cfg.as_int('personal.settings_cache.max_size', 20_000))
+        self._instance_id = random_hex(8).decode()
+        self._invalidation_task = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_invalidations = 0
 
     def get_link(self, token):
         return f'{self.public_url}/?token={token}'
@@ -41,22 +59,118 @@ class SettingsManager(WithDelegates, WithLogger):
     def _parse_settings(self, data):
         return ujson.loads(data) if data else {}
 
+    # --- cache ---
+
+    def _cache_get(self, channel_id):
+        if channel_id in self._cache:
+            entry = self._cache[channel_id]
+            if entry[0] > time.monotonic():
+                self.cache_hits += 1
+                return entry
+            self._cache_drop(channel_id)
+        self.cache_misses += 1
+
+    def _cache_drop(self, channel_id):
+        if channel_id in self._cache:
+            del self._cache[channel_id]
+
+    def _cache_put(self, channel_id, raw, parsed=None):
+        if parsed is None:
+            parsed = self._parse_settings(raw)
+        entry = (time.monotonic() + self.cache_ttl, raw, parsed)
+        self._cache[channel_id] = entry
+        return entry
+
+    def invalidate(self, channel_id=None):
+        self.cache_invalidations += 1
+        if channel_id is None:
+            self._cache.clear()
+        else:
+            self._cache_drop(channel_id)
+
+    @property
+    def cache_stats(self):
+        total = self.cache_hits + self.cache_misses
+        return {
+            'size': len(self._cache),
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'invalidations': self.cache_invalidations,
+            'hit_rate': self.cache_hits / total * 100.0 if total else 0.0,
+        }
+
+    async def _publish_invalidation(self, channel_id):
+        await self.db.redis.publish(self.DB_CHANNEL_INVALIDATE, f'{self._instance_id}:{channel_id}')
+
+    async def _listen_invalidations(self):
+        while True:
+            pubsub = None
+            try:
+                r = await self.db.get_redis()
+                pubsub = r.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.DB_CHANNEL_INVALIDATE)
+                # whatever happened while we were not subscribed is unknown
+                self.invalidate()
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    origin, _, channel_id = str(message.get('data', '')).partition(':')
+                    if origin != self._instance_id:
+                        self.invalidate(channel_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f'Settings invalidation listener error: {e!r}. Restarting soon.')
+                await asyncio.sleep(5.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+    def start_invalidation_listener(self):
+        """ Must be called from a running event loop; other processes' set_settings will evict our cache entries """
+        if self._invalidation_task is None:
+            self._invalidation_task = asyncio.create_task(self._listen_invalidations())
+        return self._invalidation_task
+
+    # --- reading ---
+
     async def get_settings(self, channel_id: str):
         if not channel_id:
             return {}
-        data = await self.db.redis.get(self.db_key_settings(channel_id))
-        return self._parse_settings(data)
+        entry = self._cache_get(channel_id)
+        if entry is None:
+            data = await self.db.redis.get(self.db_key_settings(channel_id))
+            entry = self._cache_put(channel_id, data)
+        # a fresh copy, because the caller is likely to modify it
+        return self._parse_settings(entry[1])
 
     async def get_settings_multi(self, channels_ids):
+        """
+        Returns the shared cached dictionaries. Do not modify them in place unless you call set_settings after.
+        """
         channels_ids = [cid for cid in channels_ids if cid]
         if not channels_ids:
             return {}
-        channels_keys = [self.db_key_settings(cid) for cid in channels_ids]
-        data_chunks = await self.db.redis.mget(keys=channels_keys)
-        return {
-            cid: self._parse_settings(data)
-            for cid, data in zip(channels_ids, data_chunks)
-        }
+
+        results = {}
+        missing = []
+        for cid in channels_ids:
+            entry = self._cache_get(cid)
+            if entry is None:
+                missing.append(cid)
+            else:
+                results[cid] = entry[2]
+
+        if missing:
+            channels_keys = [self.db_key_settings(cid) for cid in missing]
+            data_chunks = await self.db.redis.mget(keys=channels_keys)
+            for cid, data in zip(missing, data_chunks):
+                results[cid] = self._cache_put(cid, data)[2]
+
+        return results
 
     @classmethod
     def set_messenger_data(cls, settings: dict, platform=Messengers.TELEGRAM, username='?', channel_name='?'):
@@ -81,11 +195,22 @@ class SettingsManager(WithDelegates, WithLogger):
             return
 
         if settings:
-            await self.db.redis.set(self.db_key_settings(channel_id), ujson.dumps(settings))
+            raw = ujson.dumps(settings)
+            pipe = self.db.redis.pipeline()
+            pipe.set(self.db_key_settings(channel_id), raw)
+            self.index.add(pipe, [channel_id])
+            await pipe.execute()
+            self._cache_put(channel_id, raw)
+            await self._publish_invalidation(channel_id)
             # additional processing
             await self.pass_data_to_listeners((channel_id, settings))
         else:
-            await self.db.redis.delete(self.db_key_settings(channel_id))
+            pipe = self.db.redis.pipeline()
+            pipe.delete(self.db_key_settings(channel_id))
+            self.index.remove(pipe, [channel_id])
+            await pipe.execute()
+            self._cache_put(channel_id, None)
+            await self._publish_invalidation(channel_id)
 
     def get_context(self, user_id) -> 'SettingsContext':
         return SettingsContext(self, user_id)
@@ -97,9 +222,7 @@ class SettingsManager(WithDelegates, WithLogger):
             self.logger.warning(f'Auto-paused alerts for {user}! It is marked as "Inactive" now!')
 
     async def all_users_having_settings(self):
-        pattern = self.db_key_settings('*')
-        keys = await self.db.redis.keys(pattern)
-        return [str(k).split(':', 3)[2] for k in keys]
+        return list(await self.index.members())
 
 
 class SettingsContext:
@@ -31,8 +31,8 @@ class UserWatchlist:
             await self.many2many.remove_one_item(user_id, node)
 
     async def remove_user_nodes(self, user_id, nodes: List[str]):
-        for node in nodes:
-            await self.remove_user_node(user_id, node)
+        if user_id:
+            await self.many2many.remove_many_rights(user_id, [node for node in nodes if node])
 
     async def clear_user_nodes(self, user_id):
         await self.many2many.remove_all_rights(user_id)
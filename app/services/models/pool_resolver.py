@@ -0,0 +1,94 @@
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple, FrozenSet
+
+from services.models.asset import Asset, ASSET_SYNTH_SEPARATOR, ASSET_TRADE_SEPARATOR
+
+
+class PoolResolver:
+    """
+    Immutable index over a fixed set of pool names. Build it once per pool set and then resolve user queries and
+    memo assets without scanning all the pools in Python every time.
+    The result set is exactly the one of the old fuzzy_search:
+        1. exact full name ("ETH.USDT-0XDAC...") => only it;
+        2. otherwise every name that contains the query, found with str.find over all the names joined into one text,
+           plus the abbreviations like "ETH.USDT-EC7" (prefix before "-", suffix after it).
+    Aliases (ticker "USDT", chain.ticker "ETH.USDT" and their synth/trade forms) only rank the results:
+    the names the query is an alias of come first. They never add or remove a result.
+    Results are memoized per query, so a repeated lookup is a single dict hit.
+    """
+
+    MAX_MEMO_SIZE = 10_000
+    SEPARATOR = '\n'  # never appears in a query: the queries are stripped
+
+    def __init__(self, names: Iterable[str]):
+        self.names: FrozenSet[str] = frozenset(names)
+        self._memo: Dict[str, Tuple[str, ...]] = {}
+
+        self._sorted_names = sorted(self.names)
+        self._text = self.SEPARATOR.join(self._sorted_names)
+        self._starts = []
+        offset = 0
+        for name in self._sorted_names:
+            self._starts.append(offset)
+            offset += len(name) + len(self.SEPARATOR)
+
+        aliases = defaultdict(set)
+        for name in self.names:
+            for alias in self.aliases_of(name):
+                aliases[alias].add(name)
+        self._aliases = {alias: frozenset(names) for alias, names in aliases.items()}
+
+    @staticmethod
+    def aliases_of(pool_name: str) -> List[str]:
+        a = Asset.from_string(pool_name)
+        if not a.valid:
+            return []
+        results = [a.name, f'{a.chain}.{a.name}']
+        for sep in (ASSET_SYNTH_SEPARATOR, ASSET_TRADE_SEPARATOR):
+            results.append(f'{a.chain}{sep}{a.name}')
+            results.append(f'{a.chain}{sep}{a.full_name}')
+        return [alias for alias in results if alias != pool_name]
+
+    def _containing(self, query: str) -> set:
+        found = set()
+        if not query or self.SEPARATOR in query:
+            return found
+        text, starts, names = self._text, self._starts, self._sorted_names
+        i = text.find(query)
+        while i >= 0:
+            k = bisect_right(starts, i) - 1
+            found.add(names[k])
+            # the next match can only be in the next name
+            next_start = starts[k + 1] if k + 1 < len(starts) else len(text)
+            i = text.find(query, next_start)
+        return found
+
+    def _resolve(self, query: str) -> Tuple[str, ...]:
+        if query in self.names:  # perfect match
+            return query,
+
+        variants = self._containing(query)
+        query_comp = query.split('-', 2)
+        if len(query_comp) >= 2:
+            # So ETH.USDT-EC7 matches ETH.USDT-0XDAC17F958D2EE523A2206206994597C13D831EC7
+            prefix, suffix = query_comp[0], query_comp[1]
+            variants.update(name for name in self._sorted_names if name.startswith(prefix) and name.endswith(suffix))
+
+        aliased = self._aliases.get(query, frozenset())
+        return tuple(sorted(variants, key=lambda name: (name not in aliased, name)))
+
+    def search(self, query: str) -> List[str]:
+        if not query:
+            return []
+        query = query.upper()
+        result = self._memo.get(query)
+        if result is None:
+            result = self._resolve(query)
+            if len(self._memo) >= self.MAX_MEMO_SIZE:
+                self._memo.clear()
+            self._memo[query] = result
+        return list(result)
+
+    def __len__(self):
+        return len(self.names)
@@ -7,9 +7,9 @@ from services.lib.config import Config
 from services.lib.constants import BTC_SYMBOL, STABLE_COIN_POOLS, thor_to_float
 from services.lib.date_utils import now_ts, DAY
 from services.lib.money import weighted_mean, Asset, is_cacao
-from services.lib.texts import fuzzy_search
 from services.models.base import BaseModelMixin
 from services.models.pool_info import PoolInfo, PoolInfoMap
+from services.models.pool_resolver import PoolResolver
 
 
 @dataclass
@@ -103,6 +103,7 @@ class LastPriceHolder:
         self.pool_info_map: PoolInfoMap = {}
         self.last_update_ts = 0
         self.stable_coins = stable_coins or STABLE_COIN_POOLS
+        self.resolver = PoolResolver([])
 
     def is_stable_coin(self, c):
         return c in self.stable_coins
@@ -154,6 +155,9 @@ class LastPriceHolder:
 
     def update(self, new_pool_info_map: PoolInfoMap):
         self.pool_info_map = new_pool_info_map.copy()
+        if self.pool_info_map.keys() != self.resolver.names:
+            # the pool set rarely changes, so the index is rebuilt only then
+            self.resolver = PoolResolver(self.pool_info_map.keys())
         self._calculate_weighted_rune_price()
         self._calculate_btc_price()
         self._fill_asset_price()
@@ -183,7 +187,7 @@ class LastPriceHolder:
         if (q := query.lower()) in Asset.SHORT_NAMES:
             # See: https://dev.thorchain.org/thorchain-dev/concepts/memos#shortened-asset-names
             return [Asset.SHORT_NAMES[q]]
-        return fuzzy_search(query, self.pool_names)
+        return self.resolver.search(query)
 
     def pool_fuzzy_first(self, query: str) -> str:
         query = query.replace('/', '.', 1).strip()
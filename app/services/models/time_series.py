@@ -1,24 +1,112 @@
 import json
 import logging
-from typing import Tuple
+from typing import Tuple, Optional, List
 
-from services.lib.date_utils import now_ts, MINUTE
+from aioredis.client import Script
+from aioredis.exceptions import WatchError
+
+from services.lib.date_utils import now_ts, MINUTE, HOUR, DAY
 from services.lib.db import DB
 
 MAX_POINTS_DEFAULT = 10000
 TOLERANCE_DEFAULT = 10  # sec
 MS = 1000  # milliseconds in 1 second
 
+# (bucket size in seconds, approximate MAXLEN of its stream)
+ROLLUP_RESOLUTIONS = (
+    (MINUTE, 30 * DAY // MINUTE),  # a month of minutes
+    (HOUR, 2 * 365 * DAY // HOUR),  # two years of hours
+    (DAY, 10 * 365),  # ten years of days
+)
+
+# Adds a raw point and folds its value into the rollup buckets, in one round trip.
+# The current bucket of every resolution lives in a hash; once a point of the next bucket comes,
+# the finished one is appended to the rollup stream with ID = bucket start. Points older than the open bucket
+# do not change the rollups (use rebuild_rollups for backfills). A finished bucket that is not after the last entry
+# of its rollup stream cannot be appended; it is not written and counted in the result instead of failing the add.
+# KEYS[1] = raw stream, then for every resolution: rollup stream, open bucket hash
+# ARGV: message id, raw MAXLEN (0 = none), value ('' = no rollup), number of resolutions,
+#       [bucket ms, MAXLEN] for every resolution, then the field/value pairs of the raw point
+# Returns {raw message id, number of the finished buckets that could not be appended}
+LUA_ADD_WITH_ROLLUPS = """
+local n_res = tonumber(ARGV[4])
+local first_field = 5 + 2 * n_res
+local fields = {}
+for i = first_field, #ARGV do
+    fields[#fields + 1] = ARGV[i]
+end
+
+local id
+local raw_max_len = tonumber(ARGV[2])
+if raw_max_len > 0 then
+    id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', raw_max_len, ARGV[1], unpack(fields))
+else
+    id = redis.call('XADD', KEYS[1], ARGV[1], unpack(fields))
+end
+
+local value = tonumber(ARGV[3])
+if not value then
+    return {id, 0}
+end
+
+local dropped = 0
+
+local ts = tonumber(string.match(id, '^(%d+)'))
+for i = 1, n_res do
+    local res = tonumber(ARGV[3 + 2 * i])
+    local max_len = ARGV[4 + 2 * i]
+    local stream, open = KEYS[2 * i], KEYS[2 * i + 1]
+    local bucket = ts - ts % res
+    local cur = redis.call('HMGET', open, 'b', 'h', 'l', 's', 'n', 'o')
+    local b = tonumber(cur[1])
+    if b == bucket then
+        redis.call('HSET', open,
+            'h', math.max(tonumber(cur[2]), value), 'l', math.min(tonumber(cur[3]), value), 'c', value,
+            's', tonumber(cur[4]) + value, 'n', tonumber(cur[5]) + 1)
+    elseif not b or bucket > b then
+        if b then
+            local last = redis.call('XREVRANGE', stream, '+', '-', 'COUNT', 1)[1]
+            if last and tonumber(string.match(last[1], '^(%d+)')) >= b then
+                dropped = dropped + 1
+            else
+                local c = redis.call('HGET', open, 'c')
+                local n = tonumber(cur[5])
+                redis.call('XADD', stream, 'MAXLEN', '~', max_len, b .. '-0',
+                    'o', cur[6], 'h', cur[2], 'l', cur[3], 'c', c, 'avg', tonumber(cur[4]) / n, 'n', n)
+            end
+        end
+        redis.call('HSET', open, 'b', bucket, 'o', value, 'h', value, 'l', value, 'c', value, 's', value, 'n', 1)
+    end
+end
+return {id, dropped}
+"""
+
 
 class TimeSeries:
-    def __init__(self, name: str, db: DB):
+    _add_script: Optional[Script] = None
+
+    def __init__(self, name: str, db: DB, max_len: Optional[int] = None, rollup_key: Optional[str] = None,
+                 resolutions=ROLLUP_RESOLUTIONS):
+        """
+        :param max_len: approximate cap of the raw stream (None = no cap)
+        :param rollup_key: numeric field to keep OHLC/avg rollups for (see ROLLUP_RESOLUTIONS)
+        """
         self.db = db
         self.name = name
+        self.max_len = max_len
+        self.rollup_key = rollup_key
+        self.resolutions = resolutions if rollup_key else ()
 
     @property
     def stream_name(self):
         return f'ts-stream:{self.name}'
 
+    def rollup_stream_name(self, resolution: int):
+        return f'ts-rollup:{self.name}:{resolution}'
+
+    def rollup_open_name(self, resolution: int):
+        return f'ts-rollup:{self.name}:{resolution}:open'
+
     @staticmethod
     def range_ago(ago_sec, tolerance_sec=10):
         now_sec = now_ts()
@@ -105,9 +193,24 @@ class TimeSeries:
 
     async def add(self, message_id=b'*', **kwargs):
         r = await self.db.get_redis()
-        # todo: MAXLEN
-        # todo: usage: XADD mystream MAXLEN ~ 1000 * ... entry fields here ...
-        await r.xadd(self.stream_name, kwargs, id=message_id)
+        if not self.resolutions:
+            return await r.xadd(self.stream_name, kwargs, id=message_id, maxlen=self.max_len, approximate=True)
+
+        if TimeSeries._add_script is None:
+            TimeSeries._add_script = r.register_script(LUA_ADD_WITH_ROLLUPS)
+
+        keys = [self.stream_name]
+        args = [message_id, self.max_len or 0, kwargs.get(self.rollup_key, ''), len(self.resolutions)]
+        for resolution, max_len in self.resolutions:
+            keys += [self.rollup_stream_name(resolution), self.rollup_open_name(resolution)]
+            args += [resolution * MS, max_len]
+        for field, value in kwargs.items():
+            args += [field, value]
+        message_id, dropped = await TimeSeries._add_script(keys, args, r)
+        if dropped:
+            logging.warning(f'TimeSeries "{self.name}": {dropped} finished rollup buckets are behind their streams '
+                            f'and were not written. Run rebuild_rollups.')
+        return message_id
 
     async def add_as_json(self, j: dict = None, message_id=b'*'):
         await self.add(message_id, json=json.dumps(j))
@@ -124,7 +227,129 @@ class TimeSeries:
 
     async def clear(self):
         r = await self.db.get_redis()
-        await r.delete(self.stream_name)
+        await r.delete(self.stream_name, *self._rollup_keys())
+
+    def _rollup_keys(self):
+        for resolution, _ in self.resolutions:
+            yield self.rollup_stream_name(resolution)
+            yield self.rollup_open_name(resolution)
+
+    # ---- rollups ----
+
+    def pick_resolution(self, period_sec, min_points) -> int:
+        """ The coarsest rollup that still gives "min_points" over the period, or 0 for the raw stream """
+        for resolution, _ in sorted(self.resolutions, reverse=True):
+            if period_sec / resolution >= min_points:
+                return resolution
+        return 0
+
+    async def get_rollup_points(self, resolution: int, period_sec, tolerance_sec=TOLERANCE_DEFAULT) -> List[dict]:
+        """ Finished buckets over the period plus the open one; every item has "ts", "o", "h", "l", "c", "avg", "n" """
+        r = await self.db.get_redis()
+        start, end = self.range_from_ago_to_now(period_sec + resolution, tolerance_sec)
+        pipe = r.pipeline(transaction=False)
+        pipe.xrange(self.rollup_stream_name(resolution), start, end)
+        pipe.hgetall(self.rollup_open_name(resolution))
+        closed, open_bucket = await pipe.execute()
+
+        points = []
+        for index, data in closed:
+            data = {k: float(v) for k, v in data.items()}
+            data['ts'] = self.get_ts_from_index(index)
+            points.append(data)
+
+        if open_bucket and int(open_bucket['b']) >= start:
+            n = int(open_bucket['n'])
+            points.append({
+                'ts': int(open_bucket['b']) / MS,
+                'o': float(open_bucket['o']), 'h': float(open_bucket['h']),
+                'l': float(open_bucket['l']), 'c': float(open_bucket['c']),
+                'avg': float(open_bucket['s']) / n, 'n': n,
+            })
+        return points
+
+    async def get_values_auto(self, period_sec, min_points=300, field='avg',
+                              max_points=MAX_POINTS_DEFAULT, tolerance_sec=TOLERANCE_DEFAULT, with_ts=False):
+        """
+        Values of "rollup_key" over the period from the coarsest resolution that still has "min_points" points;
+        the raw stream is read only when no rollup is fine enough (or there are no rollups yet).
+        :param field: which rollup field to take: "avg", "o", "h", "l" or "c"
+        """
+        resolution = self.pick_resolution(period_sec, min_points)
+        if resolution:
+            points = await self.get_rollup_points(resolution, period_sec, tolerance_sec)
+            if points:
+                return [(p['ts'], p[field]) if with_ts else p[field] for p in points]
+
+        return await self.get_last_values(period_sec, self.rollup_key, max_points, tolerance_sec, with_ts=with_ts)
+
+    async def rebuild_rollups(self, chunk=10_000, max_attempts=10):
+        """
+        Recalculates all rollups from the raw stream (after a backfill or for the data written before).
+        The new rollups replace the old ones in one MULTI under WATCH of the raw stream: if a point is added meanwhile,
+        only the new tail is read and folded in, and the write is tried again, so no live point is lost.
+        """
+        if not self.resolutions:
+            return
+        r = await self.db.get_redis()
+
+        buckets = {resolution: {} for resolution, _ in self.resolutions}
+        cursor = '-'
+        async with r.pipeline(transaction=True) as pipe:
+            for _ in range(max_attempts):
+                await pipe.watch(self.stream_name)
+                cursor = await self._fold_raw_points(pipe, buckets, cursor, chunk)
+                pipe.multi()
+                pipe.delete(*self._rollup_keys())
+                self._write_rollups(pipe, buckets)
+                try:
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue  # a point has come in: fold in the tail and try again
+        raise RuntimeError(f'TimeSeries "{self.name}": failed to rebuild the rollups in {max_attempts} attempts')
+
+    async def _fold_raw_points(self, r, buckets: dict, cursor, chunk) -> str:
+        """ Folds the raw points after "cursor" into "buckets"; returns the new cursor """
+        while True:
+            entries = await r.xrange(self.stream_name, cursor, '+', count=chunk)
+            for index, data in entries:
+                try:
+                    value = float(data[self.rollup_key])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                ts = int(index.split('-')[0])
+                for resolution, agg in buckets.items():
+                    b = ts - ts % (resolution * MS)
+                    if (bucket := agg.get(b)) is None:
+                        agg[b] = {'o': value, 'h': value, 'l': value, 'c': value, 's': value, 'n': 1}
+                    else:
+                        bucket.update(h=max(bucket['h'], value), l=min(bucket['l'], value), c=value,
+                                      s=bucket['s'] + value, n=bucket['n'] + 1)
+            if entries:
+                cursor = f'({entries[-1][0]}'
+            if len(entries) < chunk:
+                return cursor
+
+    def _write_rollups(self, pipe, buckets: dict):
+        for resolution, max_len in self.resolutions:
+            agg = buckets[resolution]
+            if not agg:
+                continue
+            *closed, last = sorted(agg.items())
+            for b, bucket in closed[-max_len:]:
+                pipe.xadd(self.rollup_stream_name(resolution), {
+                    'o': bucket['o'], 'h': bucket['h'], 'l': bucket['l'], 'c': bucket['c'],
+                    'avg': bucket['s'] / bucket['n'], 'n': bucket['n'],
+                }, id=f'{b}-0')
+            b, bucket = last
+            pipe.hset(self.rollup_open_name(resolution), mapping={'b': b, **bucket})
+
+    async def has_rollups(self) -> bool:
+        if not self.resolutions:
+            return False
+        r = await self.db.get_redis()
+        return bool(await r.exists(self.rollup_open_name(self.resolutions[0][0])))
 
     @staticmethod
     def adjacent_difference_points(points: list):
@@ -144,21 +369,21 @@ class TimeSeries:
     async def trim_oldest(self, max_len):
         if not max_len:
             return
-        prev_len = await self.get_length()
-        await self.db.redis.xtrim(self.stream_name, maxlen=max_len)
-        curr_len = await self.get_length()
-        if curr_len != prev_len:
-            logging.debug(f'Stream {self.stream_name} purged {prev_len - curr_len} old points. Now: {curr_len}.')
+        r = await self.db.get_redis()
+        removed = await r.xtrim(self.stream_name, maxlen=max_len)
+        if removed:
+            logging.debug(f'Stream {self.stream_name} purged {removed} old points.')
 
     async def get_length(self):
         return int(await self.db.redis.xlen(self.stream_name))
 
 
 class PriceTimeSeries(TimeSeries):
-    def __init__(self, coin: str, db: DB):
-        super().__init__(f'price-{coin}', db)
-
     KEY = 'price'
+    MAX_LEN = 200_000
+
+    def __init__(self, coin: str, db: DB):
+        super().__init__(f'price-{coin}', db, max_len=self.MAX_LEN, rollup_key=self.KEY)
 
     async def select_average_ago(self, ago, tolerance):
         items = await self.select(*self.range_ago(ago, tolerance))
@@ -9,7 +9,8 @@ from services.lib.depcont import DepContainer
 from services.lib.rate_limit import RateLimitCooldown
 from services.lib.texts import shorten_text
 from services.lib.utils import WithLogger
-from services.notify.channel import Messengers, ChannelDescriptor, CHANNEL_INACTIVE, BoardMessage
+from services.notify.channel import Messengers, ChannelDescriptor, CHANNEL_INACTIVE, BoardMessage, RetryAfterReporter
+from services.notify.fanout import FanoutEngine
 
 
 class Broadcaster(WithLogger):
@@ -19,8 +20,8 @@ class Broadcaster(WithLogger):
         super().__init__()
         self.deps = d
 
-        self._broadcast_lock = asyncio.Lock()
-        self._rate_limit_lock = asyncio.Lock()
+        self.fanout = FanoutEngine.from_config(d.cfg)
+        self._retry_after_hooks_set = False
         self._rng = random.Random(now_ts())
 
         # public channels
@@ -55,18 +56,21 @@ class Broadcaster(WithLogger):
         }
 
         if not callable(f):  # if constant
-            await self.broadcast(all_channels, f, *args, **kwargs)
+            await self.broadcast(all_channels, f, **kwargs)
             return
 
         # not to generate same content for different channels with the same languages. test it!
+        # the channels are served concurrently, so the first one to ask for a language generates it for the rest
         results_cached_by_lang = {}
 
         async def message_gen(chat_id):
             locale: BaseLocalization = user_lang_map[chat_id]
 
-            if prev_content := results_cached_by_lang.get(locale.name):
-                return prev_content
+            if (task := results_cached_by_lang.get(locale.name)) is None:
+                task = results_cached_by_lang[locale.name] = asyncio.ensure_future(generate(locale))
+            return await asyncio.shield(task)
 
+        async def generate(locale: BaseLocalization):
             if hasattr(locale, f.__name__):
                 # if we pass function name it like "BaseLocalization.notification_text_foo"
                 loc_f = getattr(locale, f.__name__)
@@ -77,12 +81,9 @@ class Broadcaster(WithLogger):
                 call_args = [locale, *args]
 
             if asyncio.iscoroutinefunction(loc_f):
-                result = await loc_f(*call_args, **kwargs)
+                return await loc_f(*call_args, **kwargs)
             else:
-                result = loc_f(*call_args, **kwargs)
-
-            results_cached_by_lang[locale.name] = result
-            return result
+                return loc_f(*call_args, **kwargs)
 
         await self.broadcast(all_channels, message_gen)
 
@@ -132,28 +133,28 @@ class Broadcaster(WithLogger):
 
     async def safe_send_message_rate(self, channel_info: ChannelDescriptor,
                                      message: BoardMessage, **kwargs) -> (bool, bool):
-        async with self._rate_limit_lock:
-            message = await self._form_message(message, channel_info)
-
-            limiter = RateLimitCooldown(self.deps.db,
-                                        f'SendMessage:{channel_info.short_coded}',
-                                        self._limit_number,
-                                        self._limit_period,
-                                        self._limit_cooldown)
-            outcome = await limiter.hit()
-            send_result = None
-            if outcome == limiter.GOOD:
-                # all good: pass through
-                send_result = await self.safe_send_message(channel_info, message, **kwargs)
-            elif outcome == limiter.HIT_LIMIT:
-                # oops! just hit the limit, tell about it once
-                loc = self.deps.loc_man.get_from_lang(channel_info.lang)
-                warning_message = BoardMessage(loc.RATE_LIMIT_WARNING)
-                send_result = await self.safe_send_message(channel_info, warning_message, **kwargs)
-            else:
-                s_text = shorten_text(message.text, 200)
-                self.logger.warning(f'Rate limit for channel "{channel_info.short_coded}"! Text: "{s_text}"')
-            return outcome, send_result
+        # the limiter is atomic on the Redis side, so different channels are served concurrently
+        message = await self._form_message(message, channel_info)
+
+        limiter = RateLimitCooldown(self.deps.db,
+                                    f'SendMessage:{channel_info.short_coded}',
+                                    self._limit_number,
+                                    self._limit_period,
+                                    self._limit_cooldown)
+        outcome = await limiter.hit()
+        send_result = None
+        if outcome == limiter.GOOD:
+            # all good: pass through
+            send_result = await self.safe_send_message(channel_info, message, **kwargs)
+        elif outcome == limiter.HIT_LIMIT:
+            # oops! just hit the limit, tell about it once
+            loc = self.deps.loc_man.get_from_lang(channel_info.lang)
+            warning_message = BoardMessage(loc.RATE_LIMIT_WARNING)
+            send_result = await self.safe_send_message(channel_info, warning_message, **kwargs)
+        else:
+            s_text = shorten_text(message.text, 200)
+            self.logger.warning(f'Rate limit for channel "{channel_info.short_coded}"! Text: "{s_text}"')
+        return outcome, send_result
 
     @staticmethod
     async def _form_message(data_source, channel_info: ChannelDescriptor, **kwargs) -> BoardMessage:
@@ -170,31 +171,40 @@ class Broadcaster(WithLogger):
         else:
             return BoardMessage(str(data_source))
 
-    async def broadcast(self, channels: List[ChannelDescriptor], message, delay=0.075, **kwargs) -> int:
+    def _set_retry_after_hooks(self):
+        # the bots report "429 / retry after" to the lane of their platform, so that all its workers back off
+        if self._retry_after_hooks_set:
+            return
+        for platform in Messengers.SUPPORTED:
+            messenger = self.deps.get_messenger(platform)
+            if isinstance(messenger, RetryAfterReporter):
+                messenger.on_retry_after = self.fanout.retry_after_handler(platform)
+        self._retry_after_hooks_set = True
+
+    async def broadcast(self, channels: List[ChannelDescriptor], message, **kwargs) -> int:
         if now_ts() < self._skip_all_before:
             self.logger.info('Skip message.')
             return 0
 
-        async with self._broadcast_lock:
-            count = 0
+        self._set_retry_after_hooks()
 
-            try:
-                for channel_info in channels:
-                    # make from any message a BoardMessage
-                    b_message = await self._form_message(message, channel_info, **kwargs)
-                    if b_message.empty:
-                        continue
+        async def send(channel_info: ChannelDescriptor):
+            # make from any message a BoardMessage
+            b_message = await self._form_message(message, channel_info, **kwargs)
+            if b_message.empty:
+                return False
+            return await self.safe_send_message(
+                channel_info, b_message,
+                disable_web_page_preview=True,
+                disable_notification=False, **kwargs)
 
-                    send_results = await self.safe_send_message(
-                        channel_info, b_message,
-                        disable_web_page_preview=True,
-                        disable_notification=False, **kwargs)
-
-                    if send_results is True:
-                        count += 1
-
-                    await asyncio.sleep(delay)  # 10 messages per second (Limit: 30 messages per second)
-            finally:
-                self.logger.info(f"{count} messages successful sent (of {len(channels)})")
-
-            return count
+        count = 0
+        try:
+            results = await self.fanout.deliver([
+                (channel_info, lambda c=channel_info: send(c)) for channel_info in channels
+            ])
+            count = sum(1 for r in results if r is True)
+        finally:
+            self.logger.info(f"{count} messages successful sent (of {len(channels)}). {self.fanout.stats_text()}")
+
+        return count
@@ -13,6 +13,19 @@ CHANNEL_INACTIVE = 'channel_inactive'
 MESSAGE_SEPARATOR = '------'
 
 
+class RetryAfterReporter:
+    """
+    Mixin of the messenger bots. Broadcaster's fan-out sets "on_retry_after" to make all the workers
+    of the platform back off; a bot calls "report_retry_after" when its API says "429 / retry after".
+    """
+
+    on_retry_after: typing.Optional[typing.Callable[[float], None]] = None
+
+    def report_retry_after(self, delay: float):
+        if self.on_retry_after:
+            self.on_retry_after(delay)
+
+
 class MessageType(Enum):
     TEXT = 'text'
     STICKER = 'sticker'
@@ -0,0 +1,263 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Callable, Awaitable, List, Optional
+
+from services.lib.config import Config
+from services.lib.metrics import REGISTRY
+from services.lib.utils import WithLogger
+from services.notify.channel import Messengers, ChannelDescriptor
+
+BROADCAST_QUEUE_DEPTH = REGISTRY.gauge('broadcast_queue_depth', 'Messages waiting in the fan-out lane of a platform',
+                                       ['platform'])
+BROADCAST_SENT = REGISTRY.counter('broadcast_messages', 'Delivered and failed messages', ['platform', 'result'])
+
+
+class TokenBucket:
+    """ Classic token bucket on the monotonic clock. rate <= 0 means "no limit". """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """ Takes a token and returns 0.0, or returns how long to wait before trying again """
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while (wait := self.try_take()) > 0.0:
+            await asyncio.sleep(wait)
+
+    def block_for(self, seconds: float):
+        """ The platform told us to back off (HTTP 429 / retry-after) """
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.blocked_until)
+
+    @property
+    def idle(self):
+        return self.tokens >= self.capacity or self.rate <= 0
+
+
+@dataclass
+class PlatformLimits:
+    rate: float  # messages per second for the whole bot
+    burst: float
+    per_chat_rate: float  # messages per second for one chat
+    per_chat_burst: float
+    workers: int
+
+    @classmethod
+    def from_config(cls, cfg: Config, path: str, default: 'PlatformLimits'):
+        return cls(
+            rate=cfg.as_float(f'{path}.rate', default.rate),
+            burst=cfg.as_float(f'{path}.burst', default.burst),
+            per_chat_rate=cfg.as_float(f'{path}.per_chat_rate', default.per_chat_rate),
+            per_chat_burst=cfg.as_float(f'{path}.per_chat_burst', default.per_chat_burst),
+            workers=max(1, cfg.as_int(f'{path}.workers', default.workers)),
+        )
+
+
+DEFAULT_LIMITS = {
+    # Telegram: ~30 msg/sec overall, ~1 msg/sec to the same chat
+    Messengers.TELEGRAM: PlatformLimits(rate=25.0, burst=25.0, per_chat_rate=1.0, per_chat_burst=3.0, workers=8),
+    # Discord: 50 req/sec overall, 5 msg per 5 sec per channel
+    Messengers.DISCORD: PlatformLimits(rate=40.0, burst=40.0, per_chat_rate=1.0, per_chat_burst=5.0, workers=4),
+    # Slack: about 1 msg/sec per channel
+    Messengers.SLACK: PlatformLimits(rate=10.0, burst=10.0, per_chat_rate=1.0, per_chat_burst=3.0, workers=4),
+    # Twitter: only one account, and posting is expensive
+    Messengers.TWITTER: PlatformLimits(rate=0.2, burst=3.0, per_chat_rate=0.0, per_chat_burst=1.0, workers=1),
+}
+
+
+@dataclass
+class _Job:
+    channel: ChannelDescriptor
+    send: Callable[[], Awaitable]
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class PlatformLane(WithLogger):
+    """
+    A bounded pool of workers for one messenger. Jobs are sharded by chat id, so messages to the same chat
+    keep their order, while different chats are served in parallel within the platform's token bucket.
+    """
+
+    LATENCY_WINDOW = 2000
+    MAX_IDLE_CHAT_BUCKETS = 10_000
+
+    def __init__(self, platform: str, limits: PlatformLimits):
+        super().__init__()
+        self.platform = platform
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate, limits.burst)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_count = 0
+
+    def start(self):
+        if self._workers:
+            return
+        for i in range(self.limits.workers):
+            q = asyncio.Queue()
+            self._queues.append(q)
+            self._workers.append(asyncio.create_task(self._worker(q)))
+
+    async def stop(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+
+    @property
+    def queue_depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def submit(self, channel: ChannelDescriptor, send: Callable[[], Awaitable]) -> asyncio.Future:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        shard = hash(str(channel.channel_id)) % len(self._queues)
+        self._queues[shard].put_nowait(_Job(channel, send, future, time.monotonic()))
+        return future
+
+    def retry_after(self, seconds: float):
+        self.retry_after_count += 1
+        self.logger.warning(f'{self.platform}: the platform asked to wait {seconds:.1f} sec.')
+        self.bucket.block_for(seconds)
+
+    def _chat_bucket(self, chat_id) -> Optional[TokenBucket]:
+        if self.limits.per_chat_rate <= 0:
+            return None
+        chat_id = str(chat_id)
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.MAX_IDLE_CHAT_BUCKETS:
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.idle}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.limits.per_chat_rate, self.limits.per_chat_burst)
+        return bucket
+
+    async def _worker(self, q: asyncio.Queue):
+        while True:
+            job: _Job = await q.get()
+            try:
+                if chat_bucket := self._chat_bucket(job.channel.channel_id):
+                    await chat_bucket.acquire()
+                await self.bucket.acquire()
+                result = await job.send()
+                self.sent += 1
+                BROADCAST_SENT.inc(self.platform, 'sent')
+                self.latencies.append(time.monotonic() - job.enqueued_at)
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                BROADCAST_SENT.inc(self.platform, 'failed')
+                self.logger.exception(f'{self.platform}: delivery to {job.channel.short_coded} failed.')
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                q.task_done()
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)) -> Dict[int, float]:
+        if not self.latencies:
+            return {}
+        values = sorted(self.latencies)
+        n = len(values)
+        return {p: values[min(n - 1, int(n * p / 100))] for p in percentiles}
+
+    @property
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'retry_after': self.retry_after_count,
+            'queue': self.queue_depth,
+            'latency': self.latency_percentiles(),
+        }
+
+
+class FanoutEngine(WithLogger):
+    """
+    Delivers one broadcast to many channels: every messenger has its own lane (token buckets + workers),
+    so a slow platform or a flood wait on one of them does not hold the others.
+    """
+
+    def __init__(self, limits: Dict[str, PlatformLimits]):
+        super().__init__()
+        self.limits = limits
+        self.lanes: Dict[str, PlatformLane] = {}
+        for platform in limits:
+            BROADCAST_QUEUE_DEPTH.set_function(lambda p=platform: self.lanes[p].queue_depth if p in self.lanes else 0,
+                                               platform)
+
+    @classmethod
+    def from_config(cls, cfg: Config):
+        return cls({
+            platform: PlatformLimits.from_config(cfg, f'broadcasting.fanout.{platform}', default)
+            for platform, default in DEFAULT_LIMITS.items()
+        })
+
+    def lane(self, platform: str) -> PlatformLane:
+        lane = self.lanes.get(platform)
+        if lane is None:
+            limits = self.limits.get(platform) or DEFAULT_LIMITS[Messengers.SLACK]
+            lane = self.lanes[platform] = PlatformLane(platform, limits)
+        return lane
+
+    def retry_after_handler(self, platform: str) -> Callable[[float], None]:
+        return self.lane(platform).retry_after
+
+    async def deliver(self, jobs: List[tuple]) -> list:
+        """
+        jobs: [(channel, async_send_function), ...]
+        Returns the results in the same order; an exception is returned in place of its result.
+        """
+        futures = [self.lane(channel.type).submit(channel, send) for channel, send in jobs]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def stop(self):
+        await asyncio.gather(*(lane.stop() for lane in self.lanes.values()))
+
+    @property
+    def queue_depth(self):
+        return sum(lane.queue_depth for lane in self.lanes.values())
+
+    @property
+    def stats(self):
+        return {platform: lane.stats for platform, lane in self.lanes.items()}
+
+    def stats_text(self):
+        parts = []
+        for platform, st in self.stats.items():
+            lat = ', '.join(f'p{p}={v:.2f}s' for p, v in st['latency'].items()) or 'n/a'
+            parts.append(f'{platform}: sent {st["sent"]}, failed {st["failed"]}, '
+                         f'429s {st["retry_after"]}, queue {st["queue"]}, latency {lat}')
+        return '; '.join(parts)
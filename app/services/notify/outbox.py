@@ -0,0 +1,247 @@
+import asyncio
+import base64
+import io
+from typing import Optional
+
+import PIL.Image
+import ujson
+from aioredis import Redis, ResponseError
+
+from services.lib.config import SubConfig
+from services.lib.date_utils import now_ts
+from services.lib.depcont import DepContainer
+from services.lib.utils import WithLogger
+from services.notify.channel import ChannelDescriptor, BoardMessage, MessageType
+
+
+class OutboundQueue(WithLogger):
+    """
+    Durable queue of personal messages on a Redis Stream with a consumer group.
+    Producers call "enqueue" and return at once; a fixed pool of workers drains the stream through
+    Broadcaster.safe_send_message_rate. A message is acknowledged only after it is handled, so the messages
+    left by a crashed or restarted process are picked up again. Failed deliveries are retried after
+    "retry_delay" and go to the dead-letter stream after "max_attempts".
+    """
+
+    STREAM = 'Outbox:Stream'
+    DLQ = 'Outbox:DeadLetters'
+    GROUP = 'senders'
+
+    def __init__(self, deps: DepContainer):
+        super().__init__()
+        self.deps = deps
+        cfg = deps.cfg.get('personal.outbox', default=SubConfig({}))
+        self.workers = max(1, cfg.as_int('workers', 8))
+        self.batch_size = max(1, cfg.as_int('batch_size', 10))
+        self.max_len = cfg.as_int('max_len', 100_000)
+        self.dlq_max_len = cfg.as_int('dlq_max_len', 10_000)
+        self.high_watermark = cfg.as_int('high_watermark', 20_000)
+        self.max_attempts = max(1, cfg.as_int('max_attempts', 5))
+        self.retry_delay = cfg.as_interval('retry_delay', '30s')
+        self.consumer_name = cfg.as_str('consumer', 'bot')
+        self.block_ms = 2000
+
+        self.sent = 0
+        self.dropped = 0
+        self.retried = 0
+        self.dead = 0
+
+        self._running = False
+        self._tasks = []
+
+    async def _redis(self) -> Redis:
+        return await self.deps.db.get_redis()
+
+    # ---- serialization ----
+
+    @staticmethod
+    def pack(channel: ChannelDescriptor, message: BoardMessage, **kwargs) -> dict:
+        msg = {
+            'text': message.text,
+            'type': message.message_type.value,
+            'photo_file_name': message.photo_file_name,
+        }
+        if message.photo is not None:
+            bio = io.BytesIO()
+            message.photo.save(bio, format='PNG')
+            msg['photo'] = base64.b64encode(bio.getvalue()).decode()
+        return {
+            'channel': ujson.dumps(list(channel)),
+            'message': ujson.dumps(msg),
+            'kwargs': ujson.dumps(kwargs),
+            'ts': now_ts(),
+        }
+
+    @staticmethod
+    def unpack(fields: dict):
+        channel = ChannelDescriptor(*ujson.loads(fields['channel']))
+        msg = ujson.loads(fields['message'])
+        photo = None
+        if msg.get('photo'):
+            photo = PIL.Image.open(io.BytesIO(base64.b64decode(msg['photo'])))
+        message = BoardMessage(msg['text'], MessageType(msg['type']), photo, msg.get('photo_file_name', 'photo.png'))
+        kwargs = ujson.loads(fields.get('kwargs') or '{}')
+        return channel, message, kwargs
+
+    # ---- producer ----
+
+    async def enqueue(self, channel: ChannelDescriptor, message: BoardMessage, wait_limit=30.0, **kwargs):
+        r = await self._redis()
+
+        # backpressure: let the workers catch up before adding more; the stream is capped by MAXLEN anyway
+        deadline = now_ts() + wait_limit
+        while await r.xlen(self.STREAM) >= self.high_watermark and now_ts() < deadline:
+            await asyncio.sleep(0.5)
+
+        return await r.xadd(self.STREAM, self.pack(channel, message, **kwargs), maxlen=self.max_len)
+
+    # ---- consumer ----
+
+    async def _ensure_group(self):
+        r = await self._redis()
+        try:
+            await r.xgroup_create(self.STREAM, self.GROUP, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def _deliver(self, fields: dict) -> bool:
+        """ Returns True if the message is done with (sent or deliberately dropped), False to retry it later """
+        channel, message, kwargs = self.unpack(fields)
+        outcome, send_result = await self.deps.broadcaster.safe_send_message_rate(channel, message, **kwargs)
+        if send_result is False:
+            return False
+        if send_result is None:
+            self.dropped += 1  # rate limit cooldown
+        else:
+            self.sent += 1
+        return True
+
+    async def _handle(self, entry_id: str, fields: dict):
+        r = await self._redis()
+        try:
+            done = await self._deliver(fields)
+        except Exception as e:
+            self.logger.exception(f'Outbox entry {entry_id} failed: {e!r}')
+            done = False
+
+        if done:
+            pipe = r.pipeline(transaction=False)
+            pipe.xack(self.STREAM, self.GROUP, entry_id)
+            pipe.xdel(self.STREAM, entry_id)
+            await pipe.execute()
+        # otherwise it stays pending, and the reclaimer gets it again after "retry_delay"
+
+    async def _worker(self, consumer: str):
+        r = await self._redis()
+        while self._running:
+            try:
+                response = await r.xreadgroup(self.GROUP, consumer, {self.STREAM: '>'},
+                                              count=self.batch_size, block=self.block_ms)
+                for _stream, entries in response or []:
+                    for entry_id, fields in entries:
+                        await self._handle(entry_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.exception(f'Outbox worker {consumer} error: {e!r}')
+                await asyncio.sleep(1.0)
+
+    async def _move_to_dlq(self, entry_id: str, attempts: int):
+        r = await self._redis()
+        entries = await r.xrange(self.STREAM, entry_id, entry_id)
+        pipe = r.pipeline(transaction=False)
+        if entries:
+            fields = dict(entries[0][1])
+            fields.update(attempts=attempts, failed_ts=now_ts(), original_id=entry_id)
+            pipe.xadd(self.DLQ, fields, maxlen=self.dlq_max_len)
+        pipe.xack(self.STREAM, self.GROUP, entry_id)
+        pipe.xdel(self.STREAM, entry_id)
+        await pipe.execute()
+        self.dead += 1
+        self.logger.error(f'Outbox entry {entry_id} moved to the dead-letter queue after {attempts} attempts.')
+
+    async def reclaim_once(self, count=100) -> int:
+        """ Retries the entries that have been pending longer than "retry_delay" (failed or orphaned) """
+        r = await self._redis()
+        consumer = f'{self.consumer_name}-reclaimer'
+        min_idle_ms = int(self.retry_delay * 1000)
+        pending = await r.xpending_range(self.STREAM, self.GROUP, '-', '+', count)
+        handled = 0
+        for item in pending:
+            if item['time_since_delivered'] < min_idle_ms:
+                continue
+            entry_id = item['message_id']
+            if item['times_delivered'] >= self.max_attempts:
+                await self._move_to_dlq(entry_id, item['times_delivered'])
+                continue
+            # XCLAIM fails silently if someone else has claimed it meanwhile
+            for claimed_id, fields in await r.xclaim(self.STREAM, self.GROUP, consumer, min_idle_ms, [entry_id]):
+                if fields:
+                    self.retried += 1
+                    await self._handle(claimed_id, fields)
+                    handled += 1
+                else:
+                    # trimmed by MAXLEN; nothing to deliver
+                    await r.xack(self.STREAM, self.GROUP, claimed_id)
+        return handled
+
+    async def _reclaimer(self):
+        while self._running:
+            await asyncio.sleep(max(1.0, self.retry_delay / 2))
+            try:
+                await self.reclaim_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.exception(f'Outbox reclaimer error: {e!r}')
+
+    async def run(self):
+        if self._running:
+            self.logger.warning('Outbox is already running!')
+            return
+        await self._ensure_group()
+        self._running = True
+        self._tasks = [
+            asyncio.create_task(self._worker(f'{self.consumer_name}-{i}')) for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._reclaimer()))
+        self.logger.info(f'Outbox started: {self.workers} workers.')
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def run_in_background(self):
+        return asyncio.create_task(self.run())
+
+    async def stop(self):
+        self._running = False
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---- metrics ----
+
+    async def stats(self) -> dict:
+        r = await self._redis()
+        depth, dlq = await asyncio.gather(r.xlen(self.STREAM), r.xlen(self.DLQ))
+        try:
+            pending = (await r.xpending(self.STREAM, self.GROUP))['pending']
+        except ResponseError:
+            pending = 0  # no group yet
+        return {
+            'depth': depth,
+            'pending': pending,
+            'dlq': dlq,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'retried': self.retried,
+            'dead': self.dead,
+        }
+
+
+async def send_personal_message(deps: DepContainer, channel: ChannelDescriptor, message: BoardMessage, **kwargs):
+    outbox: Optional[OutboundQueue] = deps.outbox
+    if outbox:
+        await outbox.enqueue(channel, message, **kwargs)
+    else:
+        asyncio.create_task(deps.broadcaster.safe_send_message_rate(channel, message, **kwargs))
@@ -1,5 +1,4 @@
 import abc
-import asyncio
 from abc import ABC
 from collections import defaultdict
 
@@ -8,6 +7,7 @@ from services.lib.depcont import DepContainer
 from services.lib.settings_manager import SettingsManager
 from services.lib.utils import WithLogger, grouper
 from services.notify.channel import ChannelDescriptor, BoardMessage
+from services.notify.outbox import send_personal_message
 from services.notify.personal.helpers import GeneralSettings
 
 
@@ -23,12 +23,12 @@ class BasePersonalNotifier(INotified, WithLogger, ABC):
 
         message = message.strip()
         if message:
-            task = self.deps.broadcaster.safe_send_message_rate(
+            await send_personal_message(
+                self.deps,
                 ChannelDescriptor(platform, user),
                 BoardMessage(message),
                 disable_web_page_preview=True
             )
-            asyncio.create_task(task)
 
     async def group_and_send_messages(self, addresses, events, glue='\n\n'):
         if not addresses:
@@ -25,8 +25,12 @@ class NodeOnlineTracker(BaseChangeTracker, WithLogger):
 
         cfg = deps.cfg.get('node_op_tools.types.online_service')
         timeout = cfg.as_float('tcp_timeout', 1.0)
-        self.pollster = TCPPollster(loop=deps.loop, test_timeout=timeout)
-        self._poll_group_size = cfg.as_int('group_size', 20)
+        self.pollster = TCPPollster(
+            loop=deps.loop, test_timeout=timeout,
+            max_concurrency=cfg.as_int('max_concurrency', 200),
+            cache_ttl=cfg.as_interval('cache_ttl', '0'),
+            jitter=cfg.as_interval('jitter', '0'),
+        )
 
     KEY_LAST_ONLINE_TS = 'last_online_ts'
     KEY_ONLINE_STATE = 'online'
@@ -58,9 +62,7 @@ class NodeOnlineTracker(BaseChangeTracker, WithLogger):
 
         t0 = time.perf_counter()
         # Structure: dict{str(IP): dict{int(port): bool(is_available)} }
-        results = await self.pollster.test_connectivity_multiple(ip_to_node.keys(),
-                                                                 port_to_service.keys(),
-                                                                 group_size=self._poll_group_size)
+        results = await self.pollster.test_connectivity_multiple(ip_to_node.keys(), port_to_service.keys())
         time_elapsed = time.perf_counter() - t0
 
         stats = self.pollster.count_stats(results)
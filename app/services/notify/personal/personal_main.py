@@ -13,6 +13,7 @@ from services.models.node_info import NodeSetChanges, NodeEvent, NodeEventType
 from services.models.node_watchers import NodeWatcherStorage
 from services.notify.broadcast import ChannelDescriptor
 from services.notify.channel import BoardMessage
+from services.notify.outbox import send_personal_message
 from services.notify.personal.bond import BondTracker
 from services.notify.personal.chain_height import ChainHeightTracker
 from services.notify.personal.churning import NodeChurnTracker
@@ -197,11 +198,11 @@ class NodeChangePersonalNotifier(INotified, WithLogger):
                     text = '\n\n'.join(m for m in messages if m)
                     text = text.strip()
                     if text:
-                        task = self.deps.broadcaster.safe_send_message_rate(
+                        await send_personal_message(
+                            self.deps,
                             ChannelDescriptor(platform, user),
                             BoardMessage(text)
                         )
-                        asyncio.create_task(task)
 
     @staticmethod
     async def _filter_events(event_list: List[NodeEvent], user_id, settings: dict) -> List[NodeEvent]:
@@ -26,7 +26,8 @@ class PersonalPriceDivergenceNotifier(INotified, WithLogger):
         their_settings = await self.deps.settings_manager.get_settings_multi(users)
 
         for user in users:
-            settings = their_settings.get(user, {})
+            # a copy, because it is going to be modified
+            settings = dict(their_settings.get(user, {}))
 
             if bool(settings.get(GeneralSettings.INACTIVE, False)):
                 continue  # paused
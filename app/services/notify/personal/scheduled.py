@@ -1,8 +1,9 @@
-import asyncio
+import random
 
+from aionode.cache import SingleFlightCache
 from services.dialog.picture.lp_picture import generate_yield_picture
 from services.jobs.fetch.runeyield import get_rune_yield_connector
-from services.lib.date_utils import today_str, MONTH
+from services.lib.date_utils import today_str, MONTH, now_ts
 from services.lib.db_one2one import OneToOne
 from services.lib.delegates import INotified
 from services.lib.depcont import DepContainer
@@ -19,6 +20,14 @@ class PersonalPeriodicNotificationService(WithLogger, INotified):
         self.deps = deps
         self._unsub_db = OneToOne(deps.db, 'Unsubscribe')
 
+        cfg = deps.cfg
+        # subscriptions get a random phase within this window instead of all coming due at once;
+        # new ones when they are made, the older ones once by "spread_existing_subscriptions"
+        self.jitter = cfg.as_interval('personal.scheduler.jitter', '2m')
+        # subscriptions that follow the same address and pool share one report within this time bucket
+        self.report_ttl = cfg.as_interval('personal.scheduler.report_cache_ttl', '10m')
+        self._reports = SingleFlightCache(max_size=cfg.as_int('personal.scheduler.report_cache_size', 1000))
+
     @staticmethod
     def key(user_id, address, pool):
         address = str(address)[:120]
@@ -46,10 +55,32 @@ class PersonalPeriodicNotificationService(WithLogger, INotified):
         assert isinstance(address, str) and address, 'address must be a non-empty string'
 
         key = self.key(user_id, address, pool)
-        await self.deps.scheduler.schedule(key, period=period)
+        # a random phase within the jitter window, so the subscriptions made at the same time do not come due together
+        first_ts = now_ts() + period + (random.uniform(0, min(self.jitter, period)) if self.jitter > 0 else 0.0)
+        await self.deps.scheduler.schedule(key, first_ts, period=period)
 
         await self._create_unsub_id(user_id, address, pool)
 
+    @property
+    def key_spread_done(self):
+        return f'Scheduler:{self.deps.scheduler.name}:Spread'
+
+    async def spread_existing_subscriptions(self):
+        """
+        Once per database: the subscriptions made before the jitter was introduced keep their old phase
+        and come due together, so they are shifted randomly within the jitter window.
+        """
+        if self.jitter <= 0:
+            return
+        try:
+            r = await self.deps.db.get_redis()
+            if not await r.set(self.key_spread_done, int(now_ts()), nx=True):
+                return  # done before (or by another instance)
+            moved = await self.deps.scheduler.spread_periodic(self.jitter, self.key('*', '*', '*'))
+            self.logger.info(f'Spread {moved} existing subscriptions within {self.jitter} sec.')
+        except Exception as e:
+            self.logger.exception(f'Failed to spread the existing subscriptions: {e!r}')
+
     async def unsubscribe(self, user_id, address, pool):
         key = self.key(user_id, address, pool)
         await self.deps.scheduler.cancel(key)
@@ -75,7 +106,8 @@ class PersonalPeriodicNotificationService(WithLogger, INotified):
 
     async def on_data(self, sender: Scheduler, ident: str):
         user_id, address, pool = self.key_parts(ident)
-        asyncio.create_task(self._deliver_report_safe(user_id, address, pool))
+        # awaited: the scheduler's worker pool and handler timeout cover the report generation
+        await self._deliver_report_safe(user_id, address, pool)
 
     async def _deliver_report_safe(self, user, address, pool):
         try:
@@ -87,10 +119,7 @@ class PersonalPeriodicNotificationService(WithLogger, INotified):
     async def _deliver_report(self, user, address, pool):
         self.logger.info(f'Generating report for {user}/{address}/{pool}...')
 
-        # Generate report
-        rune_yield = get_rune_yield_connector(self.deps)
-        rune_yield.add_il_protection_to_final_figures = True
-        lp_report = await rune_yield.generate_yield_report_single_pool(address, pool)
+        lp_report = await self.get_shared_report(address, pool)
 
         # Convert it to a picture
         value_hidden = False
@@ -113,6 +142,29 @@ class PersonalPeriodicNotificationService(WithLogger, INotified):
         )
         self.logger.info(f'Report for {user}/{address}/{pool} sent successfully.')
 
+    async def _generate_report(self, address, pool):
+        rune_yield = get_rune_yield_connector(self.deps)
+        rune_yield.add_il_protection_to_final_figures = True
+        return await rune_yield.generate_yield_report_single_pool(address, pool)
+
+    async def get_shared_report(self, address, pool):
+        """
+        The report is the same for everyone who follows this address and pool: it is computed once per bucket,
+        the concurrent requests wait for the same computation. It must not be modified by the callers.
+        """
+        if self.report_ttl <= 0:
+            return await self._generate_report(address, pool)
+        bucket = int(now_ts() // self.report_ttl)
+        return await self._reports.get_or_fetch(
+            (address, pool, bucket),
+            lambda: self._generate_report(address, pool),
+            ttl=self.report_ttl, label='lp_report',
+        )
+
+    @property
+    def report_cache_stats(self):
+        return self._reports.stats.get('lp_report', {})
+
     async def _create_unsub_id(self, user, address, pool):
         unique_id = generate_random_code(5)
         await self._unsub_db.put(unique_id, self.key(user, address, pool))
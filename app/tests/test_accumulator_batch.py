@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from services.lib.accumulator import Accumulator
+from services.lib.db import DB
+
+
+@pytest.fixture
+async def acc():
+    db = DB(asyncio.get_event_loop())
+    await db.get_redis()
+    a = Accumulator('TestBatch', db, tolerance=10)
+    await a.clear()
+    yield a
+    await a.clear()
+
+
+@pytest.mark.asyncio
+async def test_add_many_and_chunked_range(acc: Accumulator):
+    for i in range(25):
+        await acc.add_many(1000 + i * 10, {'swap': i, 'add': 1.0}, {'price': 2.0 + i})
+    await acc.add_many(1000, {'swap': 100.0})
+
+    points = await acc.get_range(995, 1245, chunk=7)
+    assert len(points) == 25
+    assert points[1245] == {'swap': 24.0, 'add': 1.0, 'price': 26.0}
+    assert points[1005] == {'swap': 100.0, 'add': 1.0, 'price': 2.0}
+
+
+@pytest.mark.asyncio
+async def test_reduce_range(acc: Accumulator):
+    for i in range(25):
+        await acc.add_many(1000 + i * 10, {'swap': i, 'add': 0.5}, {'price': 2.0 + i})
+
+    stats = await acc.reduce_range(995, 1245, chunk=4)
+    assert stats['swap'] == {'sum': sum(range(25)), 'min': 0.0, 'max': 24.0, 'n': 25}
+    assert stats['add']['sum'] == 12.5
+    assert stats['price']['max'] == 26.0
+
+    only_swap = await acc.reduce_range(995, 1045, fields=['swap'])
+    assert list(only_swap.keys()) == ['swap'] and only_swap['swap']['sum'] == 0 + 1 + 2 + 3 + 4
+
+
+@pytest.mark.asyncio
+async def test_legacy_buckets_are_indexed_after_a_write(acc: Accumulator):
+    r = acc.db.redis
+    await r.delete(acc.key_index_built)
+    acc._index_ready = False
+    # written by the old code, before the index existed
+    await r.hset(acc.key(500), 'swap', 1.0)
+    await r.hset(acc.key(510), 'swap', 2.0)
+
+    await acc.add(1000, swap=3.0)  # the first write after the deploy creates the index
+
+    assert await acc.clear(before=1000) == 2
+    assert not await r.exists(acc.key(500), acc.key(510))
+    assert await acc.all_my_keys() == [acc.key(1000)]
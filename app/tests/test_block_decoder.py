@@ -0,0 +1,76 @@
+import base64
+
+import betterproto.lib.google.protobuf as pb
+import pytest
+
+from proto.access import thor_decode_event
+from proto.common import Coin, Asset
+from proto.cosmos.tx.v1beta1 import Tx, TxBody
+from proto.types import MsgDeposit
+from services.jobs.scanner.block_decoder import BlockDecoderPool
+from services.jobs.scanner.block_loader import BlockResult
+
+
+def make_raw_tx(i):
+    deposit = MsgDeposit(
+        coins=[Coin(asset=Asset(chain='MAYA', symbol='CACAO', ticker='CACAO'), amount=str(1000 + i))],
+        memo=f'=:BTC.BTC:bc1qaddr{i}',
+        signer=f'signer{i}'.encode(),
+    )
+    tx = Tx(body=TxBody(messages=[pb.Any(type_url='/types.MsgDeposit', value=bytes(deposit))]))
+    return base64.b64encode(bytes(tx)).decode()
+
+
+def make_event(i):
+    def enc(s):
+        return base64.b64encode(s.encode()).decode()
+
+    return {
+        'type': 'swap',
+        'attributes': [
+            {'key': enc('id'), 'value': enc(f'TX{i}')},
+            {'key': enc('coin'), 'value': enc(f'{i * 100} BTC.BTC')},
+        ]
+    }
+
+
+@pytest.fixture(scope='module')
+def decoder():
+    pool = BlockDecoderPool(max_workers=2, batch_size=7)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_pooled_txs_equal_inline(decoder: BlockDecoderPool):
+    raw_txs = [make_raw_tx(i) for i in range(30)] + ['not a tx']
+    result = {'result': {'block': {'data': {'txs': raw_txs}}}}
+
+    inline = BlockResult.load_txs(result, 100)
+    pooled = await decoder.load_txs(result, 100)
+
+    assert len(pooled) == len(inline) == 31
+    assert pooled[-1] is None and inline[-1] is None
+    for a, b in zip(inline[:-1], pooled[:-1]):
+        assert a.hash == b.hash
+        assert a.memo == b.memo
+        assert isinstance(b.first_message, MsgDeposit)
+        assert bytes(a.tx) == bytes(b.tx)
+        assert b.first_message.coins[0].amount == a.first_message.coins[0].amount
+
+
+@pytest.mark.asyncio
+async def test_pooled_events_equal_inline(decoder: BlockDecoderPool):
+    events = [make_event(i) for i in range(20)]
+    pooled = await decoder.decode_events(events, 55)
+    assert pooled == [thor_decode_event(ev, 55) for ev in events]
+    assert pooled[3].attributes['amount'] == 300
+    assert pooled[3].attributes['asset'] == 'BTC.BTC'
+
+
+@pytest.mark.asyncio
+async def test_small_block_inline_and_error(decoder: BlockDecoderPool):
+    assert await decoder.load_txs({'error': {'code': 1, 'message': 'oops'}}, 1) is None
+
+    small = await decoder.decode_txs([make_raw_tx(1)])
+    assert len(small) == 1 and small[0].hash
@@ -0,0 +1,46 @@
+import asyncio
+import random
+
+import pytest
+
+from services.jobs.scanner.native_scan import BlockPrefetcher
+
+
+@pytest.mark.asyncio
+async def test_prefetch_in_order_and_concurrent():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def loader(height):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(random.uniform(0.001, 0.02))
+        in_flight -= 1
+        return height
+
+    prefetcher = BlockPrefetcher(loader, window=5)
+    results = [await prefetcher.get(h, top_height=120) for h in range(100, 121)]
+    assert results == list(range(100, 121))
+    assert 1 < max_in_flight <= 5
+    assert prefetcher.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_prefetch_bounded_by_top_and_jump():
+    requested = []
+
+    async def loader(height):
+        requested.append(height)
+        return height
+
+    prefetcher = BlockPrefetcher(loader, window=10)
+    assert await prefetcher.get(10, top_height=12) == 10
+    assert prefetcher.in_flight == 2  # 11 and 12, nothing above the top height
+
+    # a jump forward drops the stale heights
+    assert await prefetcher.get(50, top_height=0) == 50
+    assert prefetcher.in_flight == 0
+    assert max(requested) == 50
+
+    prefetcher.cancel_all()
@@ -0,0 +1,48 @@
+import pytest
+
+from services.jobs.scanner.block_store import SqliteBlockStore, BlockStore
+
+
+@pytest.fixture
+async def store(tmp_path):
+    s = SqliteBlockStore(str(tmp_path / 'blocks.sqlite3'))
+    yield s
+    await s.close()
+
+
+@pytest.mark.asyncio
+async def test_put_get(store: SqliteBlockStore):
+    assert await store.get(BlockStore.KIND_RESULTS, 100) is None
+
+    block = {'result': {'height': '100', 'txs_results': [{'code': 0, 'log': '[]'}]}}
+    await store.put(BlockStore.KIND_RESULTS, 100, block)
+    await store.put(BlockStore.KIND_TXS, 100, {'result': {'block': {'data': {'txs': ['abc']}}}})
+
+    assert await store.get(BlockStore.KIND_RESULTS, 100) == block
+    assert (await store.get(BlockStore.KIND_TXS, 100))['result']['block']['data']['txs'] == ['abc']
+    assert await store.get(BlockStore.KIND_RESULTS, 101) is None
+
+
+@pytest.mark.asyncio
+async def test_iterate_in_order(store: SqliteBlockStore):
+    await store.put_many(BlockStore.KIND_TXS, [(h, {'h': h}) for h in (5, 3, 9, 1, 7)])
+    items = [item async for item in store.iterate(BlockStore.KIND_TXS, page_size=2)]
+    assert items == [(h, {'h': h}) for h in (1, 3, 5, 7, 9)]
+    assert await store.height_range(BlockStore.KIND_TXS) == (1, 9, 5)
+
+
+@pytest.mark.asyncio
+async def test_retention(tmp_path):
+    store = SqliteBlockStore(str(tmp_path / 'small.sqlite3'), max_size_mb=0.5)
+    store.RETENTION_BATCH = 50
+
+    # random-ish payload that does not compress well
+    payload = {'data': [hash((i, 'x')) for i in range(500)]}
+    # retention is applied automatically after the batch write
+    await store.put_many(BlockStore.KIND_RESULTS, [(h, payload) for h in range(1, 401)])
+
+    min_height, max_height, count = await store.height_range(BlockStore.KIND_RESULTS)
+    assert max_height == 400
+    assert min_height > 1
+    assert await store.used_size() <= store.max_size_bytes
+    await store.close()
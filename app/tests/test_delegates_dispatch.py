@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from services.lib.delegates import WithDelegates, INotified, DispatchOptions
+
+
+class Recorder(INotified):
+    def __init__(self, name, log, delay=0.0):
+        self.name = name
+        self.log = log
+        self.delay = delay
+
+    async def on_data(self, sender, data):
+        await asyncio.sleep(self.delay)
+        self.log.append((self.name, data))
+
+    def __str__(self):
+        return self.name
+
+
+@pytest.mark.asyncio
+async def test_slow_delegate_does_not_block_others():
+    log = []
+    source = WithDelegates()
+    slow = Recorder('slow', log, delay=0.2)
+    fast = Recorder('fast', log)
+    source.add_subscriber(slow, DispatchOptions(queue_size=10))
+    source.add_subscriber(fast)
+
+    t0 = time.monotonic()
+    for i in range(1, 4):
+        await source.pass_data_to_listeners(i)
+    assert time.monotonic() - t0 < 0.1
+    assert log == [('fast', 1), ('fast', 2), ('fast', 3)]
+
+    await source.join_listeners()
+    assert [d for name, d in log if name == 'slow'] == [1, 2, 3]
+    stats = source.dispatch_stats['slow']
+    assert stats['delivered'] == 3 and stats['queue'] == 0
+    assert stats['latency'][99] >= 0.2
+    await source.stop_listeners()
+
+
+@pytest.mark.asyncio
+async def test_overflow_and_timeout():
+    log = []
+    source = WithDelegates()
+    source.add_subscriber(Recorder('lossy', log, delay=0.05), DispatchOptions(queue_size=1))
+    source.add_subscriber(Recorder('stuck', log, delay=10.0), DispatchOptions(timeout=0.05))
+
+    for i in range(1, 6):
+        await source.pass_data_to_listeners(i)
+    await source.join_listeners()
+
+    # the sender does not yield to the worker between the calls, so only the newest item survives
+    assert [d for name, d in log if name == 'lossy'] == [5]
+    assert source.dispatch_stats['lossy']['dropped'] == 4
+    assert source.dispatch_stats['stuck']['timeouts'] == 5
+    await source.stop_listeners()
+
+
+@pytest.mark.asyncio
+async def test_block_overflow_and_sequential_group():
+    log = []
+    source = WithDelegates()
+    group = DispatchOptions(queue_size=1, overflow=DispatchOptions.BLOCK, group='ordered')
+    source.add_subscriber(Recorder('first', log, delay=0.02), group)
+    source.add_subscriber(Recorder('second', log), group)
+
+    for i in range(1, 4):
+        await source.pass_data_to_listeners(i)
+    await source.join_listeners()
+
+    # nothing is lost, and within the group "first" always handles an item before "second"
+    assert log == [('first', 1), ('second', 1), ('first', 2), ('second', 2), ('first', 3), ('second', 3)]
+    assert source.dispatch_stats['second']['dropped'] == 0
+    await source.stop_listeners()
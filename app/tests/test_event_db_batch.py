@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from services.jobs.scanner.event_db import EventDatabase
+from services.jobs.scanner.swap_props import SwapProps
+from services.lib.db import DB
+
+TX_IDS = [f'TEST_BATCH_TX_{i}' for i in range(5)]
+
+
+@pytest.fixture
+async def event_db():
+    db = DB(asyncio.get_event_loop())
+    ev_db = EventDatabase(db, expiration_sec=60)
+    r = await db.get_redis()
+    await r.delete(*[ev_db.key_to_tx(tx_id) for tx_id in TX_IDS])
+    yield ev_db
+    await r.delete(*[ev_db.key_to_tx(tx_id) for tx_id in TX_IDS])
+
+
+@pytest.mark.asyncio
+async def test_write_many_read_many(event_db: EventDatabase):
+    await event_db.write_many({
+        tx_id: {'id': tx_id, 'status': SwapProps.STATUS_OBSERVED_IN, 'in_amount': i * 10}
+        for i, tx_id in enumerate(TX_IDS[:3])
+    })
+
+    results = await event_db.read_many_tx_status(TX_IDS)
+    assert set(results.keys()) == set(TX_IDS)
+    for i, tx_id in enumerate(TX_IDS[:3]):
+        assert results[tx_id].attrs == (await event_db.read_tx_status(tx_id)).attrs
+        assert results[tx_id].attrs['in_amount'] == str(i * 10)
+    assert results[TX_IDS[3]] is None
+
+    r = await event_db.db.get_redis()
+    assert 0 < await r.ttl(event_db.key_to_tx(TX_IDS[0])) <= 60
+
+
+@pytest.mark.asyncio
+async def test_batch_overlay_matches_db(event_db: EventDatabase):
+    await event_db.write_tx_status_kw(TX_IDS[0], status=SwapProps.STATUS_OBSERVED_IN, memo='=:BTC.BTC:addr')
+
+    batch = await event_db.begin_batch(TX_IDS)
+    batch.write_tx_status_kw(TX_IDS[0], in_amount=123, is_streaming=True, volume_usd=12.5)
+    batch.write_tx_status_kw(TX_IDS[1], status=SwapProps.STATUS_GIVEN_AWAY, from_address=b'maya1xxx')
+    batch.write_tx_status(TX_IDS[1], {'extra': {'a': 1}})
+
+    # nothing is written until flush
+    assert await event_db.read_tx_status(TX_IDS[1]) is None
+    assert batch.pending_count == 2
+
+    overlay = {tx_id: batch.read_tx_status(tx_id) for tx_id in TX_IDS[:2]}
+    await batch.flush()
+    assert batch.pending_count == 0
+
+    for tx_id in TX_IDS[:2]:
+        assert overlay[tx_id].attrs == (await event_db.read_tx_status(tx_id)).attrs
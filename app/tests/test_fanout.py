@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+
+from services.notify.channel import ChannelDescriptor, Messengers
+from services.notify.fanout import FanoutEngine, PlatformLimits, TokenBucket
+
+
+def make_engine(rate=100.0, per_chat_rate=0.0, workers=4):
+    limits = PlatformLimits(rate=rate, burst=1.0, per_chat_rate=per_chat_rate, per_chat_burst=1.0, workers=workers)
+    return FanoutEngine({Messengers.TELEGRAM: limits, Messengers.DISCORD: limits})
+
+
+def channel(chat_id, platform=Messengers.TELEGRAM):
+    return ChannelDescriptor(platform, str(chat_id))
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_rate():
+    bucket = TokenBucket(rate=50.0, burst=5)
+    t0 = time.monotonic()
+    for _ in range(30):
+        await bucket.acquire()
+    # 5 at once, then 25 at 50/sec
+    assert 0.4 < time.monotonic() - t0 < 0.8
+
+
+@pytest.mark.asyncio
+async def test_results_order_and_concurrency():
+    engine = make_engine(rate=0.0, workers=4)
+    active, max_active = 0, 0
+
+    async def send(i):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        if i == 3:
+            raise ValueError('boom')
+        return i
+
+    jobs = [(channel(i), lambda i=i: send(i)) for i in range(20)]
+    results = await engine.deliver(jobs)
+    assert results[:3] == [0, 1, 2] and results[4:] == list(range(4, 20))
+    assert isinstance(results[3], ValueError)
+    assert 1 < max_active <= 4
+
+    stats = engine.stats[Messengers.TELEGRAM]
+    assert stats['sent'] == 19 and stats['failed'] == 1
+    assert set(stats['latency'].keys()) == {50, 90, 99}
+    await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_same_chat_keeps_order():
+    engine = make_engine(rate=0.0, workers=8)
+    delivered = []
+
+    async def send(i):
+        await asyncio.sleep(0.01 * (5 - i % 5))
+        delivered.append(i)
+
+    await engine.deliver([(channel('same-chat'), lambda i=i: send(i)) for i in range(10)])
+    assert delivered == list(range(10))
+    await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_retry_after_blocks_only_its_platform():
+    engine = make_engine(rate=0.0)
+    engine.retry_after_handler(Messengers.TELEGRAM)(0.3)
+
+    async def send():
+        return time.monotonic()
+
+    t0 = time.monotonic()
+    tg, discord = await engine.deliver([
+        (channel(1), send),
+        (channel(1, Messengers.DISCORD), send),
+    ])
+    assert tg - t0 >= 0.29
+    assert discord - t0 < 0.1
+    assert engine.stats[Messengers.TELEGRAM]['retry_after'] == 1
+    await engine.stop()
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from services.lib.accumulator import Accumulator
+from services.lib.db import DB
+from services.lib.db_many2many import ManyToManySet
+from services.lib.scheduler import Scheduler
+
+
+@pytest.fixture
+async def db():
+    db = DB(asyncio.get_event_loop())
+    await db.get_redis()
+    yield db
+
+
+@pytest.mark.asyncio
+async def test_many2many_index(db):
+    mm = ManyToManySet(db, 'TestIdxUser', 'TestIdxNode')
+    await mm.clear()
+
+    await mm.associate('A', 'N1')
+    await mm.associate_many(['B'], ['N1', 'N2'])
+    assert await mm.all_lefts() == {'A', 'B'}
+    assert await mm.all_rights() == {'N1', 'N2'}
+
+    await mm.remove_one_item('A', 'N1')
+    assert await mm.all_lefts() == {'B'}
+
+    await mm.remove_all_rights('B')
+    assert await mm.all_lefts() == set()
+    assert await mm.all_rights() == set()
+    await mm.clear()
+
+
+@pytest.mark.asyncio
+async def test_many2many_legacy_data_is_indexed(db):
+    mm = ManyToManySet(db, 'TestIdxUser', 'TestIdxNode')
+    await mm.clear()
+
+    # written by the old code: the sets exist, but the index does not
+    await db.redis.sadd(mm.left_key('Old'), 'N9')
+    await db.redis.sadd(mm.right_key('N9'), 'Old')
+    await db.redis.delete(mm.left_index.key_ready, mm.right_index.key_ready)
+
+    fresh = ManyToManySet(db, 'TestIdxUser', 'TestIdxNode')
+    assert await fresh.all_lefts() == {'Old'}
+    assert await fresh.all_rights() == {'N9'}
+    await mm.clear()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_cancel_periodic_by_pattern(db):
+    sched = Scheduler(db.redis, 'TestIdx')
+    await sched.cancel_all_periodic()
+    await sched.clear()
+
+    await sched.schedule('u1-addr-pool1', period=100)
+    await sched.schedule('u1-addr-pool2', period=100)
+    await sched.schedule('u2-addr-pool1', period=100)
+    assert len(await sched.all_periodic_events()) == 3
+
+    await sched.cancel_all_periodic('u1-*-*')
+    assert await sched.all_periodic_idents() == {'u2-addr-pool1'}
+    assert [ev[0] for ev in await sched.awaiting_events()] == ['u2-addr-pool1']
+
+    await sched.cancel('u2-addr-pool1')
+    assert await sched.all_periodic_events() == []
+
+
+@pytest.mark.asyncio
+async def test_accumulator_clear_before(db):
+    acc = Accumulator('TestIdx', db, tolerance=10)
+    await acc.clear()
+
+    for ts in (100, 110, 120, 130):
+        await acc.add(ts, volume=1.0)
+    assert len(await acc.all_my_keys()) == 4
+
+    assert await acc.clear(before=120) == 2
+    assert await acc.all_my_keys() == [acc.key(120), acc.key(130)]
+    assert await acc.get(125) == {'volume': 1.0}
+    await acc.clear()
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+import pytest
+
+from services.lib.loop_monitor import LoopMonitor
+
+
+def blocking_parse():
+    time.sleep(0.3)  # stands for a huge synchronous decode
+
+
+async def handle_big_blob():
+    await asyncio.sleep(0.05)
+    blocking_parse()
+
+
+@pytest.mark.asyncio
+async def test_stall_is_caught_with_stack_and_coroutine():
+    monitor = LoopMonitor(interval=0.02, slow_threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+        assert monitor.beats >= 2 and monitor.max_lag < 0.1 and not monitor.stalls
+
+        await asyncio.create_task(handle_big_blob(), name='big-blob')
+        await asyncio.sleep(0.05)  # let the heartbeat see the end of it
+    finally:
+        monitor.stop()
+
+    assert monitor.max_lag >= 0.2
+    assert len(monitor.stalls) == 1
+    stall = monitor.recent_stalls()[0]
+    assert stall.finished and stall.duration >= 0.2
+    assert stall.task == 'big-blob'
+    assert stall.coro == 'handle_big_blob'
+    assert any('blocking_parse' in line for line in stall.stack)
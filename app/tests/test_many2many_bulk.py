@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from services.lib.db import DB
+from services.models.node_watchers import UserWatchlist
+
+NODES = [f'node{i}' for i in range(10)]
+
+
+@pytest.fixture
+async def watchlist():
+    db = DB(asyncio.get_event_loop())
+    await db.get_redis()
+    w = UserWatchlist(db, 'TestBulkNode')
+    await w.many2many.clear()
+    yield w
+    await w.many2many.clear()
+
+
+@pytest.mark.asyncio
+async def test_bulk_read_matches_single_reads(watchlist: UserWatchlist):
+    await watchlist.add_user_to_node_list('u1', NODES)
+    await watchlist.add_user_to_node_list('u2', NODES[:3])
+    await watchlist.add_user_to_node_list('u3', ['', 'node1'])  # ignored as a whole
+
+    query = NODES + ['unknown', 'node0']
+    node_to_users = await watchlist.all_users_for_many_nodes(query)
+    assert set(node_to_users.keys()) == set(query)
+    for node in set(query):
+        assert node_to_users[node] == set(await watchlist.all_users_for_node(node))
+    assert node_to_users['node0'] == {'u1', 'u2'}
+    assert node_to_users['unknown'] == set()
+
+    assert await watchlist.many2many.all_rights_for_many_lefts(['u1', 'u2']) == set(NODES)
+    assert await watchlist.all_users_for_many_nodes([]) == {}
+
+
+@pytest.mark.asyncio
+async def test_bulk_remove(watchlist: UserWatchlist):
+    await watchlist.add_user_to_node_list('u1', NODES)
+    await watchlist.add_user_to_node_list('u2', NODES[:2])
+
+    await watchlist.remove_user_nodes('u1', NODES[:5] + [''])
+    assert await watchlist.all_nodes_for_user('u1') == set(NODES[5:])
+    assert await watchlist.all_users_for_node('node0') == {'u2'}
+
+    await watchlist.remove_user_nodes('u2', NODES[:2])
+    assert await watchlist.all_users() == {'u1'}
+    assert await watchlist.many2many.all_rights() == set(NODES[5:])
@@ -0,0 +1,65 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from services.lib.db import DB
+from services.lib.metrics import MetricsRegistry, MetricsServer, path_template, REGISTRY
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    errors = registry.counter('fetcher_errors', 'Errors', ['fetcher'])
+    depth = registry.gauge('queue_depth', 'Depth', ['platform'])
+    latency = registry.histogram('tick_seconds', 'Ticks', ['fetcher'], buckets=(0.1, 1.0))
+
+    errors.inc('PoolFetcher')
+    errors.inc('PoolFetcher', amount=2)
+    depth.set_function(lambda: 7, 'telegram')
+    latency.observe('Pool"Fetcher', value=0.05)
+    latency.observe('Pool"Fetcher', value=0.5)
+    latency.observe('Pool"Fetcher', value=5.0)
+
+    text = registry.render()
+    assert '# TYPE fetcher_errors_total counter' in text
+    assert 'fetcher_errors_total{fetcher="PoolFetcher"} 3.0' in text
+    assert 'queue_depth{platform="telegram"} 7.0' in text
+    assert 'tick_seconds_bucket{fetcher="Pool\\"Fetcher",le="0.1"} 1' in text
+    assert 'tick_seconds_bucket{fetcher="Pool\\"Fetcher",le="1.0"} 2' in text
+    assert 'tick_seconds_bucket{fetcher="Pool\\"Fetcher",le="+Inf"} 3' in text
+    assert 'tick_seconds_count{fetcher="Pool\\"Fetcher"} 3' in text
+    assert registry.counter('fetcher_errors', 'Errors', ['fetcher']) is errors
+
+
+def test_path_template():
+    assert path_template('/mayachain/nodes?height=123') == '/mayachain/nodes'
+    assert path_template('/v2/history/swaps/1700000000') == '/v2/history/swaps/{n}'
+    assert path_template('/mayachain/pool/ETH.USDT-0XDAC17F958D2EE523A2206206994597C13D831EC7') == \
+           '/mayachain/pool/{id}'
+    assert path_template('/mayachain/pool/BTC.BTC') == '/mayachain/pool/BTC.BTC'
+
+
+@pytest.mark.asyncio
+async def test_scrape_endpoint_with_redis_metrics():
+    db = DB(asyncio.get_event_loop())
+    r = await db.get_redis()
+    await r.set('Test:Metrics', 1)
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.get('Test:Metrics')
+        pipe.delete('Test:Metrics')
+        await pipe.execute()
+
+    server = MetricsServer(REGISTRY, port=0)
+    await server.start()
+    port = server._runner.addresses[0][1]
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{port}/metrics') as resp:
+                assert resp.status == 200
+                assert resp.headers['Content-Type'].startswith('text/plain')
+                text = await resp.text()
+    finally:
+        await server.stop()
+
+    assert 'redis_command_seconds_count{command="SET"}' in text
+    assert 'redis_command_seconds_count{command="PIPELINE"}' in text
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from services.lib.aimd import AIMDLimiter
+from services.lib.midgard.connector import MidgardConnector
+
+CAPACITY = 4  # the stand-in answers 503 when more requests than this are in flight
+
+
+class MidgardStandIn:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected = 0
+        self.served = 0
+
+    async def handle(self, request: web.Request):
+        if self.in_flight >= CAPACITY:
+            self.rejected += 1
+            return web.Response(status=503, headers={'Retry-After': '0.05'})
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.02)
+            self.served += 1
+            return web.json_response({'page': int(request.query['offset'])})
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+async def midgard():
+    stand_in = MidgardStandIn()
+    app = web.Application()
+    app.router.add_get('/v2/actions', stand_in.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    session = aiohttp.ClientSession()
+    limiter = AIMDLimiter(initial=1, max_limit=16, latency_target=1.0, pressure_cooldown=0.05)
+    connector = MidgardConnector(session, None, retry_number=10, public_url=f'http://127.0.0.1:{port}',
+                                 limiter=limiter)
+    yield connector, stand_in
+    await session.close()
+    await runner.cleanup()
+
+
+def test_aimd_limits():
+    limiter = AIMDLimiter(initial=2, max_limit=4, pressure_cooldown=0.0, backoff=0.0)
+    for _ in range(20):
+        limiter.on_success(0.1)
+    assert limiter.limit == 4
+    limiter.on_pressure()
+    assert limiter.limit == 2
+    limiter.on_pressure(retry_after=1.0)
+    assert limiter.limit == 1 and limiter.paused_until > 0
+    limiter.on_success(10.0)  # too slow to raise
+    assert limiter.limit == 1
+
+
+def test_retry_after_is_capped():
+    limiter = AIMDLimiter(max_pause=5.0)
+    t0 = time.monotonic()
+    limiter.on_pressure(retry_after=3600)
+    assert limiter.paused_until - t0 < 5.1
+
+
+@pytest.mark.asyncio
+async def test_adaptive_concurrency_against_503s(midgard):
+    connector, stand_in = midgard
+    paths = [f'v2/actions?offset={page * 50}&limit=50' for page in range(60)]
+
+    # all at once, as TxFetcher does: the limiter decides how many are in flight
+    results = await asyncio.gather(*(connector.request(path) for path in paths))
+
+    # every page arrived, in order, despite the 503s
+    assert results == [{'page': page * 50} for page in range(60)]
+    stats = connector.limiter.stats
+    assert stats['peak_limit'] >= 3  # it did speed up beyond the sequential mode
+    assert stand_in.rejected > 0 and stats['pressure_events'] == stand_in.rejected  # and was pushed back
+    assert stand_in.max_in_flight <= CAPACITY
+    assert connector.limiter.in_flight == 0
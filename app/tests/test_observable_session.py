@@ -0,0 +1,74 @@
+import aiohttp
+import pytest
+from aiohttp import web
+
+from services.lib.http_ses import ObservableSession, ObservableResponse
+
+PAYLOAD = {'height': '123', 'txs_results': [{'code': 0, 'log': 'ok' * 50}] * 100}
+
+
+@pytest.fixture
+async def server():
+    async def with_length(_request):
+        return web.json_response(PAYLOAD)
+
+    async def chunked(request):
+        resp = web.StreamResponse(headers={'Content-Type': 'application/json'})
+        resp.enable_chunked_encoding()
+        await resp.prepare(request)
+        body = web.json_response(PAYLOAD).body
+        for i in range(0, len(body), 1000):
+            await resp.write(body[i:i + 1000])
+        await resp.write_eof()
+        return resp
+
+    async def html(_request):
+        return web.Response(status=502, text='<html>\n<h1>Bad gateway</h1></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/json', with_length)
+    app.router.add_get('/chunked', chunked)
+    app.router.add_get('/html', html)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f'http://127.0.0.1:{port}'
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_json_is_parsed_once_from_bytes(server):
+    session = ObservableSession()
+    try:
+        async with session.get(f'{server}/json') as resp:
+            assert isinstance(resp, ObservableResponse)
+            assert await resp.json() == PAYLOAD
+            assert await resp.json() == PAYLOAD  # cached bytes
+            size = int(resp.headers['Content-Length'])
+
+        async with session.get(f'{server}/chunked') as resp:
+            assert resp.content_length is None
+            assert await resp.json() == PAYLOAD
+
+        # Content-Length for the first one, the bytes read for the chunked one
+        assert session.total_bytes == 2 * size
+        assert session.total_calls == 2 and session.count_non_ok_codes == 0
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_text_answers_are_sampled(server):
+    session = ObservableSession()
+    try:
+        async with session.get(f'{server}/html') as resp:
+            with pytest.raises(aiohttp.ContentTypeError):
+                await resp.json()
+        record = session.debug_top_calls(1)[0]
+        assert record.text_answer_count == 1
+        assert record.last_text_answer == ' html  h1 Bad gateway /h1  /html '
+        assert session.count_non_ok_codes == 1
+    finally:
+        await session.close()
@@ -0,0 +1,104 @@
+import asyncio
+
+import PIL.Image
+import pytest
+
+from services.lib.config import Config
+from services.lib.db import DB
+from services.lib.depcont import DepContainer
+from services.notify.channel import ChannelDescriptor, BoardMessage, Messengers, MessageType
+from services.notify.outbox import OutboundQueue
+
+
+class SandboxOutbox(OutboundQueue):
+    STREAM = 'Test:Outbox:Stream'
+    DLQ = 'Test:Outbox:DeadLetters'
+
+
+class FakeBroadcaster:
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.calls = []
+
+    async def safe_send_message_rate(self, channel, message, **kwargs):
+        self.calls.append((channel, message.text, kwargs))
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            return 'good', False
+        return 'good', True
+
+
+@pytest.fixture
+async def outbox():
+    d = DepContainer()
+    d.cfg = Config(data={'personal': {'outbox': {'workers': 2, 'retry_delay': 0.1, 'max_attempts': 3}}})
+    d.db = DB(asyncio.get_event_loop())
+    r = await d.db.get_redis()
+    await r.delete(SandboxOutbox.STREAM, SandboxOutbox.DLQ)
+    d.broadcaster = FakeBroadcaster()
+    q = SandboxOutbox(d)
+    q.block_ms = 50
+    yield q
+    await q.stop()
+    await r.delete(SandboxOutbox.STREAM, SandboxOutbox.DLQ)
+
+
+def test_pack_unpack_photo():
+    ch = ChannelDescriptor(Messengers.TELEGRAM, '123', 'rus')
+    msg = BoardMessage.make_photo(PIL.Image.new('RGB', (4, 4), 'red'), 'caption')
+    channel, message, kwargs = OutboundQueue.unpack(OutboundQueue.pack(ch, msg, disable_notification=True))
+    assert channel == ch
+    assert message.message_type == MessageType.PHOTO and message.text == 'caption'
+    assert message.photo.size == (4, 4)
+    assert kwargs == {'disable_notification': True}
+
+
+@pytest.mark.asyncio
+async def test_deliver_all(outbox: SandboxOutbox):
+    for i in range(10):
+        await outbox.enqueue(ChannelDescriptor(Messengers.TELEGRAM, str(i)), BoardMessage(f'hi {i}'))
+    assert (await outbox.stats())['depth'] == 10
+
+    outbox.run_in_background()
+    for _ in range(50):
+        await asyncio.sleep(0.05)
+        if outbox.sent == 10:
+            break
+
+    stats = await outbox.stats()
+    assert stats['sent'] == 10
+    assert stats['depth'] == 0 and stats['pending'] == 0
+    assert sorted(text for _, text, _ in outbox.deps.broadcaster.calls) == sorted(f'hi {i}' for i in range(10))
+
+
+@pytest.mark.asyncio
+async def test_retry_then_dead_letter(outbox: SandboxOutbox):
+    outbox.deps.broadcaster.fail_times = 1
+    await outbox.enqueue(ChannelDescriptor(Messengers.TELEGRAM, 'a'), BoardMessage('retry me'))
+    outbox.run_in_background()
+    await asyncio.sleep(0.1)
+    assert outbox.sent == 0 and (await outbox.stats())['pending'] == 1
+
+    await asyncio.sleep(0.1)
+    await outbox.reclaim_once()
+    assert outbox.sent == 1 and outbox.retried == 1
+    assert (await outbox.stats())['pending'] == 0
+
+    # this one never goes through
+    outbox.deps.broadcaster.fail_times = 100
+    await outbox.enqueue(ChannelDescriptor(Messengers.TELEGRAM, 'b'), BoardMessage('doomed'))
+    await asyncio.sleep(0.1)
+    for _ in range(outbox.max_attempts):
+        await asyncio.sleep(0.12)
+        await outbox.reclaim_once()
+
+    stats = await outbox.stats()
+    assert stats['dlq'] == 1 and stats['depth'] == 0 and stats['pending'] == 0
+    assert outbox.dead == 1
+
+
+def test_defaults_without_config_section():
+    d = DepContainer()
+    d.cfg = Config(data={})
+    q = OutboundQueue(d)
+    assert q.workers == 8 and q.max_attempts == 5 and q.retry_delay == 30
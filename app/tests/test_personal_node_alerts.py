@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from services.lib.config import Config
+from services.lib.db import DB
+from services.lib.depcont import DepContainer
+from services.models.node_info import NodeEvent, NodeEventType
+from services.notify.personal.personal_main import NodeChangePersonalNotifier
+
+NODE = 'maya1testnodealerts'
+USER = 'test_node_alerts_user'
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.enqueued = []
+
+    async def enqueue(self, channel, message, **kwargs):
+        self.enqueued.append((channel, message))
+
+
+class FakeSettings:
+    async def get_settings_multi(self, users):
+        return {user: {} for user in users}
+
+
+class FakeLocalization:
+    @staticmethod
+    def notification_text_for_node_op_changes(event):
+        return f'{event.type} of {event.address}'
+
+
+class FakeLocManager:
+    async def get_from_db(self, user, db):
+        return FakeLocalization()
+
+
+@pytest.fixture
+async def deps():
+    d = DepContainer()
+    d.loop = asyncio.get_event_loop()
+    d.db = DB(d.loop)
+    await d.db.get_redis()
+    d.cfg = Config(data={
+        'node_op_tools': {
+            'watchdog': {'enabled': False},
+            'types': {'online_service': {'tcp_timeout': 1}},
+        },
+    })
+    d.outbox = RecordingOutbox()
+    d.settings_manager = FakeSettings()
+    d.loc_man = FakeLocManager()
+    yield d
+    await NodeChangePersonalNotifier(d).watchers.clear_user_nodes(USER)
+
+
+@pytest.mark.asyncio
+async def test_node_event_is_enqueued_for_the_watcher(deps: DepContainer):
+    notifier = NodeChangePersonalNotifier(deps)
+    await notifier.watchers.add_user_to_node(USER, NODE)
+
+    await notifier._cast_messages_for_events([NodeEvent(NODE, NodeEventType.SLASHING, 10)])
+
+    assert len(deps.outbox.enqueued) == 1
+    channel, message = deps.outbox.enqueued[0]
+    assert channel.channel_id == USER
+    assert message.text == f'{NodeEventType.SLASHING} of {NODE}'
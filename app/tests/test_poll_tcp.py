@@ -0,0 +1,92 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from services.jobs.poll_tcp import TCPPollster
+
+TIMEOUT = 0.5
+
+
+def stalled_port(keep: list):
+    # backlog is full and nobody accepts: new SYNs are dropped, a connect hangs until the timeout
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    s.listen(0)
+    port = s.getsockname()[1]
+    keep.append(s)
+    for _ in range(4):
+        c = socket.socket()
+        c.setblocking(False)
+        c.connect_ex(('127.0.0.1', port))
+        keep.append(c)
+    return port
+
+
+def refused_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+@pytest.fixture
+async def ports():
+    servers, keep = [], []
+    open_ports = []
+    for _ in range(20):
+        server = await asyncio.start_server(lambda r, w: w.close(), '127.0.0.1', 0)
+        servers.append(server)
+        open_ports.append(server.sockets[0].getsockname()[1])
+
+    stalled = [stalled_port(keep) for _ in range(5)]
+    refused = [refused_port() for _ in range(5)]
+    await asyncio.sleep(0.1)  # let the backlog fill up
+
+    yield open_ports, stalled, refused
+
+    for server in servers:
+        server.close()
+    for s in keep:
+        s.close()
+
+
+@pytest.mark.asyncio
+async def test_sweep_is_bounded_by_the_slowest_probe(ports):
+    open_ports, stalled, refused = ports
+    pollster = TCPPollster(test_timeout=TIMEOUT, max_concurrency=100)
+
+    t0 = time.perf_counter()
+    results = await pollster.test_connectivity_multiple(['127.0.0.1'], open_ports + stalled + refused)
+    elapsed = time.perf_counter() - t0
+
+    port_map = results['127.0.0.1']
+    assert all(port_map[p] for p in open_ports)
+    assert not any(port_map[p] for p in stalled + refused)
+    assert pollster.count_stats(results)['total'] == 1
+
+    # 5 timeouts overlap: the sweep takes one of them, not 5
+    assert TIMEOUT <= elapsed < 2 * TIMEOUT
+    assert pollster._active_testers == 0
+
+
+@pytest.mark.asyncio
+async def test_results_are_cached(ports):
+    open_ports, stalled, _ = ports
+    now = [100.0]
+    pollster = TCPPollster(test_timeout=TIMEOUT, cache_ttl=30, jitter=10, clock=lambda: now[0])
+
+    assert await pollster.test_connectivity('127.0.0.1', open_ports[0])
+    assert not await pollster.test_connectivity('127.0.0.1', stalled[0])
+
+    t0 = time.perf_counter()
+    assert await pollster.test_connectivity('127.0.0.1', open_ports[0])
+    assert not await pollster.test_connectivity('127.0.0.1', stalled[0])
+    assert time.perf_counter() - t0 < 0.1
+    assert pollster.probes == 2 and pollster.cache_hits == 2
+
+    now[0] += 30 + 10  # past the TTL and any per-host jitter
+    assert await pollster.test_connectivity('127.0.0.1', open_ports[0])
+    assert pollster.probes == 3
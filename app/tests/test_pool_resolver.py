@@ -0,0 +1,63 @@
+from services.lib.texts import fuzzy_search
+from services.models.pool_info import PoolInfo
+from services.models.pool_resolver import PoolResolver
+from services.models.price import LastPriceHolder
+
+USDT = 'ETH.USDT-0XDAC17F958D2EE523A2206206994597C13D831EC7'
+USDC = 'ETH.USDC-0XA0B86991C6218B36C1D19D4A2E9EB0CE3606EB48'
+ARB_USDC = 'ARB.USDC-0XAF88D065E77C8CC2239327C5EDB3A432268E5831'
+ARB_WBTC = 'ARB.WBTC-0X2F2A2543B76A4166549F7AAB2E75BEF0AEFC5B0F'
+
+POOLS = ['BTC.BTC', 'ETH.ETH', 'ARB.ETH', 'DASH.DASH', 'KUJI.KUJI', 'THOR.RUNE', USDT, USDC, ARB_USDC]
+
+
+def make_holder():
+    holder = LastPriceHolder(stable_coins=[USDT])
+    holder.update({
+        name: PoolInfo(name, 1000, 1000 if name != 'ETH.ETH' else 5000, 1000, PoolInfo.AVAILABLE)
+        for name in POOLS
+    })
+    return holder
+
+
+def test_exact_and_aliases():
+    r = PoolResolver(POOLS)
+    assert r.search('btc.btc') == ['BTC.BTC']
+    assert r.search(USDT.lower()) == [USDT]
+    assert r.search('USDT') == [USDT]
+    assert r.search('eth.usdt') == [USDT]
+    assert r.search('USDC') == sorted([USDC, ARB_USDC])
+    # aliases only rank: the pools named "ETH" go first, the rest that contain "ETH" follow
+    assert r.search('ETH') == ['ARB.ETH', 'ETH.ETH', USDC, USDT]
+    # the synth/trade forms are not in the names, just as before
+    assert r.search('ETH/USDT') == []
+    assert r.search('BTC/BTC') == []
+
+
+def test_same_results_as_old_search():
+    pools = POOLS + ['ARB.ARB-0X912CE59144191C1204E64559FE8253A0E49E6548', ARB_WBTC, 'XRD.XRD', 'ETH.XDEFI-0X72B8']
+    r = PoolResolver(pools)
+    queries = ('ARB', 'ETH', 'BTC', 'X', 'ETH/ETH', 'ETH.USDT-EC7', 'ETH.USD', 'KU', 'DAC17', 'USDC-0XAF',
+               'DOGE', 'ETH.USDC-831', 'ARB.', '-548', 'ETH.ETH', '.')
+    for query in queries:
+        assert sorted(r.search(query)) == sorted(fuzzy_search(query, set(pools))), query
+
+    assert ARB_WBTC in r.search('BTC')
+    assert len(r.search('ARB')) == 4  # all the ARB.* pools
+    assert r.search('') == []
+    assert r.search('nothing') == []
+
+
+def test_holder_resolver_rebuild():
+    holder = make_holder()
+    resolver = holder.resolver
+    assert holder.pool_fuzzy_first('ETH') == 'ETH.ETH'  # the deepest one
+    assert holder.pool_fuzzy_first('b') == 'BTC.BTC'
+    assert holder.pool_fuzzy_first('ETH/USDT-EC7') == USDT
+
+    holder.update(holder.pool_info_map)
+    assert holder.resolver is resolver  # same pool set => same index
+
+    holder.update({'BTC.BTC': holder.pool_info_map['BTC.BTC']})
+    assert holder.resolver is not resolver
+    assert holder.pool_fuzzy_search('ETH') == []
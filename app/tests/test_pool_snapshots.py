@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+import ujson
+
+from services.jobs.fetch.pool_cache import PoolSnapshotStore
+from services.lib.db import DB
+from services.models.pool_info import PoolInfo
+
+
+def make_pools(height, names=('BTC.BTC', 'ETH.ETH', 'DASH.DASH')):
+    return {
+        name: PoolInfo(name, 10_000 + i * 100 + (height if name == 'BTC.BTC' else 0), 5000, 777,
+                       PoolInfo.AVAILABLE, volume_24h=height)
+        for i, name in enumerate(names)
+    }
+
+
+@pytest.fixture
+async def store():
+    s = PoolSnapshotStore(DB(asyncio.get_event_loop()), keyframe_every=10, prefix='Test:PoolSnap')
+    await s.clear()
+    yield s
+    await s.clear()
+
+
+@pytest.mark.asyncio
+async def test_keyframes_and_deltas(store: PoolSnapshotStore):
+    for h in range(100, 130):
+        await store.put(h, make_pools(h))
+    await store.put(131, make_pools(131, names=('BTC.BTC', 'DOGE.DOGE', 'DASH.DASH')))
+
+    heights, keyframes = await store.count()
+    assert heights == 31 and keyframes == 4  # 100, 110, 120, 130 -> 131 is a delta against 120
+
+    store._keyframe_cache.clear()
+    for h in range(100, 130):
+        assert await store.get_pools_at(h) == make_pools(h)
+    assert await store.get_pools_at(131) == make_pools(131, names=('BTC.BTC', 'DOGE.DOGE', 'DASH.DASH'))
+    assert await store.get_pools_at(99) is None
+
+
+@pytest.mark.asyncio
+async def test_sweep_keeps_referenced_keyframes(store: PoolSnapshotStore):
+    for h in range(100, 130):
+        await store.put(h, make_pools(h))
+
+    deleted = await store.sweep(115, max_height=125, batch=4)
+    # 100..109 and 111..114 go away, 110 stays as the base of 115..119; 126..129 are above the top
+    assert deleted == 10 + 4 + 4
+    assert await store.count() == (12, 2)
+    for h in range(115, 126):
+        assert await store.get_pools_at(h) == make_pools(h)
+    assert await store.get_pools_at(126) is None
+
+
+@pytest.mark.asyncio
+async def test_import_legacy_hash_skips_old_heights(store: PoolSnapshotStore):
+    r = await store._redis()
+    legacy_key = 'Test:PoolInfo:legacy'
+    await r.hset(legacy_key, mapping={
+        str(h): ujson.dumps({k: p.as_dict_brief() for k, p in make_pools(h).items()}) for h in range(100, 130)
+    })
+
+    assert await store.import_legacy_hash(legacy_key, min_height=105, batch=7) == 25
+    assert not await r.exists(legacy_key)
+    assert await store.count() == (25, 3)  # 105, 115, 125
+    store._keyframe_cache.clear()
+    assert await store.get_pools_at(104) is None
+    for h in range(105, 130):
+        assert await store.get_pools_at(h) == make_pools(h)
+
+    assert await store.put_many([(h, make_pools(h)) for h in (129, 130, 130)]) == 1
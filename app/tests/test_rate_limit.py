@@ -84,3 +84,13 @@ async def test_rate_limit_cooldown(rate_limiter_cd: RateLimitCooldown):
     await asyncio.sleep(CD_T + LIMIT_T)
     assert await r.hit() == r.GOOD
     assert await r.hit() == r.GOOD
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_cooldown_concurrent(rate_limiter_cd: RateLimitCooldown):
+    r = rate_limiter_cd
+
+    outcomes = await asyncio.gather(*(r.hit() for _ in range(LIMIT_N * 3)))
+    assert outcomes.count(r.GOOD) == LIMIT_N
+    assert outcomes.count(r.HIT_LIMIT) == 1
+    assert outcomes.count(r.ON_COOLDOWN) == LIMIT_N * 2 - 1
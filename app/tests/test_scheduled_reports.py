@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from services.lib.config import Config
+from services.lib.date_utils import now_ts
+from services.lib.db import DB
+from services.lib.depcont import DepContainer
+from services.lib.scheduler import Scheduler
+from services.notify.personal.scheduled import PersonalPeriodicNotificationService
+
+
+class CountingReports(PersonalPeriodicNotificationService):
+    def __init__(self, deps):
+        super().__init__(deps)
+        self.computed = []
+
+    async def _generate_report(self, address, pool):
+        self.computed.append((address, pool))
+        await asyncio.sleep(0.05)  # stands for Midgard history + pool states + yield math
+        return {'address': address, 'pool': pool}
+
+
+def make_service(**scheduler_cfg):
+    d = DepContainer()
+    d.cfg = Config(data={'personal': {'scheduler': scheduler_cfg}})
+    return CountingReports(d)
+
+
+@pytest.mark.asyncio
+async def test_subscribers_of_one_address_share_the_report():
+    service = make_service(report_cache_ttl='10m')
+
+    reports = await asyncio.gather(*(
+        service.get_shared_report('maya1abc', 'BTC.BTC') for _ in range(5)
+    ), service.get_shared_report('maya1abc', 'ETH.ETH'))
+    assert reports[0] is reports[4]
+    assert reports[5]['pool'] == 'ETH.ETH'
+
+    # a later tick within the same bucket
+    assert await service.get_shared_report('maya1abc', 'BTC.BTC') is reports[0]
+
+    assert sorted(service.computed) == [('maya1abc', 'BTC.BTC'), ('maya1abc', 'ETH.ETH')]
+    assert service.report_cache_stats == {'hits': 1, 'misses': 2, 'dedupes': 4}
+
+
+@pytest.mark.asyncio
+async def test_no_sharing_when_disabled():
+    service = make_service(report_cache_ttl='0')
+    await asyncio.gather(*(service.get_shared_report('maya1abc', 'BTC.BTC') for _ in range(3)))
+    assert len(service.computed) == 3
+
+
+@pytest.mark.asyncio
+async def test_scheduler_handler_waits_for_delivery():
+    service = make_service()
+    delivered = []
+
+    async def deliver(user, address, pool):
+        await asyncio.sleep(0.01)
+        delivered.append((user, address, pool))
+
+    service._deliver_report = deliver
+    await service.on_data(None, service.key('u1', 'maya1abc', 'BTC.BTC'))
+    assert delivered == [('u1', 'maya1abc', 'BTC.BTC')]
+
+
+@pytest.mark.asyncio
+async def test_existing_subscriptions_are_spread_once():
+    service = make_service(jitter='2m')
+    service.deps.db = DB(asyncio.get_event_loop())
+    r = await service.deps.db.get_redis()
+    sched = service.deps.scheduler = Scheduler(r, 'TestSpread')
+    await sched.cancel_all_periodic()
+    await r.delete(service.key_spread_done)
+
+    # all made before the jitter: they come due at the same moment
+    due = now_ts() + 3600
+    for i in range(20):
+        await sched.schedule(service.key(f'u{i}', 'maya1abc', 'BTC.BTC'), due, period=3600)
+    await sched.schedule('other', due, period=3600)
+
+    await service.spread_existing_subscriptions()
+    events = dict(await sched.awaiting_events())
+    assert events.pop('other') == due
+    assert all(due <= ts <= due + 120 for ts in events.values())
+    assert len(set(events.values())) == 20
+
+    await service.spread_existing_subscriptions()  # only once
+    assert dict(await sched.awaiting_events()) == {**events, 'other': due}
+
+    await sched.cancel_all_periodic()
+    await r.delete(service.key_spread_done)
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from services.lib.date_utils import now_ts
+from services.lib.db import DB
+from services.lib.scheduler import Scheduler, SCHEDULER_EVENTS
+
+
+class Recorder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def on_data(self, sender, ident):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            self.calls.append(ident)
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+async def db():
+    db = DB(asyncio.get_event_loop())
+    await db.get_redis()
+    yield db
+
+
+async def make_scheduler(db, **kwargs):
+    sched = Scheduler(db.redis, 'TestSched', **kwargs)
+    await sched.cancel_all_periodic()
+    await sched.clear()
+    return sched
+
+
+async def put_due(sched, *idents):
+    await sched._r.zadd(sched.key_timeline(), {ident: now_ts() - 1 for ident in idents})
+
+
+@pytest.mark.asyncio
+async def test_two_instances_never_share_an_event(db):
+    a = await make_scheduler(db)
+    b = Scheduler(db.redis, 'TestSched')
+    rec = Recorder(delay=0.01)
+    a.add_subscriber(rec)
+    b.add_subscriber(rec)
+
+    await put_due(a, *(f'ev{i}' for i in range(20)))
+    await asyncio.gather(a._process(), b._process())
+    await asyncio.gather(a.wait_handlers(), b.wait_handlers())
+
+    assert sorted(rec.calls) == sorted(f'ev{i}' for i in range(20))
+    assert await a.awaiting_events() == []
+    assert await db.redis.zcard(a.key_leases()) == 0
+    await a.clear()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded(db):
+    sched = await make_scheduler(db, concurrency=3)
+    rec = Recorder(delay=0.05)
+    sched.add_subscriber(rec)
+
+    await put_due(sched, *(f'ev{i}' for i in range(10)))
+    await sched._process()
+    await sched.wait_handlers()
+
+    assert len(rec.calls) == 10
+    assert rec.max_active == 3
+    await sched.clear()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_handler_is_acked(db):
+    sched = await make_scheduler(db, handler_timeout=0.05)
+    sched.add_subscriber(Recorder(delay=10))
+    timeouts = SCHEDULER_EVENTS.labels('TestSched', 'timeout').value
+
+    await put_due(sched, 'slow')
+    await sched._process()
+    await sched.wait_handlers()
+
+    assert SCHEDULER_EVENTS.labels('TestSched', 'timeout').value == timeouts + 1
+    assert await sched.awaiting_events() == []
+    assert await db.redis.zcard(sched.key_leases()) == 0
+    await sched.clear()
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_requeued(db):
+    sched = await make_scheduler(db)
+    await put_due(sched, 'lost')
+    due = (await sched.awaiting_events())[0][1]
+
+    # the instance "dies" right after taking the event
+    assert [ev[0] for ev in await sched._pop_due(10)] == ['lost']
+    assert await sched.awaiting_events() == []
+    await db.redis.zadd(sched.key_leases(), {'lost': now_ts() - 1})
+
+    assert await sched._requeue_expired() == 1
+    assert await sched.awaiting_events() == [('lost', due)]
+
+    rec = Recorder()
+    sched.add_subscriber(rec)
+    await sched._process()
+    await sched.wait_handlers()
+    assert rec.calls == ['lost']
+    await sched.clear()
+
+
+@pytest.mark.asyncio
+async def test_release_keeps_the_newer_lease(db):
+    sched = await make_scheduler(db)
+    await put_due(sched, 'periodic')
+    (ident, first_due), = await sched._pop_due(10)
+
+    # rescheduled and popped again while the first run is still going
+    await sched._r.zadd(sched.key_timeline(), {ident: first_due + 0.5})
+    (_, second_due), = await sched._pop_due(10)
+
+    assert await sched._release(ident, first_due) == 0
+    assert await db.redis.zscore(sched.key_leases(), ident) is not None
+    assert await sched._release(ident, second_due) == 1
+    assert await db.redis.zcard(sched.key_leases()) == 0
+    await sched.clear()
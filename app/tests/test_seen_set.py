@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from services.lib.db import DB
+from services.lib.seen_set import TimeBucketedSeenSet, BloomFilter
+
+LEGACY_KEY = 'Test:Seen:Legacy'
+
+
+@pytest.fixture
+async def db():
+    db = DB(asyncio.get_event_loop())
+    r = await db.get_redis()
+    yield db
+    keys = [k async for k in r.scan_iter('Test:Seen:*')]
+    if keys:
+        await r.delete(*keys)
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f'tx-{i}')
+    assert all(f'tx-{i}' in bloom for i in range(1000))
+    false_positives = sum(f'other-{i}' in bloom for i in range(10_000))
+    assert false_positives < 300
+
+    count = bloom.count
+    assert count > 980  # a few may collide with the bits already set
+    assert not bloom.add('tx-1') and bloom.count == count  # repeated adds do not fill it up
+    for i in range(1000, 1100):
+        bloom.add(f'tx-{i}')
+    assert bloom.is_full
+
+
+@pytest.mark.asyncio
+async def test_dedupe_across_bucket_boundaries(db):
+    seen = TimeBucketedSeenSet(db, 'Test:Seen:Buckets', bucket_sec=100, keep_buckets=2)
+
+    await seen.add_many(['A', 'B'], ts=199)  # the last second of bucket #1
+    await seen.add_many(['C'], ts=200)  # the first second of bucket #2
+
+    assert await seen.seen_many(['A', 'B', 'C', 'D'], ts=199) == [True, True, False, False]
+    assert await seen.seen_many(['A', 'B', 'C', 'D'], ts=201) == [True, True, True, False]
+    assert await seen.seen_many(['A', 'C'], ts=299) == [True, True]
+    # bucket #1 is out of the window now
+    assert await seen.seen_many(['A', 'C'], ts=300) == [False, True]
+    assert await seen.seen_many(['A', 'C'], ts=400) == [False, False]
+
+    r = await db.get_redis()
+    assert 0 < await r.ttl(seen.bucket_key(2)) <= seen.ttl_sec
+
+
+@pytest.mark.asyncio
+async def test_bloom_in_front_and_migration(db):
+    r = await db.get_redis()
+    await r.sadd(LEGACY_KEY, *(f'old-{i}' for i in range(1200)))
+
+    seen = TimeBucketedSeenSet(db, 'Test:Seen:Bloom', bucket_sec=100, keep_buckets=2, bloom_capacity=10_000)
+    assert await seen.migrate_from_set(LEGACY_KEY, ts=150) == 1200
+    assert not await r.exists(LEGACY_KEY)
+
+    await seen.add_many(['fresh'], ts=150)
+    ids = ['old-0', 'old-1199', 'fresh'] + [f'new-{i}' for i in range(100)]
+    flags = await seen.seen_many(ids, ts=160)
+    assert flags == [True, True, True] + [False] * 100
+    assert seen.bloom.count == 1201
+    assert seen.bloom_skips >= 95  # most of the new ones never went to Redis
+
+    await seen.add_many(['new-0'], ts=160)
+    assert await seen.seen_many(['new-0'], ts=160) == [True]
+
+
+@pytest.mark.asyncio
+async def test_bloom_is_sized_for_the_live_items(db):
+    seen = TimeBucketedSeenSet(db, 'Test:Seen:Bloom', bucket_sec=100, keep_buckets=2, bloom_capacity=100)
+    await seen.clear()
+    await seen.add_many([f'old-{i}' for i in range(500)], ts=150)
+
+    assert await seen.seen_many(['old-1', 'new-1'], ts=160) == [True, False]
+    bloom = seen.bloom
+    assert bloom.capacity >= 1000 and not bloom.is_full
+
+    assert await seen.seen_many(['old-2', 'new-2'], ts=160) == [True, False]
+    assert seen.bloom is bloom  # not reloaded on every call
+    await seen.clear()
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from services.lib.config import Config
+from services.lib.db import DB
+from services.lib.settings_manager import SettingsManager
+
+USER = 'test-settings-cache-user'
+USER_2 = 'test-settings-cache-user-2'
+
+
+def make_manager():
+    cfg = Config(data={'web': {'public_url': 'http://localhost'}})
+    return SettingsManager(DB(asyncio.get_event_loop()), cfg)
+
+
+@pytest.fixture
+async def managers():
+    a, b = make_manager(), make_manager()
+    await a.db.get_redis()
+    await b.db.get_redis()
+    await a.set_settings(USER, {})
+    await a.set_settings(USER_2, {})
+    yield a, b
+    await a.set_settings(USER, {})
+    await a.set_settings(USER_2, {})
+    for m in (a, b):
+        if m._invalidation_task:
+            m._invalidation_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_hits_and_copies(managers):
+    a, _ = managers
+    await a.set_settings(USER, {'lang': 'eng', 'nodes': ['x']})
+
+    misses = a.cache_misses
+    s1 = await a.get_settings(USER)
+    assert s1 == {'lang': 'eng', 'nodes': ['x']}
+    assert a.cache_misses == misses  # filled by set_settings
+
+    # get_settings gives a private copy
+    s1['lang'] = 'rus'
+    s1['nodes'].append('y')
+    assert await a.get_settings(USER) == {'lang': 'eng', 'nodes': ['x']}
+
+    multi = await a.get_settings_multi([USER, USER_2, ''])
+    assert multi == {USER: {'lang': 'eng', 'nodes': ['x']}, USER_2: {}}
+    assert a.cache_stats['hits'] >= 2
+
+
+@pytest.mark.asyncio
+async def test_ttl_expiration(managers):
+    a, _ = managers
+    a.cache_ttl = 0.05
+    await a.set_settings(USER, {'v': 1})
+    await a.db.redis.set(a.db_key_settings(USER), '{"v": 2}')  # behind the cache's back
+    assert (await a.get_settings(USER))['v'] == 1
+    await asyncio.sleep(0.1)
+    assert (await a.get_settings(USER))['v'] == 2
+
+
+@pytest.mark.asyncio
+async def test_cross_process_invalidation(managers):
+    a, b = managers
+    b.start_invalidation_listener()
+    await asyncio.sleep(0.1)  # let it subscribe
+
+    await a.set_settings(USER, {'v': 1})
+    assert (await b.get_settings(USER))['v'] == 1
+
+    await a.set_settings(USER, {'v': 2})
+    await asyncio.sleep(0.1)
+    assert (await b.get_settings_multi([USER]))[USER]['v'] == 2
+    assert b.cache_invalidations >= 2
+
+    await a.set_settings(USER, {})
+    await asyncio.sleep(0.1)
+    assert await b.get_settings(USER) == {}
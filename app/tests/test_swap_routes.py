@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.jobs.scanner.swap_routes import SwapRouteRecorder
+from services.lib.db import DB
+from services.lib.db_key_index import scan_keys
+
+
+@pytest.fixture
+async def recorder():
+    db = DB(asyncio.get_event_loop())
+    await db.get_redis()
+    rec = SwapRouteRecorder(db, key_prefix='_test_routes')
+
+    async def wipe():
+        keys = [k async for k in scan_keys(db.redis, '_test_routes:*')]
+        if keys:
+            await db.redis.delete(*keys)
+
+    await wipe()
+    yield rec
+    await wipe()
+
+
+@pytest.mark.asyncio
+async def test_legacy_days_are_backfilled_once(recorder: SwapRouteRecorder):
+    r = recorder.redis
+    today = datetime.now()
+    old = today - timedelta(days=recorder.keep_days + 5)
+    # recorded before the day index existed
+    await r.hset(recorder._prefixed_key('BTC.BTC==ETH.ETH', today - timedelta(days=2)), 'volume', 100)
+    await r.hset(recorder._prefixed_key('DASH.DASH==BTC.BTC', old), 'volume', 500)
+
+    assert await recorder.get_top_swap_routes_by_volume() == []  # the readers never SCAN
+
+    assert await recorder.migrate_legacy_days() == 1
+    assert not await r.exists(recorder._prefixed_key('DASH.DASH==BTC.BTC', old))
+    assert await recorder.migrate_legacy_days() == 0
+
+    await recorder.store_swap_event('BTC.BTC', 'ETH.ETH', 50, today)
+    await recorder.store_swap_event('ETH.ETH', 'BTC.BTC', 10, today)
+    top = await recorder.get_top_swap_routes_by_volume(top_n=2)
+    assert [(e.from_asset, e.to_asset, e.volume_cacao) for e in top] == [
+        ('BTC.BTC', 'ETH.ETH', 150.0),
+        ('ETH.ETH', 'BTC.BTC', 10.0),
+    ]
+
+    # a restarted process sees the marker and skips the walk
+    recorder._migrated = False
+    assert await recorder.migrate_legacy_days() == 0 and recorder._migrated
@@ -0,0 +1,100 @@
+import asyncio
+from collections import Counter
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from aionode.cache import SingleFlightCache
+from aionode.connector import ThorConnector
+from aionode.env import ThorEnvironment
+
+POOL = {
+    'asset': 'BTC.BTC', 'status': 'Available', 'balance_asset': '100', 'balance_cacao': '200',
+}
+
+
+@pytest.fixture
+async def thornode():
+    hits = Counter()
+
+    async def pools(request: web.Request):
+        hits[request.path_qs] += 1
+        await asyncio.sleep(0.05)
+        return web.json_response([POOL])
+
+    async def mimir(request: web.Request):
+        hits[request.path_qs] += 1
+        return web.json_response({'HALTTRADING': 0})
+
+    app = web.Application()
+    app.router.add_get('/mayachain/pools', pools)
+    app.router.add_get('/mayachain/mimir', mimir)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    session = aiohttp.ClientSession()
+    env = ThorEnvironment(thornode_url=f'http://127.0.0.1:{port}', rpc_url=f'http://127.0.0.1:{port}')
+    yield env, session, hits
+    await session.close()
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_coalesced(thornode):
+    env, session, hits = thornode
+    connector = ThorConnector(env, session, cache_ttl={'pools': 0.0})
+
+    results = await asyncio.gather(*(connector.query_pools() for _ in range(10)))
+    assert all(r[0].asset == 'BTC.BTC' for r in results)
+    assert hits['/mayachain/pools'] == 1
+    assert connector.cache_stats['pools'] == {'hits': 0, 'misses': 1, 'dedupes': 9}
+
+    # ttl=0: nothing is kept after the flight is over
+    await connector.query_pools()
+    assert hits['/mayachain/pools'] == 2
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_height_keys(thornode):
+    env, session, hits = thornode
+    connector = ThorConnector(env, session, cache_ttl={'mimir': 0.1})
+
+    await connector.query_mimir()
+    await connector.query_mimir()
+    assert hits['/mayachain/mimir'] == 1
+    await asyncio.sleep(0.15)
+    await connector.query_mimir()
+    assert hits['/mayachain/mimir'] == 2
+    assert connector.cache_stats['mimir'] == {'hits': 1, 'misses': 2, 'dedupes': 0}
+
+    # the past does not change: every height is a separate key that lives long
+    await connector.query_pools(height=100)
+    await connector.query_pools(height=100)
+    await connector.query_pools(height=101)
+    assert hits['/mayachain/pools?height=100'] == 1
+    assert hits['/mayachain/pools?height=101'] == 1
+
+
+@pytest.mark.asyncio
+async def test_failures_are_shared_but_not_cached():
+    cache = SingleFlightCache()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        if calls == 1:
+            raise ConnectionError('down')
+        return 'ok'
+
+    results = await asyncio.gather(*(cache.get_or_fetch('k', fetch, ttl=10) for _ in range(3)),
+                                   return_exceptions=True)
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert await cache.get_or_fetch('k', fetch, ttl=10) == 'ok'
+    assert await cache.get_or_fetch('k', fetch, ttl=10) == 'ok'
+    assert calls == 2
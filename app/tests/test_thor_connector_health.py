@@ -0,0 +1,154 @@
+import asyncio
+import socket
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from aionode.connector import ThorConnector
+from aionode.env import ThorEnvironment
+from aionode.health import EndpointHealth
+
+PATH = '/mayachain/mimir'
+
+
+class FakeNode:
+    def __init__(self, name, delay=0.0):
+        self.name = name
+        self.delay = delay
+        self.hits = 0
+        self.runner = None
+        self.port = 0
+
+    async def handle(self, _request):
+        self.hits += 1
+        await asyncio.sleep(self.delay)
+        return web.json_response({'node': self.name})
+
+    async def start(self, port=0):
+        app = web.Application()
+        app.router.add_get(PATH, self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    @property
+    def env(self):
+        return ThorEnvironment(thornode_url=f'http://127.0.0.1:{self.port}', timeout=2.0)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+async def session():
+    session = aiohttp.ClientSession()
+    yield session
+    await session.close()
+
+
+async def ask(connector: ThorConnector):
+    data = await connector.query_custom_path(PATH)
+    return data['node'] if data else None
+
+
+def test_circuit_breaker_states():
+    now = [0.0]
+    health = EndpointHealth(failure_threshold=2, open_time=10.0, clock=lambda: now[0])
+    health.on_failure()
+    assert health.state == health.CLOSED
+    health.on_failure()
+    assert health.state == health.OPEN and not health.available
+
+    now[0] = 11.0
+    assert health.available
+    health.on_start()
+    assert health.state == health.HALF_OPEN and not health.available  # one probe at a time
+    health.on_failure()
+    assert health.state == health.OPEN and not health.available
+
+    now[0] = 22.0
+    health.on_start()
+    health.on_success(0.1)
+    assert health.state == health.CLOSED and health.available
+
+
+@pytest.mark.asyncio
+async def test_prefers_faster_node(session):
+    slow, fast = FakeNode('slow', delay=0.1), FakeNode('fast', delay=0.01)
+    await slow.start()
+    await fast.start()
+    try:
+        connector = ThorConnector(slow.env, session, additional_envs=[fast.env])
+        answers = [await ask(connector) for _ in range(10)]
+        # the declared primary is tried once, then the faster backup wins the ranking
+        assert answers[0] == 'slow'
+        assert answers[1:] == ['fast'] * 9
+    finally:
+        await slow.stop()
+        await fast.stop()
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_half_open_probe_closes_it(session):
+    dead_port = free_port()
+    backup = FakeNode('backup')
+    await backup.start()
+    primary = FakeNode('primary')
+    try:
+        dead_env = ThorEnvironment(thornode_url=f'http://127.0.0.1:{dead_port}', timeout=1.0)
+        dead_env.set_retries(5, delay=0.01)
+        connector = ThorConnector(dead_env, session, additional_envs=[backup.env],
+                                  health_options={'failure_threshold': 2, 'open_time': 0.3})
+
+        # the circuit opens after 2 failures, the rest of the retries are not wasted
+        assert await ask(connector) == 'backup'
+        assert connector.health_stats[0]['state'] == EndpointHealth.OPEN
+        assert connector.health_stats[0]['failures'] == 2
+
+        for _ in range(5):
+            assert await ask(connector) == 'backup'
+        assert backup.hits == 6
+        assert connector.health_stats[0]['failures'] == 2  # the dead node was not touched while open
+
+        # the node is back; after "open_time" a probe goes to it and closes the circuit
+        await primary.start(port=dead_port)
+        await asyncio.sleep(0.35)
+        assert await ask(connector) == 'primary'
+        assert connector.health_stats[0]['state'] == EndpointHealth.CLOSED
+    finally:
+        await backup.stop()
+        if primary.runner:
+            await primary.stop()
+
+
+@pytest.mark.asyncio
+async def test_hedging_beats_stalled_node(session):
+    first, second = FakeNode('first', delay=0.01), FakeNode('second', delay=0.05)
+    await first.start()
+    await second.start()
+    try:
+        connector = ThorConnector(first.env, session, additional_envs=[second.env], hedging=True)
+        for _ in range(15):
+            await ask(connector)
+        assert connector.health_stats[0]['p95'] is not None
+
+        first.delay = 1.5  # stalls, but is still ranked first by its history
+        wins_before = connector.hedge_wins
+        t0 = time.monotonic()
+        assert await ask(connector) == 'second'
+        assert time.monotonic() - t0 < 0.5
+        assert connector.hedge_wins == wins_before + 1
+        assert connector.hedged_requests >= 1
+    finally:
+        await first.stop()
+        await second.stop()
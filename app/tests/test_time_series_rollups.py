@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from services.lib.date_utils import now_ts, HOUR, MINUTE, DAY
+from services.lib.db import DB
+from services.models.time_series import TimeSeries
+
+RESOLUTIONS = ((MINUTE, 1000), (HOUR, 1000))
+
+
+@pytest.fixture
+async def series():
+    ts = TimeSeries('Test:Rollups', DB(asyncio.get_event_loop()), max_len=1000, rollup_key='price',
+                    resolutions=RESOLUTIONS)
+    await ts.clear()
+    yield ts
+    await ts.clear()
+
+
+async def fill(series: TimeSeries, n=180, step=20):
+    # 1 hour of points every 20 sec
+    start = (int(now_ts()) // HOUR - 1) * HOUR
+    for i in range(n):
+        await series.add(message_id=f'{(start + i * step) * 1000}-0', price=float(i), note='x')
+    return start
+
+
+def test_pick_resolution():
+    ts = TimeSeries('Test', None, rollup_key='price', resolutions=RESOLUTIONS)
+    assert ts.pick_resolution(7 * DAY, 150) == HOUR
+    assert ts.pick_resolution(DAY, 150) == MINUTE
+    assert ts.pick_resolution(HOUR, 150) == 0
+    assert TimeSeries('Test', None).pick_resolution(7 * DAY, 150) == 0
+
+
+@pytest.mark.asyncio
+async def test_incremental_rollups(series: TimeSeries):
+    start = await fill(series)
+
+    minutes = await series.get_rollup_points(MINUTE, 2 * HOUR)
+    assert len(minutes) == 60
+    first, last = minutes[0], minutes[-1]
+    assert first['ts'] == start and (first['o'], first['h'], first['l'], first['c']) == (0, 2, 0, 2)
+    assert first['avg'] == 1.0 and first['n'] == 3
+    assert last['c'] == 179 and last['n'] == 3  # the open bucket
+
+    hours = await series.get_rollup_points(HOUR, 2 * HOUR)
+    assert len(hours) == 1 and hours[0]['n'] == 180 and hours[0]['h'] == 179
+
+    values = await series.get_values_auto(DAY, min_points=30, with_ts=True)
+    assert values == [(p['ts'], p['avg']) for p in minutes]
+
+    # 2 hours have fewer than 150 minutes => the raw stream
+    assert len(await series.get_values_auto(2 * HOUR, min_points=150)) == 180
+
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_incremental(series: TimeSeries):
+    await fill(series)
+    incremental = await series.get_rollup_points(MINUTE, 2 * HOUR)
+    await series.rebuild_rollups(chunk=50)
+    assert await series.get_rollup_points(MINUTE, 2 * HOUR) == incremental
+
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_points_added_meanwhile(series: TimeSeries):
+    start = await fill(series, n=60)
+    fold = series._fold_raw_points
+    calls = []
+
+    async def fold_and_race(*args):
+        cursor = await fold(*args)
+        if not calls:
+            # a live point comes in between the read and the write of the rebuild
+            await series.add(message_id=f'{(start + HOUR + 30) * 1000}-0', price=1000.0)
+        calls.append(cursor)
+        return cursor
+
+    series._fold_raw_points = fold_and_race
+    await series.rebuild_rollups(chunk=50)
+
+    assert len(calls) == 2  # the write was retried with the tail folded in
+    hours = await series.get_rollup_points(HOUR, 3 * HOUR)
+    assert hours[-1]['ts'] == start + HOUR and hours[-1]['c'] == 1000.0
+
+
+@pytest.mark.asyncio
+async def test_bucket_behind_the_stream_does_not_fail_the_add(series: TimeSeries):
+    start = await fill(series, n=3)  # the first minute is open
+    r = await series.db.get_redis()
+    # a finished entry that is already past the open bucket
+    await r.xadd(series.rollup_stream_name(MINUTE), {'o': 1}, id=f'{(start + 10 * MINUTE) * 1000}-0')
+
+    message_id = await series.add(message_id=f'{(start + MINUTE) * 1000}-0', price=5.0)
+    assert message_id == f'{(start + MINUTE) * 1000}-0'
+    minutes = await series.get_rollup_points(MINUTE, 2 * HOUR)
+    assert minutes[-1]['ts'] == start + MINUTE and minutes[-1]['c'] == 5.0  # the new bucket is open anyway
@@ -0,0 +1,76 @@
+# Reading a month of 1-minute Accumulator buckets: one HGETALL coroutine per bucket (old get_range)
+# vs. chunked pipelines vs. the Lua reducer.
+# $ REDIS_DB_INDEX=15 PYTHONPATH="." python tools/debug/dbg_accumulator_bench.py
+
+import asyncio
+import random
+import time
+
+from services.lib.accumulator import Accumulator
+from services.lib.date_utils import DAY, MINUTE, now_ts
+from services.lib.db import DB
+from services.lib.texts import sep
+
+PERIOD = 30 * DAY
+FIELDS = ('swap', 'synth', 'add', 'withdraw')
+LEGACY_CONCURRENCY = 200
+
+
+async def fill(acc: Accumulator):
+    now = now_ts()
+    ts = now - PERIOD
+    batch = []
+    while ts <= now:
+        batch.append(acc.add_many(ts, {f: random.uniform(0, 1e5) for f in FIELDS}, {'price': random.uniform(1, 2)}))
+        if len(batch) >= LEGACY_CONCURRENCY:
+            await asyncio.gather(*batch)
+            batch = []
+        ts += MINUTE
+    await asyncio.gather(*batch)
+
+
+async def legacy_get_range(acc: Accumulator):
+    # the old code gathered all of them at once; that opens a connection per pending command
+    # and runs out of file descriptors on a month of minutes, so here they are limited
+    sem = asyncio.Semaphore(LEGACY_CONCURRENCY)
+
+    async def one(ts):
+        async with sem:
+            return await acc.get(ts)
+
+    timestamps = acc._range_timestamps(-PERIOD)
+    results = await asyncio.gather(*(one(ts) for ts in timestamps))
+    return dict(zip(timestamps, results))
+
+
+async def measure(title, coro_fn):
+    t0 = time.perf_counter()
+    result = await coro_fn()
+    print(f'{title:>22}: {(time.perf_counter() - t0) * 1e3:9.1f} ms')
+    return result
+
+
+async def main():
+    db = DB(asyncio.get_event_loop())
+    await db.get_redis()
+    acc = Accumulator('Bench', db, tolerance=MINUTE)
+    await acc.clear()
+
+    sep()
+    await measure('Fill', lambda: fill(acc))
+    print(f'Buckets: {len(await acc.all_my_keys())}')
+
+    old = await measure('Legacy get_range', lambda: legacy_get_range(acc))
+    new = await measure('Pipelined get_range', lambda: acc.get_range(-PERIOD))
+    stats = await measure('Lua reduce_range', lambda: acc.reduce_range(-PERIOD))
+
+    assert len(old) == len(new)
+    py_sum = sum(p.get('swap', 0.0) for p in new.values())
+    print(f'swap sum: python {py_sum:.2f}, lua {stats["swap"]["sum"]:.2f}')
+    sep()
+
+    await acc.clear()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from services.jobs.scanner.block_decoder import BlockDecoderPool, decode_txs_batch
+from services.jobs.scanner.block_loader import BlockResult
+from services.jobs.scanner.scan_cache import NativeScannerBlockCached
+from services.lib.texts import sep
+from tools.lib.lp_common import LpAppFramework
+
+
+async def load_recorded_blocks(app, start_block, n_blocks):
+    # the cached scanner keeps the raw blocks in the block store, so the next run does not touch THORNode
+    scanner = NativeScannerBlockCached(app.deps)
+    blocks = []
+    for block_no in range(start_block, start_block + n_blocks):
+        block_results_raw = await scanner._fetch_block_results_raw(block_no)
+        block_txs_raw = await scanner._fetch_block_txs_raw(block_no)
+        if block_results_raw and block_txs_raw:
+            blocks.append((block_no, block_results_raw, block_txs_raw))
+    print(f'Loaded {len(blocks)} blocks.')
+    return blocks
+
+
+async def max_loop_lag_while(coro, period=0.001):
+    # measures how long the event loop was blocked while "coro" was running
+    max_lag = 0.0
+    done = False
+
+    async def probe():
+        nonlocal max_lag
+        while not done:
+            t0 = time.monotonic()
+            await asyncio.sleep(period)
+            max_lag = max(max_lag, time.monotonic() - t0 - period)
+
+    probe_task = asyncio.create_task(probe())
+    result = await coro
+    done = True
+    await probe_task
+    return result, max_lag
+
+
+async def bench_inline(blocks):
+    n_txs = 0
+    for block_no, block_results_raw, block_txs_raw in blocks:
+        BlockResult.load_block(block_results_raw, block_no)
+        n_txs += len(BlockResult.load_txs(block_txs_raw, block_no) or [])
+        await asyncio.sleep(0)
+    return n_txs
+
+
+async def bench_pooled(decoder: BlockDecoderPool, blocks):
+    n_txs = 0
+    for block_no, block_results_raw, block_txs_raw in blocks:
+        await decoder.load_block(block_results_raw, block_no)
+        n_txs += len(await decoder.load_txs(block_txs_raw, block_no) or [])
+    return n_txs
+
+
+async def run_bench(app, start_block=5_500_000, n_blocks=200, workers=(1, 2, 4)):
+    blocks = await load_recorded_blocks(app, start_block, n_blocks)
+
+    t0 = time.monotonic()
+    n_txs, max_lag = await max_loop_lag_while(bench_inline(blocks))
+    elapsed = time.monotonic() - t0
+    sep()
+    print(f'Inline: {n_txs} txs in {elapsed:.3f} sec; max loop lag = {max_lag * 1000:.1f} ms')
+
+    for n_workers in workers:
+        decoder = BlockDecoderPool(max_workers=n_workers)
+        # warm up: spawn the worker processes before measuring
+        await asyncio.get_running_loop().run_in_executor(decoder.executor, decode_txs_batch, [])
+        t0 = time.monotonic()
+        n_txs, max_lag = await max_loop_lag_while(bench_pooled(decoder, blocks))
+        elapsed = time.monotonic() - t0
+        print(f'Pooled ({n_workers} workers): {n_txs} txs in {elapsed:.3f} sec; '
+              f'max loop lag = {max_lag * 1000:.1f} ms')
+        decoder.shutdown()
+    sep()
+
+
+async def main():
+    app = LpAppFramework()
+    async with app(brief=True):
+        await run_bench(app)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
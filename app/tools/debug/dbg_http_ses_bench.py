@@ -0,0 +1,117 @@
+# Decoding a ~5 MB block_results answer: the old ObservableSession (text() for the stats + json() in the caller)
+# vs. ObservableResponse (no decoding for the stats, one parse from the bytes, orjson if installed).
+# Pass a recorded answer to use it instead of the generated one:
+# $ PYTHONPATH="." python tools/debug/dbg_http_ses_bench.py [block_results.json]
+
+import asyncio
+import base64
+import json
+import random
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+from services.lib.http_ses import ObservableSession, orjson, json_loads
+from services.lib.texts import sep
+
+ROUNDS = 20
+TARGET_SIZE = 5 * 1024 * 1024
+
+
+def b64(s: str):
+    return base64.b64encode(s.encode()).decode()
+
+
+def generate_block_results():
+    # the shape of Tendermint /block_results: a lot of events with base64 encoded attributes
+    def event(i):
+        return {
+            'type': random.choice(['swap', 'transfer', 'outbound', 'fee', 'message']),
+            'attributes': [
+                {'key': b64(k), 'value': b64(f'{k}-{i}-{random.randint(0, 10 ** 12)}'), 'index': True}
+                for k in ('pool', 'memo', 'coin', 'from', 'to', 'id', 'chain', 'liquidity_fee')
+            ],
+        }
+
+    txs, size, i = [], 0, 0
+    while size < TARGET_SIZE:
+        tx = {'code': 0, 'data': b64(f'data-{i}'), 'log': '', 'gas_wanted': '0', 'gas_used': '0',
+              'events': [event(i * 10 + j) for j in range(10)]}
+        txs.append(tx)
+        size += len(json.dumps(tx))
+        i += 1
+    return {'jsonrpc': '2.0', 'id': -1, 'result': {'height': '1000000', 'txs_results': txs}}
+
+
+async def serve(body: bytes):
+    async def handler(_request):
+        return web.Response(body=body, content_type='application/json')
+
+    app = web.Application()
+    app.router.add_get('/block_results', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/block_results'
+
+
+async def legacy(session: aiohttp.ClientSession, url):
+    async with session.get(url) as resp:
+        await resp.text()  # what the old stats hook did
+        return await resp.json()
+
+
+async def current(session: ObservableSession, url):
+    async with session.get(url) as resp:
+        return await resp.json()
+
+
+async def measure(title, fn, session, url):
+    await fn(session, url)  # warm up
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = await fn(session, url)
+    dt = (time.perf_counter() - t0) / ROUNDS
+    print(f'{title:>28}: {dt * 1e3:8.1f} ms per answer')
+    return result
+
+
+async def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            body = f.read()
+    else:
+        body = json.dumps(generate_block_results()).encode()
+
+    runner, url = await serve(body)
+    sep()
+    print(f'Payload: {len(body) / 1024 / 1024:.2f} MB, orjson: {"yes" if orjson else "no (ujson)"}')
+
+    async with aiohttp.ClientSession() as plain:
+        old = await measure('text() + json()', legacy, plain, url)
+    async with ObservableSession() as session:
+        new = await measure('ObservableResponse.json()', current, session, url)
+        print(f'Bytes accounted: {session.total_bytes / (ROUNDS + 1) / 1024 / 1024:.2f} MB per call')
+
+    assert old == new
+
+    # the same without the network: only the decoding work on the event loop
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        body.decode('utf-8')
+        json.loads(body.strip().decode('utf-8'))
+    t1 = time.perf_counter()
+    for _ in range(ROUNDS):
+        json_loads(body)
+    t2 = time.perf_counter()
+    print(f'{"decode only, old":>28}: {(t1 - t0) / ROUNDS * 1e3:8.1f} ms')
+    print(f'{"decode only, new":>28}: {(t2 - t1) / ROUNDS * 1e3:8.1f} ms')
+    sep()
+    await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+# Compares KEYS, SCAN and the maintained index sets on a synthetic keyspace.
+# It writes ~1M keys, so point it to a spare Redis database:
+# $ REDIS_DB_INDEX=15 PYTHONPATH="." python tools/debug/dbg_keys_scan_bench.py
+
+import asyncio
+import time
+
+from services.lib.db import DB
+from services.lib.db_key_index import delete_by_pattern, scan_keys
+from services.lib.db_many2many import ManyToManySet
+from services.lib.texts import sep
+
+NOISE_KEYS = 1_000_000
+FAMILY_SIZE = 5_000
+WRITE_BATCH = 10_000
+NOISE_PREFIX = 'Bench:Noise'
+
+
+async def fill_noise(db: DB, n=NOISE_KEYS):
+    r = db.redis
+    t0 = time.monotonic()
+    for start in range(0, n, WRITE_BATCH):
+        pipe = r.pipeline(transaction=False)
+        for i in range(start, min(n, start + WRITE_BATCH)):
+            pipe.set(f'{NOISE_PREFIX}:{i}', 1)
+        await pipe.execute()
+    print(f'Wrote {n} noise keys in {time.monotonic() - t0:.1f} sec.')
+
+
+async def fill_family(mm: ManyToManySet, n=FAMILY_SIZE):
+    await mm.clear()
+    for i in range(n):
+        await mm.associate(f'user{i}', f'node{i % 100}')
+    print(f'Associated {n} users.')
+
+
+async def max_ping_while(db: DB, coro, period=0.001):
+    # the latency another client observes while "coro" is running
+    max_ping = 0.0
+    done = False
+
+    async def probe():
+        nonlocal max_ping
+        while not done:
+            t0 = time.monotonic()
+            await db.redis.ping()
+            max_ping = max(max_ping, time.monotonic() - t0)
+            await asyncio.sleep(period)
+
+    probe_task = asyncio.create_task(probe())
+    t0 = time.monotonic()
+    result = await coro
+    elapsed = time.monotonic() - t0
+    done = True
+    await probe_task
+    return result, elapsed, max_ping
+
+
+async def run_bench(db: DB, mm: ManyToManySet):
+    pattern = mm.left_key('*')
+
+    async def with_keys():
+        return await db.redis.keys(pattern)
+
+    async def with_scan():
+        return [k async for k in scan_keys(db.redis, pattern)]
+
+    async def with_index():
+        return await mm.all_lefts()
+
+    sep()
+    for name, fn in [('KEYS', with_keys), ('SCAN', with_scan), ('Index', with_index)]:
+        result, elapsed, max_ping = await max_ping_while(db, fn())
+        print(f'{name:>6}: {len(result)} items in {elapsed * 1000:8.1f} ms; '
+              f'max PING of another client {max_ping * 1000:7.1f} ms')
+    sep()
+
+
+async def main():
+    db = DB(asyncio.get_event_loop())
+    await db.get_redis()
+    print(f'Redis has {await db.redis.dbsize()} keys before the test.')
+
+    mm = ManyToManySet(db, 'BenchUser', 'BenchNode')
+    await fill_noise(db)
+    await fill_family(mm)
+    try:
+        await run_bench(db, mm)
+    finally:
+        await mm.clear()
+        deleted = await delete_by_pattern(db.redis, f'{NOISE_PREFIX}:*', count=10_000, batch=10_000)
+        print(f'Cleaned up {deleted} noise keys.')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -19,7 +19,7 @@ async def my_test_multi_connect(pollster: TCPPollster):
     r = await pollster.test_connectivity_multiple([], PORT_LIST)
     print(r)
 
-    r = await pollster.test_connectivity_multiple(IP_ADDRESS_LIST, PORT_LIST, group_size=3)
+    r = await pollster.test_connectivity_multiple(IP_ADDRESS_LIST, PORT_LIST)
     print(r)
     stats = pollster.count_stats(r)
     print(stats, len(r))
@@ -38,7 +38,7 @@ async def find_nodes(pollster: TCPPollster):
             data = await resp.json()
             ip_addresses = list(filter(bool, (node['ip_address'] for node in data)))
         print('total ip: ', len(ip_addresses))
-        r = await pollster.test_connectivity_multiple(ip_addresses, ['1317', '8080'], group_size=20)
+        r = await pollster.test_connectivity_multiple(ip_addresses, ['1317', '8080'])
         r = {ip: data for ip, data in r.items() if any(data.values())}
         print(r)
 
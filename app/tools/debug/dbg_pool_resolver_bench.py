@@ -0,0 +1,61 @@
+# Per-lookup cost of the pool name resolution: the old fuzzy_search over all pool names vs. PoolResolver.
+# Uses the live pool list of the configured network.
+# $ PYTHONPATH="." python tools/debug/dbg_pool_resolver_bench.py
+
+import asyncio
+import random
+import time
+
+from services.lib.texts import fuzzy_search, sep
+from services.models.asset import Asset
+from services.models.pool_resolver import PoolResolver
+from tools.lib.lp_common import LpAppFramework
+
+N_LOOKUPS = 100_000
+
+
+def make_queries(names):
+    queries = []
+    for name in names:
+        a = Asset.from_string(name)
+        queries += [name, name.lower(), a.name, f'{a.chain}/{a.name}']
+        if a.tag:
+            queries.append(f'{a.chain}.{a.name}-{a.tag[-3:]}')  # memo abbreviation
+    return queries
+
+
+def bench(title, fn, queries):
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q)
+    dt = time.perf_counter() - t0
+    print(f'{title:>24}: {dt / len(queries) * 1e6:8.2f} µs/lookup')
+
+
+async def main():
+    app = LpAppFramework()
+    async with app(brief=True):
+        pools = await app.deps.pool_fetcher.reload_global_pools()
+
+    names = set(pools.keys())
+    all_queries = make_queries(names)
+    queries = [random.choice(all_queries) for _ in range(N_LOOKUPS)]
+
+    sep()
+    print(f'{len(names)} pools, {len(all_queries)} distinct queries, {N_LOOKUPS} lookups')
+
+    t0 = time.perf_counter()
+    resolver = PoolResolver(names)
+    print(f'{"Index build":>24}: {(time.perf_counter() - t0) * 1e3:8.2f} ms')
+
+    bench('Old fuzzy_search', lambda q: fuzzy_search(q, names), queries)
+    bench('Resolver (cold)', lambda q: PoolResolver._resolve(resolver, q.upper()), queries)
+    bench('Resolver (memoized)', resolver.search, queries)
+
+    mismatches = [q for q in all_queries if set(fuzzy_search(q, names)) != set(resolver.search(q))]
+    print(f'Queries with results different from the old search: {mismatches or "none"}')
+    sep()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
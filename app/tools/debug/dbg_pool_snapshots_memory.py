@@ -0,0 +1,96 @@
+# Memory of the pool cache: the legacy "height -> full JSON" hash vs. PoolSnapshotStore (keyframes + deltas).
+# Replays the recorded heights from "PoolInfo:hashtable_v2" if it is there (it is copied, not changed);
+# otherwise it simulates a week of snapshots (one per minute) with random swaps over a synthetic pool list.
+# $ REDIS_DB_INDEX=15 PYTHONPATH="." python tools/debug/dbg_pool_snapshots_memory.py
+
+import asyncio
+import json
+import random
+import time
+
+from services.jobs.fetch.pool_cache import PoolSnapshotStore
+from services.jobs.fetch.pool_price import PoolFetcher
+from services.lib.db import DB
+from services.lib.texts import sep
+from services.models.pool_info import PoolInfo
+
+LEGACY_COPY_KEY = 'Bench:PoolInfo:hashtable_v2'
+WEEK_OF_SNAPSHOTS = 7 * 24 * 60
+HEIGHTS_PER_SNAPSHOT = 10
+N_POOLS = 40
+
+
+def simulate_week():
+    pools = {
+        f'CHAIN{i}.TOKEN{i}-0X{i:040X}': PoolInfo(f'CHAIN{i}.TOKEN{i}-0X{i:040X}',
+                                                  random.randint(10 ** 10, 10 ** 14), random.randint(10 ** 12, 10 ** 16),
+                                                  random.randint(10 ** 12, 10 ** 16), PoolInfo.AVAILABLE,
+                                                  volume_24h=random.randint(0, 10 ** 14))
+        for i in range(N_POOLS)
+    }
+    height = 5_000_000
+    for _ in range(WEEK_OF_SNAPSHOTS):
+        pools = {k: p.copy() for k, p in pools.items()}
+        for p in random.sample(list(pools.values()), k=random.randint(0, 8)):  # a few swaps per minute
+            p.balance_asset += random.randint(-10 ** 8, 10 ** 8)
+            p.balance_rune += random.randint(-10 ** 10, 10 ** 10)
+            p.volume_24h += random.randint(0, 10 ** 10)
+        yield height, pools
+        height += HEIGHTS_PER_SNAPSHOT
+
+
+async def recorded_heights(db: DB):
+    r = await db.get_redis()
+    for height in sorted(int(h) for h in await r.hkeys(PoolFetcher.DB_KEY_POOL_INFO_HASH)):
+        raw = await r.hget(PoolFetcher.DB_KEY_POOL_INFO_HASH, str(height))
+        yield height, {k: PoolInfo.from_dict_brief(it) for k, it in json.loads(raw).items()}
+
+
+async def main():
+    db = DB(asyncio.get_event_loop())
+    r = await db.get_redis()
+
+    if await r.exists(PoolFetcher.DB_KEY_POOL_INFO_HASH):
+        source, title = recorded_heights(db), 'recorded heights'
+    else:
+        async def simulated():
+            for item in simulate_week():
+                yield item
+
+        source, title = simulated(), 'a simulated week'
+
+    store = PoolSnapshotStore(db, prefix='Bench:PoolSnap')
+    await store.clear()
+    await r.delete(LEGACY_COPY_KEY)
+
+    t0 = time.monotonic()
+    n = 0
+    async for height, pool_map in source:
+        await r.hset(LEGACY_COPY_KEY, str(height), json.dumps({k: p.as_dict_brief() for k, p in pool_map.items()}))
+        await store.put(height, pool_map)
+        n += 1
+    dt = time.monotonic() - t0
+
+    legacy_bytes = await r.memory_usage(LEGACY_COPY_KEY, samples=0)
+    store_bytes = await store.memory_usage()
+    heights, keyframes = await store.count()
+
+    sep()
+    print(f'Source: {title}, {n} snapshots, written in {dt:.1f} sec')
+    print(f'Legacy hash: {legacy_bytes / 2 ** 20:8.2f} MB')
+    print(f'Snapshots:   {store_bytes / 2 ** 20:8.2f} MB ({heights} heights, {keyframes} keyframes)')
+    print(f'Reduction:   {legacy_bytes / max(1, store_bytes):8.1f}x')
+
+    t0 = time.monotonic()
+    probe = random.sample(await r.hkeys(LEGACY_COPY_KEY), k=min(1000, n))
+    for height in probe:
+        assert await store.get_pools_at(int(height))
+    print(f'get_pools_at: {(time.monotonic() - t0) / len(probe) * 1e3:.2f} ms per height')
+    sep()
+
+    await store.clear()
+    await r.delete(LEGACY_COPY_KEY)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+# Throughput of the personal rate limiter: the old 4-command GCRA behind a global lock vs. the Lua script.
+# $ REDIS_DB_INDEX=15 PYTHONPATH="." python tools/debug/dbg_rate_limit_bench.py
+
+import asyncio
+import random
+import time
+
+from services.lib.db import DB
+from services.lib.db_key_index import delete_by_pattern
+from services.lib.rate_limit import RateLimitCooldown
+from services.lib.texts import sep
+
+N_CHANNELS = 10_000
+N_HITS = 50_000
+CONCURRENCY = 200
+LIMIT, PERIOD, COOLDOWN = 10, 60.0, 300.0
+KEY_PREFIX = 'Bench'
+
+
+async def legacy_is_limited(db: DB, key: str, limit: int, period: float):
+    # a copy of the old non-atomic implementation; it needed the global lock to be correct
+    key = f'RateLimit:{key}'
+    r = db.redis
+    sec, micro_sec = (await r.time())
+    t = sec + micro_sec * 1e-6
+    separation = period / limit
+    await r.setnx(key, 0.0)
+    tat = max(float(await r.get(key)), t)
+    if tat - t <= period - separation:
+        await r.set(key, max(tat, t) + separation)
+        return False
+    return True
+
+
+async def legacy_hit(db: DB, lock: asyncio.Lock, key: str):
+    async with lock:
+        limiter = RateLimitCooldown(db, key, LIMIT, PERIOD, COOLDOWN)
+        if not await limiter.cd.can_do():
+            return limiter.ON_COOLDOWN
+        if not await legacy_is_limited(db, key, LIMIT, PERIOD):
+            return limiter.GOOD
+        await limiter.cd.do()
+        return limiter.HIT_LIMIT
+
+
+async def lua_hit(db: DB, key: str):
+    return await RateLimitCooldown(db, key, LIMIT, PERIOD, COOLDOWN).hit()
+
+
+async def run_hits(name, hit_fn, channels):
+    sem = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(channel):
+        async with sem:
+            return await hit_fn(channel)
+
+    t0 = time.monotonic()
+    outcomes = await asyncio.gather(*(one(c) for c in channels))
+    dt = time.monotonic() - t0
+    stats = {o: outcomes.count(o) for o in set(outcomes)}
+    print(f'{name:>8}: {len(channels) / dt:9.0f} hits/sec; {dt:6.2f} sec; outcomes: {stats}')
+
+
+async def cleanup(db: DB):
+    for pattern in (f'RateLimit:{KEY_PREFIX}:*', f'cooldown:RateLimitCooldown:{KEY_PREFIX}:*'):
+        await delete_by_pattern(db.redis, pattern)
+
+
+async def main():
+    db = DB(asyncio.get_event_loop())
+    await db.get_redis()
+
+    channels = [f'{KEY_PREFIX}:{random.randrange(N_CHANNELS)}' for _ in range(N_HITS)]
+    lock = asyncio.Lock()
+
+    sep()
+    await cleanup(db)
+    await run_hits('Legacy', lambda c: legacy_hit(db, lock, c), channels)
+    await cleanup(db)
+    await run_hits('Lua', lambda c: lua_hit(db, c), channels)
+    await cleanup(db)
+    sep()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+# Moves the raw block cache of NativeScannerBlockCached from the Redis hashes to the local block store.
+# Instructions:
+# $ make attach
+# $ PYTHONPATH="/app" python tools/migrate_block_store.py /config/config.yaml
+
+import asyncio
+import logging
+
+import tqdm
+
+from services.jobs.scanner.block_store import RedisBlockStore, SqliteBlockStore, make_block_store, BlockStore
+from tools.lib.lp_common import LpAppFramework
+
+BATCH_SIZE = 200
+
+
+async def migrate_kind(source: RedisBlockStore, target: SqliteBlockStore, kind: str):
+    total = await source.count(kind)
+    logging.info(f'Migrating {total} records of kind "{kind}"')
+
+    batch = []
+    moved = 0
+    with tqdm.tqdm(total=total) as progress:
+        async for height, data in source.iterate(kind):
+            batch.append((height, data))
+            if len(batch) >= BATCH_SIZE:
+                await target.put_many(kind, batch)
+                moved += len(batch)
+                progress.update(len(batch))
+                batch = []
+        if batch:
+            await target.put_many(kind, batch)
+            moved += len(batch)
+            progress.update(len(batch))
+
+    logging.info(f'Moved {moved} records of kind "{kind}"; height range is {await target.height_range(kind)}')
+    return moved
+
+
+async def do_job(app):
+    await app.deps.db.get_redis()
+    source = RedisBlockStore(app.deps.db)
+    target = make_block_store(app.deps)
+    if not isinstance(target, SqliteBlockStore):
+        logging.error('The configured block store is not a local one. Nothing to do.')
+        return
+
+    for kind in BlockStore.KINDS:
+        await migrate_kind(source, target, kind)
+
+    logging.info(f'The block store takes {await target.used_size() / 1024 / 1024:.1f} MB now.')
+
+    if input('Delete the Redis hashes? (y/n): ').lower().strip() == 'y':
+        for kind in BlockStore.KINDS:
+            await source.drop(kind)
+        logging.info('Done. The Redis hashes are deleted.')
+
+    await target.close()
+
+
+async def main():
+    app = LpAppFramework(log_level=logging.INFO)
+    async with app(brief=True):
+        await do_job(app)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
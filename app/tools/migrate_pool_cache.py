@@ -0,0 +1,45 @@
+# Moves the legacy pool cache (PoolInfo:hashtable_v2, one full JSON per height) to the keyframe + delta snapshot store.
+# Heights that the retention sweep of PoolFetcher would delete anyway are skipped.
+# Instructions:
+# $ make attach
+# $ PYTHONPATH="/app" python tools/migrate_pool_cache.py /config/config.yaml
+
+import asyncio
+import logging
+
+from services.jobs.fetch.pool_price import PoolFetcher
+from tools.lib.lp_common import LpAppFramework
+
+BATCH_SIZE = 500
+
+
+async def do_job(app):
+    r = await app.deps.db.get_redis()
+    legacy_key = PoolFetcher.DB_KEY_POOL_INFO_HASH
+    heights = [int(h) for h in await r.hkeys(legacy_key)]
+    if not heights:
+        logging.info('No legacy pool cache. Nothing to do.')
+        return
+
+    # the last height the old code cached is as good as the top block here
+    min_block = PoolFetcher.min_cached_block(max(heights))
+    logging.info(f'Legacy pool cache has {len(heights)} heights; importing those from #{min_block}')
+
+    fetcher = PoolFetcher(app.deps)
+    delete = input('Delete the legacy hash after the import? (y/n): ').lower().strip() == 'y'
+    imported = await fetcher.snapshots.import_legacy_hash(legacy_key, min_height=min_block,
+                                                          batch=BATCH_SIZE, delete=delete)
+
+    heights, keyframes = await fetcher.snapshots.count()
+    logging.info(f'Imported {imported} pool maps. The store has {heights} heights ({keyframes} keyframes), '
+                 f'{await fetcher.snapshots.memory_usage() / 1024 / 1024:.1f} MB.')
+
+
+async def main():
+    app = LpAppFramework(log_level=logging.INFO)
+    async with app(brief=True):
+        await do_job(app)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
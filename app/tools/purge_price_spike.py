@@ -16,6 +16,8 @@ async def purge_spike_time_series(series: PriceTimeSeries, interval, max_value):
     r = series.db.redis
     if message_ids:
         await r.xdel(series.stream_name, *message_ids)
+        # the charts read the 1m/1h/1d rollups, they still hold the spike
+        await series.rebuild_rollups()
 
 
 INTERVAL = 5 * DAY
@@ -61,6 +61,7 @@ class AppSettingsAPI:
     async def _on_startup(self):
         self.deps.make_http_session()
         await self.deps.db.get_redis()
+        self.manager.start_invalidation_listener()
 
     @property
     def manager(self):